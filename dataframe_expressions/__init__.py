@@ -1,7 +1,22 @@
-from .data_frame import Column, DataFrame  # NOQA
+from .data_frame import Column, DataFrame, disable_interning, enable_interning  # NOQA
 from .alias import define_alias  # NOQA
 from .asts import (  # NOQA
     ast_Callable, ast_Column, ast_DataFrame, ast_FunctionPlaceholder)
-from .render_dataframe import ast_Filter, render, render_callable, render_context  # NOQA
+from .render_dataframe import (  # NOQA
+    ast_Filter, disable_render_cache, enable_render_cache, render, render_callable,
+    render_context, render_many)
 from .utils import DataFrameTypeError, user_func, exclusive_class  # NOQA
-from .dump_dataframe import dumps  # NOQA
\ No newline at end of file
+from .dump_dataframe import dumps  # NOQA
+from .ir_dataframe import ast_to_ir, ir_op, ir_table, ir_to_ast, render_ir  # NOQA
+from .cse import ast_Binding, ast_Let, eliminate_common_subexpressions, unwrap_let  # NOQA
+from .filter_fusion import fused_filter, fuse_filters  # NOQA
+from .simplify import simplify  # NOQA
+from .projection import required_columns  # NOQA
+from .cost_model import cost_model, reorder_predicates  # NOQA
+from .template import ast_Parameter, callable_template, trace_callable  # NOQA
+from .tracing import add_render_listener, configure_tracing, remove_render_listener, render_event  # NOQA
+from .fingerprint import FingerprintError, fingerprint  # NOQA
+from .canonical import canonicalize  # NOQA
+from .result_cache import result_cache  # NOQA
+from .subexpr_cache import subexpr_cache  # NOQA
+from .evaluate import EvaluationError, evaluate  # NOQA
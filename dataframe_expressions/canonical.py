@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import ast
+from typing import Any, Dict, List, Tuple, Type
+
+from .data_frame import DataFrame
+from .fingerprint import FingerprintError, _digest, _fingerprinter, _type_name
+from .utils_ast import _child_nodes, _walk_dag, constant_value, is_constant, replace_children
+
+
+# Comparison operators, and what they become when the two sides are swapped
+_mirrored: Dict[Type[ast.AST], Type[ast.AST]] = {
+    ast.Eq: ast.Eq,
+    ast.NotEq: ast.NotEq,
+    ast.Lt: ast.Gt,
+    ast.Gt: ast.Lt,
+    ast.LtE: ast.GtE,
+    ast.GtE: ast.LtE,
+}
+
+
+class _canonicalizer(_fingerprinter):
+    '''
+    Orders operands by a structural key: anything that isn't a literal first, and then
+    by digest. The digest does not depend on where things are in the expression (unlike
+    a `fingerprint`, which numbers the source `DataFrame`s), so the order doesn't either.
+    '''
+    def __init__(self):
+        _fingerprinter.__init__(self)
+        self._digests: Dict[int, str] = {}
+        self._indexed: Dict[int, bool] = {}
+        # If each node is known to be a number, by id (they are in `_keep` too)
+        self._numeric: Dict[int, bool] = {}
+        # The nodes that have a digest, so their id's are not reused
+        self._keep: List[ast.AST] = []
+
+    def _root(self, df: DataFrame) -> str:
+        return _digest('root', _type_name(type(df)), df._fingerprint_token())
+
+    def value(self, v: Any) -> Any:
+        'The key only orders things: a value that can not be described just sorts by type'
+        try:
+            return _fingerprinter.value(self, v)
+        except FingerprintError:
+            return ('opaque', _type_name(type(v)))
+
+    def _key(self, a: ast.AST) -> Tuple[bool, str]:
+        'Sort key for `a`'
+        stack: List[Tuple[ast.AST, bool]] = [(a, False)]
+        while len(stack) > 0:
+            n, children_done = stack.pop()
+            if id(n) in self._digests:
+                continue
+            if children_done:
+                self._digests[id(n)] = self._node(n, self._digests)
+                self._indexed[id(n)] = isinstance(n, ast.Subscript) \
+                    or any(self._indexed[id(c)] for c in _child_nodes(n))
+                self._keep.append(n)
+            else:
+                stack.append((n, True))
+                stack.extend((c, False) for c in _child_nodes(n) if id(c) not in self._digests)
+        return is_constant(a), self._digests[id(a)]
+
+    def _is_numeric(self, a: ast.AST) -> bool:
+        'True if `a` is known to be a number (or an array of them)'
+        found = self._numeric.get(id(a))
+        if found is not None:
+            return found
+        if is_constant(a):
+            v = constant_value(a)
+            return isinstance(v, (int, float, complex)) and not isinstance(v, bool)
+        if isinstance(a, ast.Compare):
+            return True
+        if isinstance(a, ast.UnaryOp):
+            return isinstance(a.op, (ast.USub, ast.UAdd))
+        if isinstance(a, ast.BinOp):
+            if isinstance(a.op, (ast.Sub, ast.Div, ast.FloorDiv, ast.Pow)):
+                return True
+            if isinstance(a.op, ast.Add):
+                # A number can't be added to anything but another number
+                return self._is_numeric(a.left) or self._is_numeric(a.right)
+            if isinstance(a.op, ast.Mult):
+                # `'a' * 3` is a string
+                return self._is_numeric(a.left) and self._is_numeric(a.right)
+        return False
+
+    def _binop(self, a: ast.BinOp) -> ast.AST:
+        numeric = self._is_numeric(a)
+        result: ast.AST = a
+        # `+` also joins strings (and lists), which does not commute
+        if isinstance(a.op, ast.Mult) or (isinstance(a.op, ast.Add) and numeric):
+            if self._key(a.right) < self._key(a.left):
+                result = ast.BinOp(left=a.right, op=a.op, right=a.left)
+        self._numeric[id(result)] = numeric
+        self._keep.append(result)
+        return result
+
+    def _compare(self, a: ast.Compare) -> ast.AST:
+        if len(a.ops) != 1 or type(a.ops[0]) not in _mirrored:
+            return a
+        right = a.comparators[0]
+        if self._key(right) < self._key(a.left):
+            return ast.Compare(left=right, ops=[_mirrored[type(a.ops[0])]()],
+                               comparators=[a.left])
+        return a
+
+    def _boolop(self, a: ast.BoolOp) -> ast.AST:
+        # Operands have already been done, so there is only one level to flatten
+        values: List[ast.AST] = []
+        for v in a.values:
+            if isinstance(v, ast.BoolOp) and type(v.op) is type(a.op):
+                values.extend(v.values)
+            else:
+                values.append(v)
+
+        # An earlier term may be guarding an index (`(df.jets.count() > 0) & (df.jets[0].pt > 30)`)
+        for v in values:
+            self._key(v)
+        if not any(self._indexed[id(v)] for v in values):
+            values = sorted(values, key=self._key)
+
+        if len(values) == len(a.values) and all(v is o for v, o in zip(values, a.values)):
+            return a
+        return ast.BoolOp(op=type(a.op)(), values=values)
+
+    def _call(self, a: ast.Call) -> ast.AST:
+        keywords = getattr(a, 'keywords', None)
+        if keywords is None or len(keywords) < 2:
+            return a
+        ordered = sorted(keywords, key=lambda k: (k.arg is None, k.arg or ''))
+        if all(k is o for k, o in zip(ordered, keywords)):
+            return a
+        return ast.Call(func=a.func, args=a.args, keywords=ordered)
+
+    def canonical(self, a: ast.AST) -> ast.AST:
+        if isinstance(a, ast.BinOp):
+            return self._binop(a)
+        if isinstance(a, ast.Compare):
+            return self._compare(a)
+        if isinstance(a, ast.BoolOp):
+            return self._boolop(a)
+        if isinstance(a, ast.Call):
+            return self._call(a)
+        return a
+
+
+def canonicalize(expr: ast.AST) -> ast.AST:
+    '''
+    Rewrite a rendered expression into a canonical form, so that expressions that differ
+    only in the order things were written look the same.
+
+    Arguments:
+        expr        A rendered expression (from `render`, for example)
+
+    Returns:
+        expr        The canonical expression. `expr` is not modified, and any part of it
+                    that did not change is shared with the result.
+
+    Notes:
+        - The operands of `*` are put in order: `2*df.x` becomes `df.x*2`. The operands
+          of `+` are only put in order when one of them is known to be a number (a
+          numeric literal, a comparison, or the result of `-`, `/`, `//` or `**`), as `+`
+          on strings does not commute: `df.first + df.last` is left alone.
+        - A single comparison is turned around if needed: `10 < df.x` becomes `df.x > 10`.
+        - Chains of `and` (or `or`) become a single `ast.BoolOp` with the terms in order,
+          unless a term indexes into a collection (`df.jets[0]`), as an earlier term may
+          be guarding it.
+        - Keyword arguments of a call are sorted by name.
+        - Literals always go last; otherwise the order is by structure. Two different
+          source `DataFrame`s of the same type (and `_fingerprint_token`) are not put in
+          order, so `df1.x + df2.x` and `df2.x + df1.x` stay different.
+    '''
+    c = _canonicalizer()
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in _walk_dag(expr):
+        rebuilt[id(a)] = c.canonical(replace_children(a, rebuilt))
+    return rebuilt[id(expr)]
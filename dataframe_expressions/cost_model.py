@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import ast
+from typing import Dict, List, Optional, Set, Tuple
+
+from .asts import ast_Callable, ast_FunctionPlaceholder
+from .projection import _source_paths
+from .utils_ast import _walk_dag, replace_children
+
+
+def _function_name(func: ast.AST) -> Optional[str]:
+    'The name a backend would know the function in a `ast.Call` by'
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, (ast_Callable, ast_FunctionPlaceholder)):
+        return getattr(func, 'name', None)
+    return None
+
+
+class cost_model:
+    '''
+    Estimates of how expensive a predicate is to evaluate, and what fraction of the
+    elements it lets through. Backends register what they know; anything else gets a
+    default. Subclass and override `cost` or `selectivity` for a more detailed model.
+
+    - The cost of a term is the sum over its nodes: each function (or method) call costs
+      what was registered for its name (or `default_function_cost`), and every other
+      operation (an attribute read, an arithmetic, comparison, or boolean operator) costs 1.
+    - The selectivity of a term is the smallest selectivity registered for the columns it
+      reads (by dotted path, as `required_columns` returns them), or `default_selectivity`.
+    '''
+    def __init__(self, default_function_cost: float = 10.0, default_selectivity: float = 0.5):
+        self.default_function_cost = default_function_cost
+        self.default_selectivity = default_selectivity
+        self._function_costs: Dict[str, float] = {}
+        self._selectivities: Dict[str, float] = {}
+
+    def set_function_cost(self, name: str, cost: float) -> cost_model:
+        '''
+        Set the cost of calling a function or method (like `DeltaR`, `count`, or
+        `np_where`) once. Returns this model so calls can be chained.
+        '''
+        self._function_costs[name] = cost
+        return self
+
+    def set_selectivity(self, column: str, selectivity: float) -> cost_model:
+        '''
+        Set the fraction (0 to 1) of elements that pass a cut on a column (like `met` or
+        `jets.pt`). Returns this model so calls can be chained.
+        '''
+        assert 0.0 <= selectivity <= 1.0, \
+            f'Selectivity of {column} must be between 0 and 1, not {selectivity}'
+        self._selectivities[column] = selectivity
+        return self
+
+    def cost(self, term: ast.AST) -> float:
+        'Return the cost of evaluating `term` for one element'
+        total = 0.0
+        for a in _walk_dag(term):
+            if isinstance(a, ast.Call):
+                name = _function_name(a.func)
+                total += self._function_costs.get(name, self.default_function_cost) \
+                    if name is not None else self.default_function_cost
+            elif isinstance(a, (ast.Attribute, ast.BinOp, ast.Compare, ast.BoolOp,
+                                ast.UnaryOp, ast.Subscript)):
+                total += 1.0
+        return total
+
+    def selectivity(self, term: ast.AST) -> float:
+        'Return the fraction of elements that `term` lets through'
+        paths: Set[Tuple[str, ...]] = set()
+        _source_paths(term, paths, [])
+        known = [self._selectivities[p] for p in ('.'.join(p) for p in paths)
+                 if p in self._selectivities]
+        return min(known) if len(known) > 0 else self.default_selectivity
+
+
+def _flatten(a: ast.BoolOp) -> List[ast.AST]:
+    'The operands of a chain of `and`s (or `or`s), like `(a and b) and c`'
+    operands: List[ast.AST] = []
+    stack: List[ast.AST] = [a]
+    while len(stack) > 0:
+        v = stack.pop()
+        if isinstance(v, ast.BoolOp) and type(v.op) is type(a.op):
+            stack.extend(reversed(v.values))
+        else:
+            operands.append(v)
+    return operands
+
+
+def _order_key(model: cost_model, term: ast.AST, is_and: bool) -> float:
+    'Expected cost of the term per element it removes from (or decides for) the chain'
+    c = model.cost(term)
+    p = model.selectivity(term)
+    decided = (1.0 - p) if is_and else p
+    return c / decided if decided > 0 else float('inf')
+
+
+def reorder_predicates(expr: ast.AST, model: cost_model) -> ast.AST:
+    '''
+    Reorder the operands of every `and` and `or` in a rendered expression so that cheap
+    terms that decide the outcome most often are evaluated first.
+
+    Arguments:
+        expr        A rendered expression (from `render`, for example)
+        model       The costs and selectivities to use
+
+    Returns:
+        expr        The reordered expression. `expr` is not modified, and any part of it
+                    that did not change is shared with the result.
+
+    Notes:
+        - Chains like `(a & b) & c` are treated as a single `and` of three terms. The
+          result is again built from binary `ast.BoolOp`'s.
+        - For an `and`, terms are sorted by cost / (1 - selectivity); for an `or` by
+          cost / selectivity. Terms that tie keep the order they were written in.
+        - A chain with an indexing operation in it (`df.jets[0]`) is left alone, as an
+          earlier term may be guarding it (`(df.jets.count() > 0) & (df.jets[0].pt > 30)`).
+    '''
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in _walk_dag(expr):
+        new_a = replace_children(a, rebuilt)
+        if isinstance(new_a, ast.BoolOp):
+            operands = _flatten(new_a)
+            if not any(isinstance(n, ast.Subscript) for t in operands for n in _walk_dag(t)):
+                is_and = isinstance(new_a.op, ast.And)
+                ordered = sorted(operands, key=lambda t: _order_key(model, t, is_and))
+                if any(o is not t for o, t in zip(ordered, operands)):
+                    new_a = ordered[0]
+                    for t in ordered[1:]:
+                        new_a = ast.BoolOp(op=type(a.op)(), values=[new_a, t])
+        rebuilt[id(a)] = new_a
+    return rebuilt[id(expr)]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import ast
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from .asts import ast_DataFrame
+from .render_dataframe import ast_Filter
+from .utils_ast import _child_nodes, intern_ast, is_constant, replace_children
+
+
+class ast_Binding(ast.AST):
+    '''
+    A reference to the value bound to `name` by an enclosing `ast_Let`.
+    '''
+    _fields = ('name',)
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+
+
+class ast_Let(ast.AST):
+    '''
+    Bind `name` to `value`, and then evaluate `body`. Any `ast_Binding` with the same name in
+    `body` (or in the value of a later `ast_Let`) refers to `value`: it should be computed
+    just once.
+    '''
+    _fields = ('name', 'value', 'body')
+
+    def __init__(self, name: Optional[str] = None, value: Optional[ast.AST] = None,
+                 body: Optional[ast.AST] = None):
+        self.name = name
+        self.value = value
+        self.body = body
+
+
+def _is_trivial(a: ast.AST) -> bool:
+    '''
+    Returns true if there is no point in binding `a` to a name: it is a leaf
+    (a `DataFrame`, name, or literal), a plain column reference like `df.jets.pt`,
+    a tuple of leaves, or not an expression at all.
+    '''
+    while isinstance(a, ast.Attribute):
+        a = a.value
+    if isinstance(a, ast_DataFrame):
+        return True
+    if not isinstance(a, (ast.expr, ast_Filter)):
+        return True
+    if isinstance(a, ast.Name) or is_constant(a):
+        return True
+    if isinstance(a, (ast.Tuple, ast.List)):
+        return all(_is_trivial(e) for e in a.elts)
+    return False
+
+
+def eliminate_common_subexpressions(expr: ast.AST, prefix: str = 'cse') -> ast.AST:
+    '''
+    Find sub-expressions that occur more than once in a rendered expression, and bind each
+    to a name so that a backend need only compute it once.
+
+    Arguments:
+        expr        A rendered expression (from `render`, for example)
+        prefix      Names of the bindings are `prefix_0`, `prefix_1`, etc.
+
+    Returns:
+        expr        The same expression, wrapped in `ast_Let` nodes, one for each common
+                    sub-expression, with each occurrence replaced by an `ast_Binding`.
+                    The outermost `ast_Let` is the first binding, and a binding's value
+                    only refers to bindings made before it. If nothing is repeated, `expr`
+                    is returned as is.
+
+    Notes:
+        - Sub-expressions are matched by structure (and the identity of the `DataFrame`s
+          and callables at the leaves), not by object identity. So `df.jets.pt/1000`
+          written twice is found, as are repeats inside `ast_Filter` filters and
+          `ast.Call` arguments.
+        - Leaves (`DataFrame`s, names, literals), plain column references (`df.jets.pt`),
+          and the function part of an `ast.Call` are never bound.
+        - A repeat that occurs only inside a larger repeated expression is not bound on
+          its own.
+    '''
+    resolved: Dict[Hashable, ast.AST] = {}
+    interned: Dict[int, Tuple[ast.AST, ast.AST]] = {}
+    root = intern_ast(expr, resolved, interned)
+
+    def canonical(a: ast.AST) -> ast.AST:
+        return interned[id(a)][1]
+
+    # Build the graph of canonical nodes, parents before children.
+    order: List[ast.AST] = []
+    seen: Set[int] = set()
+    never_bind: Set[int] = set()
+    stack: List[Tuple[ast.AST, bool]] = [(root, False)]
+    while len(stack) > 0:
+        a, children_done = stack.pop()
+        if children_done:
+            order.append(a)
+            continue
+        if id(a) in seen:
+            continue
+        seen.add(id(a))
+        if isinstance(a, ast.Call):
+            never_bind.add(id(canonical(a.func)))
+        stack.append((a, True))
+        stack.extend((canonical(c), False) for c in _child_nodes(a))
+    order.reverse()
+
+    # Count how many times each node has to be computed. Once a node is bound, it is
+    # computed once, no matter how often it is referenced.
+    occurrences: Dict[int, int] = {id(root): 1}
+    bound: List[ast.AST] = []
+    for a in order:
+        count = occurrences[id(a)]
+        if count > 1 and a is not root and id(a) not in never_bind and not _is_trivial(a):
+            bound.append(a)
+            count = 1
+        for c in _child_nodes(a):
+            c_id = id(canonical(c))
+            occurrences[c_id] = occurrences.get(c_id, 0) + count
+
+    if len(bound) == 0:
+        return expr
+
+    # Rebuild every node, children first, replacing bound nodes with references.
+    bound_ids = {id(a) for a in bound}
+    names: Dict[int, str] = {}
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in reversed(order):
+        new_child = {id(c): (ast_Binding(names[id(canonical(c))])
+                             if id(canonical(c)) in bound_ids
+                             else rebuilt[id(canonical(c))])
+                     for c in _child_nodes(a)}
+        rebuilt[id(a)] = replace_children(a, new_child)
+        if id(a) in bound_ids:
+            names[id(a)] = f'{prefix}_{len(names)}'
+
+    result = rebuilt[id(root)]
+    for a in bound:
+        result = ast_Let(names[id(a)], rebuilt[id(a)], result)
+    return result
+
+
+def unwrap_let(expr: ast.AST) -> Tuple[List[Tuple[str, ast.AST]], ast.AST]:
+    '''
+    Split the output of `eliminate_common_subexpressions` into its bindings and body.
+
+    Returns:
+        bindings    List of (name, value), in the order they must be computed
+        body        The expression with all the `ast_Let`'s removed
+    '''
+    bindings: List[Tuple[str, ast.AST]] = []
+    while isinstance(expr, ast_Let):
+        bindings.append((expr.name, expr.value))  # type: ignore
+        expr = expr.body  # type: ignore
+    return bindings, expr
@@ -1,10 +1,87 @@
 from __future__ import annotations
 import ast
 import logging
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union, cast
+from typing import (Any, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Mapping,
+                    Optional, Tuple, TypeVar, Union, cast)
+import weakref
 
-from .asts import ast_Callable, ast_DataFrame
-from .utils_ast import CloningNodeTransformer
+from .asts import ast_Callable, ast_Column, ast_DataFrame, ast_FunctionPlaceholder
+from .utils_ast import CloningNodeTransformer, _literal_key
+
+
+# When interning is on, every `DataFrame` and `Column` built by an operator, by structure.
+_intern_table: Optional[weakref.WeakValueDictionary] = None
+
+
+def enable_interning():
+    '''
+    Turn on process-wide interning. Building an expression that is the same as one that
+    is still alive (`df.jets.pt > 30` twice, say) returns the object built the first time,
+    so the copies aren't kept around and `render` sees them as the same thing.
+
+    Notes:
+        - Two expressions are the same if they apply the same operator to the same
+          `DataFrame` objects and to equal literals. Lambdas are only the same if they are
+          the same python object.
+        - The table holds its entries by weak reference: it never keeps an expression
+          alive.
+        - Anything attached to an interned `DataFrame` (like a computed column) is seen by
+          everyone who builds that expression.
+        - Calling this again starts a new, empty, table.
+    '''
+    global _intern_table
+    _intern_table = weakref.WeakValueDictionary()
+
+
+def disable_interning():
+    '''
+    Turn off process-wide interning, and forget everything interned so far.
+    '''
+    global _intern_table
+    _intern_table = None
+
+
+def _expr_key(a: Any) -> Hashable:
+    '''
+    Key for an expression an operator just built. It only looks down to the `DataFrame`,
+    `Column`, and callable objects the expression refers to, and uses their identity. The
+    interned object holds on to all of them, so the ids can't be reused while it is alive.
+    '''
+    if isinstance(a, ast_DataFrame):
+        return (ast_DataFrame, id(a.dataframe))
+    if isinstance(a, ast_Column):
+        return (ast_Column, id(a.column))
+    if isinstance(a, ast_Callable):
+        return (ast_Callable, id(a.callable), id(a.dataframe))
+    if isinstance(a, ast_FunctionPlaceholder):
+        return (ast_FunctionPlaceholder, id(a.callable))
+    if isinstance(a, ast.AST):
+        return (type(a),) + tuple((f, _expr_key(getattr(a, f, None))) for f in a._fields)
+    if isinstance(a, list):
+        return ('[',) + tuple(_expr_key(item) for item in a)
+    return _literal_key(a)
+
+
+_T = TypeVar('_T', 'DataFrame', 'Column')
+
+
+def _interned(node: _T) -> _T:
+    '''
+    If interning is on, return the live `DataFrame` or `Column` that is the same expression
+    as `node` (if there is one), otherwise `node`.
+    '''
+    table = _intern_table
+    if table is None:
+        return node
+    if isinstance(node, DataFrame):
+        key: Hashable = (DataFrame, _expr_key(node.child_expr), id(node.filter))
+    else:
+        key = (Column, _literal_key(node.type), _expr_key(node.child_expr))
+    found = table.get(key)
+    if found is not None:
+        return found
+    table[key] = node
+    return node
 
 
 class Column:
@@ -12,55 +89,174 @@ class Column:
     Base class for a single sequence. Unlike a `DataFrame` this can't have any complex structure.
     It is a sequence of items, assumed to be of the same type.
     '''
+    __slots__ = ('child_expr', 'type', '__weakref__')
+    _fields = ('child_expr',)
+
     def __init__(self, t: Any, expr: ast.AST):
         self.child_expr: ast.AST = expr
-        self._fields = ('child_expr',)
         self.type = t
 
     def __and__(self, other) -> Column:
         ''' Bitwise and becomes a logical and. '''
         from .utils import _term_to_ast
-        return Column(type(bool), ast.BoolOp(op=ast.And(),
-                      values=[_term_to_ast(self, self), _term_to_ast(other, self)]))
+        return _interned(Column(type(bool), ast.BoolOp(
+            op=ast.And(), values=[_term_to_ast(self, self), _term_to_ast(other, self)])))
 
     def __or__(self, other) -> Column:
         ''' Bitwise and becomes a logical and. '''
         from .utils import _term_to_ast
-        return Column(type(bool), ast.BoolOp(op=ast.Or(),
-                      values=[_term_to_ast(self, self), _term_to_ast(other, self)]))
+        return _interned(Column(type(bool), ast.BoolOp(
+            op=ast.Or(), values=[_term_to_ast(self, self), _term_to_ast(other, self)])))
 
     def __invert__(self) -> Column:
         ''' Invert, or logical NOT operation. '''
         from .utils import _term_to_ast
-        return Column(type(bool), ast.UnaryOp(op=ast.Invert(),
-                      operand=_term_to_ast(self, self)))
+        return _interned(Column(type(bool), ast.UnaryOp(op=ast.Invert(),
+                         operand=_term_to_ast(self, self))))
 
 
 class _sub_link_info:
     '''
     Info on links between dataframes or functions that modify data frames
     '''
+    __slots__ = ('_df', 'computed_col', '_rendered')
+
     def __init__(self, df: Union[DataFrame, Callable[[DataFrame], DataFrame]],
                  computed_col: bool):
         self._df = df
         self.computed_col = computed_col
 
+        # For a callable, what `render` returned for each parent (by id), along with the
+        # parent so the id can't be reused.
+        self._rendered: Optional[Dict[int, Tuple[DataFrame, DataFrame]]] = None
+
     def render(self, df: DataFrame) -> DataFrame:
         '''
-        Given the parent DF, render the substitution
+        Given the parent DF, render the substitution. For a callable this is done once
+        per parent, so every reference to the column is the same `DataFrame`.
         '''
         if isinstance(self._df, DataFrame):
             return self._df
         else:
             assert callable(self._df), 'Internal Error - bad substitution'
-            r = ast_Callable(self._df, df)
-            expr = ast.Call(func=r, args=[ast_DataFrame(df)])
-            return DataFrame(expr=expr)
+            if self._rendered is None:
+                self._rendered = {}
+            found = self._rendered.get(id(df))
+            if found is None:
+                r = ast_Callable(self._df, df)
+                expr = ast.Call(func=r, args=[ast_DataFrame(df)])
+                found = (df, DataFrame(expr=expr))
+                self._rendered[id(df)] = found
+            return found[1]
+
+
+class _sub_link_map(Dict[str, _sub_link_info]):
+    '''
+    The sub-links of a `DataFrame`, along with how many of them are computed columns.
+    '''
+    __slots__ = ('n_computed',)
+
+    def __init__(self):
+        dict.__init__(self)
+        self.n_computed = 0
+
+
+class _empty_sub_df(Mapping):
+    '''
+    The sub-links of every `DataFrame` that has none yet, so they don't each need a dict.
+    It is read-only: use `DataFrame._writable_sub_df` to add to a `DataFrame`'s links.
+    There is only one, and copies (or pickles) of it are the same object.
+    '''
+    __slots__ = ()
+    n_computed = 0
+
+    def __getitem__(self, key: str) -> _sub_link_info:
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(())
+
+    def __len__(self) -> int:
+        return 0
+
+    def __copy__(self) -> _empty_sub_df:
+        return self
+
+    def __deepcopy__(self, memo) -> _empty_sub_df:
+        return self
+
+    def __reduce__(self) -> str:
+        return '_no_sub_df'
+
+
+_no_sub_df = _empty_sub_df()
+
+# Changes every time a computed column is added to any `DataFrame`.
+_computed_col_version = 0
+
+# A persistent list of filters: (filter, rest of the list), or None when empty.
+_filter_list = Optional[Tuple[Column, Any]]
+
+
+def _filters_to_list(segments: List[_filter_list]) -> List[Column]:
+    'Join the persistent filter lists into a single list, in order'
+    filters: List[Column] = []
+    for f in segments:
+        while f is not None:
+            filters.append(f[0])
+            f = f[1]
+    return filters
+
+
+# For each class: its mro and the names each class in it defined when we looked, the
+# names of all the class attributes, and if instances have a `__dict__`.
+_class_attributes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _class_attribute_index(cls: type) -> Tuple[FrozenSet[str], bool]:
+    '''
+    Return the names of all attributes defined on `cls` and its bases, and whether its
+    instances have a `__dict__`. Cached on the class until it (or a base) is changed.
+    '''
+    mro = cls.__mro__
+    found = _class_attributes.get(cls)
+    if found is None or found[0] != mro \
+            or not all(c.__dict__.keys() == n for c, n in zip(mro, found[1])):
+        defined = tuple(frozenset(c.__dict__) for c in mro)
+        names = frozenset().union(*defined)
+        has_dict = any('__dict__' in n for n in defined)
+        found = (mro, defined, names, has_dict)
+        _class_attributes[cls] = found
+    return found[2], found[3]
+
+
+def _has_attribute(o: object, name: str) -> bool:
+    'Same as `name in dir(o)`, without building and sorting the list of names'
+    names, has_dict = _class_attribute_index(type(o))
+    return name in names or (has_dict and name in o.__dict__)
+
+
+class _replace_root_transformer(CloningNodeTransformer):
+    '''
+    Rebuild every `DataFrame` in an expression so that `parent` has `filters` applied to it.
+    `memo` holds what has already been rebuilt, by id, so shared parts are done only once.
+    '''
+    def __init__(self, parent: DataFrame, filters: List[Column], memo: Dict[int, DataFrame]):
+        CloningNodeTransformer.__init__(self)
+        self._parent = parent
+        self._filters = filters
+        self._memo = memo
+
+    def visit_ast_DataFrame(self, a: ast_DataFrame):
+        new_df = a.dataframe._rewrite_root_expr(self._parent, self._filters, self._memo)
+        if new_df is a.dataframe:
+            return a
+        return ast_DataFrame(new_df)
 
 
 def _do_not_extend(o: object):
     'Test if the object has the "no-extend" flag'
-    return '__no_arb_attr' in dir(o)
+    return _has_attribute(o, '__no_arb_attr')
 
 
 class DataFrame:
@@ -69,7 +265,11 @@ class DataFrame:
 
     Notes:
         - Any properties we have here will hide the name of a column in this data frame
+        - `DataFrame` uses `__slots__` to stay small, as there can be millions of them. Sub
+          classes without `__slots__` work as usual (and get a `__dict__`).
     '''
+    __slots__ = ('child_expr', 'filter', '_sub_df', '_ancestors', '_rewrites', '__weakref__')
+
     def __init__(self,
                  expr: Optional[ast.AST] = None,
                  filter: Optional[Column] = None,
@@ -86,10 +286,77 @@ class DataFrame:
         self.child_expr: Optional[ast.AST] = expr
         self.filter: Optional[Column] = filter
 
-        self._sub_df: Dict[str, _sub_link_info] = {}
+        # A copy shares (and adds to) the links of the `DataFrame` it was copied from
+        self._sub_df: Mapping[str, _sub_link_info] = \
+            _no_sub_df if df_to_copy is None else df_to_copy._writable_sub_df()
+
+        # Built by `_ancestor_entry` when needed
+        self._ancestors: Optional[Tuple[int, Optional[DataFrame], _filter_list]] = None
+
+        # `_replace_root_expr` results, keyed by the id's of the parent and filters
+        self._rewrites: Optional[Dict[Tuple[int, ...], Tuple[DataFrame, List[Column], DataFrame]]] = None
+
+    def _fingerprint_token(self) -> str:
+        '''
+        Used by `fingerprint` for a source `DataFrame`: override in a sub class to return
+        a string that says which dataset this is.
+        '''
+        return ''
+
+    def _cache_version_token(self) -> str:
+        '''
+        Used by `result_cache` for a source `DataFrame`: override in a sub class to return a
+        string that changes whenever the data changes (file modification times, a dataset
+        version, etc.).
+        '''
+        return ''
+
+    def _writable_sub_df(self) -> _sub_link_map:
+        'Return the sub-links of this `DataFrame`, as a dict that can be added to'
+        if self._sub_df is _no_sub_df:
+            self._sub_df = _sub_link_map()
+        return cast(_sub_link_map, self._sub_df)
+
+    def _defines_attributes(self) -> bool:
+        '''
+        Returns true if looking up an attribute on this `DataFrame` could find something:
+        it has computed columns, or it is a sub class (that may have properties).
+        '''
+        return type(self) is not DataFrame or self._sub_df.n_computed > 0
+
+    def _ancestor_entry(self) -> Tuple[Optional[DataFrame], _filter_list]:
+        '''
+        Return the nearest `DataFrame` we are a (possibly filtered) view of that defines
+        attributes, and the filters between here and there. Each `DataFrame` caches its
+        answer, built from its parent's, until a computed column is added anywhere.
+        '''
+        version = _computed_col_version
+        if self._ancestors is not None and self._ancestors[0] == version:
+            return self._ancestors[1], self._ancestors[2]
+
+        # Find everything up the chain that needs to be (re)built, and build it top down.
+        pending: List[DataFrame] = []
+        p = self
+        while p._ancestors is None or p._ancestors[0] != version:
+            pending.append(p)
+            if not isinstance(p.child_expr, ast_DataFrame):
+                break
+            p = p.child_expr.dataframe
+
+        for d in reversed(pending):
+            if not isinstance(d.child_expr, ast_DataFrame):
+                d._ancestors = (version, None, None)
+                continue
+            parent = d.child_expr.dataframe
+            if parent._defines_attributes():
+                ancestor, filters = parent, None
+            else:
+                _, ancestor, filters = parent._ancestors  # type: ignore
+            if ancestor is not None and d.filter is not None:
+                filters = (d.filter, filters)
+            d._ancestors = (version, ancestor, filters)
 
-        if df_to_copy is not None:
-            self._sub_df = df_to_copy._sub_df
+        return self._ancestors[1], self._ancestors[2]  # type: ignore
 
     def check_attribute_name(self, name) -> None:
         'Throw an error if the attribute name is bad'
@@ -100,7 +367,27 @@ class DataFrame:
         '''
         Find a compatible parent's attribute. If not compatible, then
         return none.
+
+        Only parents with computed columns or that are sub classes are looked at, using
+        the index `_ancestor_entry` builds, so this does not depend on how many filters
+        there are between us and them.
         '''
+        if computed_col_only:
+            ancestor, filters = self._ancestor_entry()
+            segments = [filters]
+            while ancestor is not None:
+                if name in ancestor._sub_df and ancestor._sub_df[name].computed_col:
+                    expr = ancestor._sub_df[name].render(ancestor)
+                    return expr, ancestor, _filters_to_list(segments)
+                if _has_attribute(ancestor, name):
+                    expr = getattr(ancestor, name)
+                    return expr, ancestor, _filters_to_list(segments)
+
+                # Keep going up (the filters returned start with this parent's own)
+                ancestor, filters = ancestor._ancestor_entry()
+                segments.append(filters)
+            return None
+
         p = self
         filters: List[Column] = []
         while p is not None:
@@ -118,7 +405,7 @@ class DataFrame:
                 expr = p._sub_df[name].render(p)
                 return expr, p, filters
 
-            if name in dir(p):
+            if _has_attribute(p, name):
                 # Column is defined in the object
                 # We don't call hasattr as we don't want to generate a new attribute.
                 expr = getattr(p, name)
@@ -130,31 +417,42 @@ class DataFrame:
         '''
         Look through our self, and anything attached to us for the parent dataframe.
         Once we've found it, create a new one, and attach all filters to it.
+
+        The result is remembered, so asking again with the same parent and filters returns
+        the same `DataFrame`.
         '''
+        key = (id(parent),) + tuple(id(f) for f in filters)
+        if self._rewrites is None:
+            self._rewrites = {}
+        found = self._rewrites.get(key)
+        if found is None:
+            # Hold on to the parent and filters so their id's can't be reused
+            found = (parent, list(filters), self._rewrite_root_expr(parent, filters, {}))
+            self._rewrites[key] = found
+        return found[2]
+
+    def _rewrite_root_expr(self, parent: DataFrame, filters: List[Column],
+                           memo: Dict[int, DataFrame]) -> DataFrame:
+        'Does the work for `_replace_root_expr`'
+        found = memo.get(id(self))
+        if found is not None:
+            return found
+
         if self is parent:
             # Ok - we found the parent dataframe. Time to create new dataframes with
             # all filters strung on it.
             df = self
             for f in filters:
                 df = DataFrame(expr=ast_DataFrame(df), filter=f)
-            return df
-
-        # Now we need to recurse and find all data frames and rebuild them.
-        class search_for_ast(CloningNodeTransformer):
-            def __init__(self):
-                CloningNodeTransformer.__init__(self)
-
-            def visit_ast_DataFrame(self, a: ast_DataFrame):
-                new_df = a.dataframe._replace_root_expr(parent, filters)
-                if new_df is a.dataframe:
-                    return a
-                return ast_DataFrame(new_df)
-
-        sa_transform = search_for_ast()
-        new_child = None if self.child_expr is None else sa_transform.visit(self.child_expr)
-        if new_child is not self.child_expr:
-            return DataFrame(expr=new_child, filter=self.filter, df_to_copy=self)
-        return self
+        else:
+            # Now we need to recurse and find all data frames and rebuild them.
+            sa_transform = _replace_root_transformer(parent, filters, memo)
+            new_child = None if self.child_expr is None else sa_transform.visit(self.child_expr)
+            df = self
+            if new_child is not self.child_expr:
+                df = DataFrame(expr=new_child, filter=self.filter, df_to_copy=self)
+        memo[id(self)] = df
+        return df
 
     def __getattr__(self, name: str) -> DataFrame:
         '''Reference a column name'''
@@ -192,7 +490,7 @@ class DataFrame:
                                            ctx=ast.Load())
                 result = DataFrame(expr=child_expr)
 
-            self._sub_df[name] = _sub_link_info(result, False)
+            self._writable_sub_df()[name] = _sub_link_info(result, False)
         return self._sub_df[name].render(self)
 
     def __getitem__(self, expr: Union[Callable, DataFrame, Column, str, int]) -> DataFrame:
@@ -207,7 +505,7 @@ class DataFrame:
                 value=ast_DataFrame(self),
                 slice=ast.Index(value=expr)
             )
-            return DataFrame(expr=c_expr)
+            return _interned(DataFrame(expr=c_expr))
 
         # A branch look up - like a ".pt" rather than ['pt']
         if isinstance(expr, str):
@@ -222,10 +520,10 @@ class DataFrame:
         if isinstance(expr, DataFrame):
             assert expr.filter is None
             assert expr.child_expr is not None
-            expr = Column(bool, expr.child_expr)
+            expr = _interned(Column(bool, expr.child_expr))
         # Redundant, but above too complex for type processor?
         assert isinstance(expr, Column), 'Internal error - filter must be a bool column!'
-        return DataFrame(ast_DataFrame(self), filter=expr)
+        return _interned(DataFrame(ast_DataFrame(self), filter=expr))
 
     def __setitem__(self, key: str,
                     expr: Union[DataFrame, Callable[[DataFrame], DataFrame]]) \
@@ -241,7 +539,13 @@ class DataFrame:
             else:
                 logging.getLogger(__name__).warning(f'Redefinition of DataFrame item "{key}"')
 
-        self._sub_df[key] = _sub_link_info(expr, True)
+        links = self._writable_sub_df()
+        if key not in links:
+            links.n_computed += 1
+        links[key] = _sub_link_info(expr, True)
+
+        global _computed_col_version
+        _computed_col_version += 1
         return self
 
     def __array_ufunc__(self, ufunc, method, *inputs, **kwargs) -> Any:
@@ -271,7 +575,7 @@ class DataFrame:
                               args=[_term_to_ast(a, self) for a in args],
                               keywords=[ast.keyword(arg=k, value=_term_to_ast(v, self))
                                         for k, v in kwargs.items()])
-        return DataFrame(child_expr)
+        return _interned(DataFrame(child_expr))
 
     def __call__(self, *inputs, **kwargs) -> DataFrame:
         '''
@@ -296,7 +600,7 @@ class DataFrame:
                               args=[_term_to_ast(a, base_df.dataframe) for a in inputs],
                               keywords=[ast.keyword(arg=k, value=_term_to_ast(v, self))
                                         for k, v in kwargs.items()])
-        return DataFrame(expr=child_expr)
+        return _interned(DataFrame(expr=child_expr))
 
     def _test_for_extension(self, name: str):
         'If we have the no-extension flag, then bomb out'
@@ -315,21 +619,21 @@ class DataFrame:
         ''' Invert, or logical NOT operation. '''
         self._test_for_extension('operator invert')
         child_expr = ast.UnaryOp(op=ast.Invert(), operand=ast_DataFrame(self))
-        return DataFrame(child_expr)
+        return _interned(DataFrame(child_expr))
 
     def __and__(self, other) -> Column:
         ''' Bitwise and becomes a logical and. '''
         self._test_for_extension('operator and')
         from .utils import _term_to_ast
-        return Column(type(bool), ast.BoolOp(op=ast.And(),
-                      values=[_term_to_ast(self, None), _term_to_ast(other, None)]))
+        return _interned(Column(type(bool), ast.BoolOp(
+            op=ast.And(), values=[_term_to_ast(self, None), _term_to_ast(other, None)])))
 
     def __or__(self, other) -> Column:
         ''' Bitwise and becomes a logical and. '''
         self._test_for_extension('operator or')
         from .utils import _term_to_ast
-        return Column(type(bool), ast.BoolOp(op=ast.Or(),
-                      values=[ast.Name('p', ctx=ast.Load()), _term_to_ast(other, self)]))
+        return _interned(Column(type(bool), ast.BoolOp(
+            op=ast.Or(), values=[ast.Name('p', ctx=ast.Load()), _term_to_ast(other, self)])))
 
     def __binary_operator_compare(self, operator: ast.AST, other: Any) -> Column:
         '''Build a column for a binary operation that results in a column of single values.'''
@@ -340,7 +644,7 @@ class DataFrame:
         other_ast = _term_to_ast(other, self)
         compare_ast = ast.Compare(left=_term_to_ast(self, self), ops=[operator],
                                   comparators=[other_ast])
-        return Column(type(bool), compare_ast)
+        return _interned(Column(type(bool), compare_ast))
 
     def __binary_operator(self, left: Any, operator: ast.AST, right: Any) -> DataFrame:
         '''Build a column for a binary operation that results in a column of single values.'''
@@ -351,7 +655,7 @@ class DataFrame:
         left_ast = _term_to_ast(left, self)
         right_ast = _term_to_ast(right, self)
         operated = ast.BinOp(left=left_ast, op=operator, right=right_ast)
-        return DataFrame(operated)
+        return _interned(DataFrame(operated))
 
     def __lt__(self, other) -> Column:
         ''' x < y '''
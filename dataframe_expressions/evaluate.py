@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import ast
+from functools import reduce
+import operator
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from .asts import ast_Callable, ast_DataFrame, ast_FunctionPlaceholder
+from .data_frame import Column, DataFrame
+from .fingerprint import FingerprintError
+from .render_dataframe import ast_Filter, render, render_callable, render_context
+from .subexpr_cache import subexpr_cache
+from .utils_ast import _child_nodes, constant_value, is_constant
+
+
+class EvaluationError(Exception):
+    '''Thrown when a rendered expression can't be evaluated'''
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+_binary_ops: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+}
+
+_compare_ops: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Methods that can be called on a column, and the numpy function they become
+_column_methods = {
+    'count': 'size',
+    'sum': 'sum',
+    'min': 'min',
+    'max': 'max',
+    'mean': 'mean',
+}
+
+
+class _table:
+    '''
+    A source `DataFrame` (or something under it, like `df.jets`), with the rows selected
+    by the filters applied so far. `mask` is None if every row is selected.
+    '''
+    def __init__(self, path: Tuple[str, ...], mask: Any):
+        self.path = path
+        self.mask = mask
+
+
+class _method:
+    'The `func` of a call like `df.jets.count()`: what it is called on, and its name'
+    def __init__(self, receiver: Any, name: str):
+        self.receiver = receiver
+        self.name = name
+
+
+class _evaluator:
+    def __init__(self, columns: Mapping[str, Any], functions: Mapping[str, Callable],
+                 context: render_context, cache: Optional[subexpr_cache]):
+        import numpy as np
+        self._np = np
+        self._columns = {k: np.asarray(v) for k, v in columns.items()}
+        self._functions = functions
+        self._context = context
+        self._cache = cache
+
+        lengths = {len(v) for v in self._columns.values() if v.ndim > 0}
+        if len(lengths) > 1:
+            raise EvaluationError(f'All columns must be the same length (found {sorted(lengths)})')
+        self._n_rows = lengths.pop() if len(lengths) == 1 else 0
+
+    def evaluate(self, expr: ast.AST, bindings: Dict[int, Any]) -> Any:
+        '''
+        Evaluate `expr`. `bindings` are the values of the arguments of the lambda `expr`
+        came from, by the id of the `DataFrame` that stood in for each.
+        '''
+        # Keys that depend on what a lambda was called with can't be shared
+        keys = None
+        if self._cache is not None and len(bindings) == 0:
+            try:
+                keys = self._cache.keys(expr)
+            except FingerprintError:
+                pass
+        methods = set()
+        values: Dict[int, Any] = {}
+        stack: List[Tuple[ast.AST, bool]] = [(expr, False)]
+        while len(stack) > 0:
+            a, children_done = stack.pop()
+            if id(a) in values:
+                continue
+            if not children_done:
+                if keys is not None and self._cache is not None:
+                    found = self._cache.get(keys[id(a)])
+                    if found is not None:
+                        values[id(a)] = found
+                        continue
+                if isinstance(a, ast.Call):
+                    methods.add(id(a.func))
+                stack.append((a, True))
+                stack.extend((c, False) for c in _child_nodes(a) if id(c) not in values)
+                continue
+
+            start = time.perf_counter()
+            v = self._node(a, values, bindings, id(a) in methods)
+            values[id(a)] = v
+            if keys is not None and self._cache is not None \
+                    and isinstance(v, self._np.ndarray) and v.ndim > 0:
+                self._cache.put(keys[id(a)], v, time.perf_counter() - start)
+
+        return values[id(expr)]
+
+    def _node(self, a: ast.AST, values: Dict[int, Any], bindings: Dict[int, Any],
+              is_method: bool) -> Any:
+        def v(n: Any) -> Any:
+            return values[id(n)] if isinstance(n, ast.AST) else n
+
+        if isinstance(a, ast_DataFrame):
+            found = bindings.get(id(a.dataframe))
+            return found if found is not None else _table((), None)
+        if is_constant(a):
+            return constant_value(a)
+        if isinstance(a, ast.Attribute):
+            if is_method:
+                return _method(v(a.value), a.attr)
+            return self._attribute(v(a.value), a.attr)
+        if isinstance(a, ast_Filter):
+            return self._filter(v(a.expr), v(a.filter))
+        if isinstance(a, ast.BinOp):
+            f = _binary_ops.get(type(a.op))
+            if f is None:
+                raise EvaluationError(f'Unknown binary operator {type(a.op).__name__}')
+            return f(self._column(v(a.left)), self._column(v(a.right)))
+        if isinstance(a, ast.Compare):
+            return self._compare(a, values)
+        if isinstance(a, ast.BoolOp):
+            f = self._np.logical_and if isinstance(a.op, ast.And) else self._np.logical_or
+            return reduce(f, [self._column(v(o)) for o in a.values])
+        if isinstance(a, ast.UnaryOp):
+            return self._unary(a.op, self._column(v(a.operand)))
+        if isinstance(a, ast.Call):
+            return self._call(a, values)
+        if isinstance(a, ast.Subscript):
+            index = a.slice.value if isinstance(a.slice, ast.Index) else a.slice  # type: ignore
+            return self._column(v(a.value))[v(index)]
+        if isinstance(a, ast.Index):
+            return v(a.value)  # type: ignore
+        if isinstance(a, (ast.Tuple, ast.List)):
+            items = [v(e) for e in a.elts]
+            return tuple(items) if isinstance(a, ast.Tuple) else items
+        if isinstance(a, ast.keyword):
+            return v(a.value)
+        if isinstance(a, (ast_Callable, ast_FunctionPlaceholder, ast.Name)):
+            # Only makes sense as the function in a call (or a lambda argument)
+            return a
+        if isinstance(a, (ast.expr_context, ast.operator, ast.cmpop, ast.boolop, ast.unaryop)):
+            return None
+        raise EvaluationError(f'Do not know how to evaluate {type(a).__name__}')
+
+    def _column(self, value: Any) -> Any:
+        'Make sure `value` is a column (or a number), and not a collection'
+        if isinstance(value, _table):
+            name = '.'.join(value.path) if len(value.path) > 0 else 'the source DataFrame'
+            raise EvaluationError(f'{name} is a collection, not a column')
+        if isinstance(value, _method):
+            raise EvaluationError(f'{value.name} is used as a column, but it is a method')
+        return value
+
+    def _attribute(self, value: Any, name: str) -> Any:
+        if not isinstance(value, _table):
+            raise EvaluationError(f'Can not get "{name}" from a column')
+        path = value.path + (name,)
+        dotted = '.'.join(path)
+        if dotted in self._columns:
+            column = self._columns[dotted]
+            return column if value.mask is None else column[value.mask]
+        if any(k.startswith(dotted + '.') for k in self._columns):
+            return _table(path, value.mask)
+        raise EvaluationError(f'No column "{dotted}" was given')
+
+    def _filter(self, value: Any, predicate: Any) -> Any:
+        np = self._np
+        if isinstance(value, _table):
+            keep = np.broadcast_to(np.asarray(predicate, dtype=bool), (self._n_rows,)) \
+                if np.ndim(predicate) == 0 else np.asarray(predicate, dtype=bool)
+            if value.mask is None:
+                if len(keep) != self._n_rows:
+                    raise EvaluationError(f'Filter has {len(keep)} entries, but there are '
+                                          f'{self._n_rows} rows')
+                return _table(value.path, keep)
+            if len(keep) == self._n_rows:
+                return _table(value.path, value.mask & keep)
+            if len(keep) == int(value.mask.sum()):
+                # The predicate was worked out on the rows already selected
+                mask = value.mask.copy()
+                mask[value.mask] = keep
+                return _table(value.path, mask)
+            raise EvaluationError(f'Filter has {len(keep)} entries, which does not match '
+                                  'the rows it is filtering')
+
+        column = np.asarray(self._column(value))
+        keep = np.asarray(predicate, dtype=bool)
+        if keep.ndim == 0:
+            return column if bool(keep) else column[:0]
+        if len(keep) != len(column):
+            raise EvaluationError(f'Filter has {len(keep)} entries, but the column it is '
+                                  f'filtering has {len(column)}')
+        return column[keep]
+
+    def _compare(self, a: ast.Compare, values: Dict[int, Any]) -> Any:
+        operands = [self._column(values[id(o)]) for o in [a.left] + list(a.comparators)]
+        result = None
+        for op, left, right in zip(a.ops, operands, operands[1:]):
+            f = _compare_ops.get(type(op))
+            if f is None:
+                raise EvaluationError(f'Unknown comparison {type(op).__name__}')
+            r = f(left, right)
+            result = r if result is None else self._np.logical_and(result, r)
+        return result
+
+    def _unary(self, op: ast.AST, value: Any) -> Any:
+        np = self._np
+        if isinstance(op, (ast.Invert, ast.Not)):
+            # `~` is a logical not in this library (but is bitwise on integers)
+            if isinstance(op, ast.Not) or np.asarray(value).dtype == bool:
+                return np.logical_not(value)
+            return np.invert(value)
+        if isinstance(op, ast.USub):
+            return np.negative(value)
+        if isinstance(op, ast.UAdd):
+            return value
+        raise EvaluationError(f'Unknown unary operator {type(op).__name__}')
+
+    def _function(self, name: str) -> Callable:
+        'Find a function by the name `DataFrame` gave it'
+        np = self._np
+        if name in self._functions:
+            return self._functions[name]
+        if name == 'abs':
+            return np.abs
+        if name.startswith('np_') and callable(getattr(np, name[3:], None)):
+            return getattr(np, name[3:])
+        if isinstance(getattr(np, name, None), np.ufunc):
+            return getattr(np, name)
+        raise EvaluationError(f'Unknown function "{name}"')
+
+    def _lambda(self, c: ast_Callable, args: List[Any]) -> Any:
+        'Call a lambda with already evaluated arguments'
+        placeholders = [DataFrame() for _ in args]
+        expr, _ = render_callable(c, self._context, *placeholders)
+        return self.evaluate(expr, {id(p): a for p, a in zip(placeholders, args)})
+
+    def _call(self, a: ast.Call, values: Dict[int, Any]) -> Any:
+        func = values[id(a.func)]
+        args = [values[id(arg)] for arg in a.args]
+        kwargs = {k.arg: values[id(k)] for k in getattr(a, 'keywords', [])}
+
+        if isinstance(func, _method):
+            if func.name == 'map' and len(args) == 1 and isinstance(args[0], ast_Callable):
+                return self._lambda(args[0], [func.receiver])
+            if isinstance(func.receiver, _table) and func.name == 'count':
+                return int(func.receiver.mask.sum()) if func.receiver.mask is not None \
+                    else self._n_rows
+            if func.name in _column_methods and len(args) == 0:
+                return getattr(self._np, _column_methods[func.name])(
+                    self._column(func.receiver), **kwargs)
+            raise EvaluationError(f'Unknown method "{func.name}"')
+
+        if any(isinstance(arg, ast_Callable) for arg in args):
+            raise EvaluationError('A lambda can only be passed to "map"')
+        if isinstance(func, ast_Callable):
+            # A computed column: the lambda is passed the collection it belongs to
+            return self._lambda(func, args)
+        args = [self._column(arg) for arg in args]
+        if isinstance(func, ast_FunctionPlaceholder):
+            if func.name not in self._functions:
+                raise EvaluationError(f'No implementation was given for the user function '
+                                      f'"{func.name}"')
+            return self._functions[func.name](*args, **kwargs)
+        if isinstance(func, ast.Name):
+            return self._function(func.id)(*args, **kwargs)
+        raise EvaluationError(f'Do not know how to call {type(func).__name__}')
+
+
+def evaluate(expr: Union[DataFrame, Column, ast.AST], columns: Mapping[str, Any],
+             functions: Optional[Mapping[str, Callable]] = None,
+             context: Optional[render_context] = None,
+             cache: Optional[subexpr_cache] = None) -> Any:
+    '''
+    Evaluate an expression with numpy, over a table of flat columns. A simple backend,
+    and something to check other backends against.
+
+    Arguments:
+        expr        A `DataFrame` or `Column`, or what `render` returned for one
+        columns     The data: the numpy array (or something `numpy.asarray` accepts) for
+                    each source column, by its dotted path (`met`, `jets.pt`). They must
+                    all be the same length - one entry per row.
+        functions   Implementations of user functions (`user_func`), or of any other
+                    function name, by name. They are called with whole arrays.
+        context     The context `expr` was rendered in (used to render lambdas)
+        cache       If given, every array evaluated (outside of a lambda) is stored there,
+                    and anything already there is not evaluated again. It must only be used
+                    with the same `columns` (or the source `DataFrame` should have a
+                    `_cache_version_token` that says which they are).
+
+    Returns:
+        value       A numpy array, or a number for things like `count()`.
+
+    Notes:
+        - Every row has one value for each column: there is no nesting, so `df.jets.pt`
+          is simply the `jets.pt` column.
+        - A filter selects rows. Its predicate can have an entry for every row, or one for
+          each row already selected.
+        - Functions come from `numpy`: ufunc names (`sin`, from `np.sin(df.x)`), `np_`
+          names (`np_where`, from `np.where(...)`), and `abs`.
+        - `count()`, `sum()`, `min()`, `max()` and `mean()` reduce a column, and
+          `map(lambda ...)` calls the lambda with the collection or column.
+        - `numpy` is only imported when this is called.
+    '''
+    if isinstance(expr, (DataFrame, Column)):
+        expr, context = render(expr)
+    e = _evaluator(columns, functions if functions is not None else {},
+                   context if context is not None else render_context(), cache)
+    result = e._column(e.evaluate(expr, {}))
+    if isinstance(result, ast.AST):
+        raise EvaluationError('The expression is a function, not a value')
+    return result
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import ast
+from typing import Dict, List, Tuple
+
+from .asts import ast_Callable
+from .render_dataframe import ast_Filter
+from .utils_ast import _child_nodes, _walk_dag, replace_children
+
+
+class fused_filter:
+    '''
+    One entry in the plan returned by `fuse_filters`: a single mask, `predicate`, that is
+    applied to the sequence `sequence`.
+    '''
+    def __init__(self, node: ast_Filter, n_filters: int):
+        self.node = node
+        self.sequence: ast.AST = node.expr  # type: ignore
+        self.predicate: ast.AST = node.filter  # type: ignore
+        self.n_filters = n_filters
+
+    def __repr__(self) -> str:
+        return f'fused_filter(n_filters={self.n_filters})'
+
+
+def _references(expr: ast.AST, target: ast.AST) -> bool:
+    'Returns true if `target` (by identity) is found anywhere in `expr`'
+    return any(a is target for a in _walk_dag(expr, stop_at=target))
+
+
+def _element_wise(predicate: ast.AST, sequence: ast.AST) -> bool:
+    '''
+    Returns true if every reference to `sequence` in `predicate` is to a single element
+    of it: an attribute of the element, or an operand of an arithmetic, comparison, or
+    boolean operator. If `sequence` is the receiver of a method call (`seq.count()`), an
+    argument to a function, indexed, or `predicate` has a lambda in it, we can't tell.
+    '''
+    nodes = _walk_dag(predicate, stop_at=sequence)
+    if any(isinstance(a, ast_Callable) for a in nodes):
+        return False
+    methods = {id(a.func) for a in nodes if isinstance(a, ast.Call)}
+    for a in nodes:
+        if a is sequence or all(c is not sequence for c in _child_nodes(a)):
+            continue
+        if isinstance(a, ast.Attribute):
+            if id(a) in methods:
+                return False
+        elif not isinstance(a, (ast.BinOp, ast.Compare, ast.BoolOp, ast.UnaryOp)):
+            return False
+    return True
+
+
+def _substitute(expr: ast.AST, old: ast.AST, new: ast.AST) -> ast.AST:
+    'Replace every occurrence of `old` (by identity) in `expr` with `new`'
+    rebuilt: Dict[int, ast.AST] = {id(old): new}
+    for a in _walk_dag(expr):
+        if id(a) not in rebuilt:
+            rebuilt[id(a)] = replace_children(a, rebuilt)
+    return rebuilt[id(expr)]
+
+
+def fuse_filters(expr: ast.AST, push_down_event_filters: bool = False) \
+        -> Tuple[ast.AST, List[fused_filter]]:
+    '''
+    Rewrite the `ast_Filter` chains in a rendered expression so that each sequence is
+    filtered only once.
+
+    Arguments:
+        expr                    A rendered expression (from `render`, for example)
+        push_down_event_filters If true, an event-level filter on a collection
+                                (`df.jets[df.met > 50]`) is moved below the attribute
+                                navigation (`df[df.met > 50].jets`). See the notes.
+
+    Returns:
+        expr                    The rewritten expression. `expr` is not modified; any part
+                                of it that did not change is shared with the result.
+        plan                    One `fused_filter` for each `ast_Filter` in the result, in
+                                the order a backend should apply them (inner first).
+
+    Notes:
+        - `Filter(Filter(seq, f1), f2)` becomes `Filter(seq, f1 and f2)`, where any
+          reference to the inner filter in `f2` is replaced by `seq`. The conjunction is
+          built from binary `ast.BoolOp`'s, so `f1 and f2 and f3` is `(f1 and f2) and f3`.
+        - Filters are only merged when `f2` uses the filtered sequence element by element.
+          If it calls a method on the whole sequence (`d1[d1.count() > 2]`), passes it to a
+          function, or contains a lambda, the filters are left as they are.
+        - Pushing an event-level filter below attribute navigation removes failing events
+          rather than leaving them with an empty collection. That is the same result if the
+          collection is flattened, but changes the shape of per-event results (like
+          `df.jets[df.met > 50].count()`), so it is off by default.
+    '''
+    # id -> (fused node, number of original filters in it)
+    n_filters: Dict[int, Tuple[ast.AST, int]] = {}
+
+    def count(f: ast.AST) -> int:
+        return n_filters[id(f)][1] if id(f) in n_filters else 1
+
+    def fuse(f: ast_Filter) -> ast.AST:
+        inner = f.expr
+        predicate = f.filter
+        assert inner is not None and predicate is not None
+        if isinstance(inner, ast_Filter) and _element_wise(predicate, inner):
+            inner_predicate = inner.filter
+            assert inner.expr is not None and inner_predicate is not None
+            fused = ast_Filter(inner.expr,
+                               ast.BoolOp(op=ast.And(),
+                                          values=[inner_predicate,
+                                                  _substitute(predicate, inner, inner.expr)]))
+            n_filters[id(fused)] = (fused, count(inner) + count(f))
+            return fused
+        if push_down_event_filters and isinstance(inner, ast.Attribute) \
+                and not _references(predicate, inner) \
+                and _references(predicate, inner.value) \
+                and _element_wise(predicate, inner.value):
+            moved = ast_Filter(inner.value, predicate)
+            n_filters[id(moved)] = (moved, count(f))
+            return ast.Attribute(value=fuse(moved), attr=inner.attr, ctx=ast.Load())
+        return f
+
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in _walk_dag(expr):
+        new_a = replace_children(a, rebuilt)
+        if isinstance(new_a, ast_Filter):
+            new_a = fuse(new_a)
+        rebuilt[id(a)] = new_a
+    result = rebuilt[id(expr)]
+
+    plan = [fused_filter(a, count(a))
+            for a in _walk_dag(result) if isinstance(a, ast_Filter)]
+    return result, plan
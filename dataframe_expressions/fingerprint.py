@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import ast
+import functools
+import hashlib
+import pickle
+import sys
+import types
+from typing import Any, Dict, List, Union
+
+from .asts import ast_Callable, ast_Column, ast_DataFrame, ast_FunctionPlaceholder
+from .data_frame import Column, DataFrame
+from .render_dataframe import render
+from .utils_ast import _walk_dag
+
+
+class FingerprintError(Exception):
+    '''Thrown when an expression holds a value whose contents can't be described'''
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def _digest(*parts: Any) -> str:
+    'Hash a tuple of strings, numbers, and other tuples (of the same)'
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _type_name(t: type) -> str:
+    return f'{t.__module__}.{t.__qualname__}'
+
+
+class _fingerprinter:
+    '''
+    Holds the state for one `fingerprint` call: the source `DataFrame`s in the order they
+    were found, and the code objects and `DataFrame`s that are already being hashed (so
+    that a recursive function, or a lambda that refers to the `DataFrame` it is part of,
+    does not loop forever).
+    '''
+    def __init__(self, canonical: bool = False):
+        self._canonical = canonical
+        self._roots: Dict[int, int] = {}
+        self._active: Dict[int, int] = {}
+
+        # The source `DataFrame`s, in the order they were found
+        self.sources: List[DataFrame] = []
+
+    def expression(self, d: Union[DataFrame, Column]) -> str:
+        'Digest of a `DataFrame` or `Column`'
+        if id(d) in self._active:
+            return _digest('cycle', self._active[id(d)])
+        self._active[id(d)] = len(self._active)
+        try:
+            expr, _ = render(d)
+            if self._canonical:
+                from .canonical import canonicalize
+                expr = canonicalize(expr)
+            return self.ast(expr)
+        finally:
+            del self._active[id(d)]
+
+    def ast(self, expr: ast.AST) -> str:
+        'Digest of a rendered expression'
+        digests: Dict[int, str] = {}
+        for a in _walk_dag(expr):
+            digests[id(a)] = self._node(a, digests)
+        return digests[id(expr)]
+
+    def _node(self, a: ast.AST, digests: Dict[int, str]) -> str:
+        if isinstance(a, ast_DataFrame):
+            return self._root(a.dataframe)
+        if isinstance(a, ast_Column):
+            return _digest('column', self.expression(a.column))
+        if isinstance(a, ast_Callable):
+            return _digest('callable', self.value(a.callable))
+        if isinstance(a, ast_FunctionPlaceholder):
+            return _digest('user_func', getattr(a.callable, '__module__', None),
+                           getattr(a.callable, '__qualname__', a.name))
+
+        def field(v: Any) -> Any:
+            if isinstance(v, ast.AST):
+                return digests[id(v)]
+            if isinstance(v, list):
+                return tuple(field(item) for item in v)
+            return self.value(v)
+
+        return _digest(type(a).__name__,
+                       tuple((f, field(getattr(a, f, None))) for f in a._fields))
+
+    def _root(self, df: DataFrame) -> str:
+        'Source `DataFrame`s are known by their type and the order we found them in'
+        index = self._roots.get(id(df))
+        if index is None:
+            index = len(self._roots)
+            self._roots[id(df)] = index
+            self.sources.append(df)
+        return _digest('root', _type_name(type(df)), index, df._fingerprint_token())
+
+    def _code(self, code: types.CodeType) -> Any:
+        if id(code) in self._active:
+            return ('cycle', self._active[id(code)])
+        self._active[id(code)] = len(self._active)
+        try:
+            # The file name and line numbers are left out, so moving code around does not
+            # change anything.
+            return ('code', code.co_argcount, code.co_kwonlyargcount, code.co_flags,
+                    code.co_code.hex(), tuple(self.value(c) for c in code.co_consts),
+                    code.co_names, code.co_varnames, code.co_freevars)
+        finally:
+            del self._active[id(code)]
+
+    def _cell(self, cell: Any) -> Any:
+        try:
+            return self.value(cell.cell_contents)
+        except ValueError:
+            # Not assigned yet
+            return ('empty',)
+
+    def _function(self, f: types.FunctionType) -> Any:
+        'A python function is its code, its default arguments, and the values it captures'
+        # A recursive function finds itself in its globals (or closure)
+        if id(f) in self._active:
+            return ('cycle', self._active[id(f)])
+        self._active[id(f)] = len(self._active)
+        try:
+            code = f.__code__
+            closure = tuple((name, self._cell(cell))
+                            for name, cell in zip(code.co_freevars, f.__closure__ or ()))
+
+            # Globals it reads - including names that are only attributes. Those won't be
+            # found (or will be, and then the value just doesn't matter).
+            names: List[str] = []
+            pending = [code]
+            while len(pending) > 0:
+                c = pending.pop()
+                names.extend(c.co_names)
+                pending.extend(k for k in c.co_consts if isinstance(k, types.CodeType))
+            captured = tuple((name, self.value(f.__globals__[name]))
+                             for name in sorted(set(names)) if name in f.__globals__)
+
+            return ('function', self._code(code), self.value(f.__defaults__), closure,
+                    captured)
+        finally:
+            del self._active[id(f)]
+
+    def value(self, v: Any) -> Any:
+        'Stable description of a python value, for hashing'
+        if v is None or isinstance(v, (bool, int, str)):
+            return (type(v).__name__, v)
+        if isinstance(v, float):
+            return ('float', repr(v))
+        if isinstance(v, bytes):
+            return ('bytes', v.hex())
+        if isinstance(v, (tuple, list)):
+            return (type(v).__name__,) + tuple(self.value(i) for i in v)
+        if isinstance(v, (set, frozenset)):
+            return (type(v).__name__,) + tuple(sorted(repr(self.value(i)) for i in v))
+        if isinstance(v, dict):
+            return ('dict',) + tuple(sorted(repr((self.value(k), self.value(i)))
+                                            for k, i in v.items()))
+        if isinstance(v, (DataFrame, Column)):
+            return ('dataframe', self.expression(v))
+        if isinstance(v, types.CodeType):
+            return self._code(v)
+        if isinstance(v, types.FunctionType):
+            return self._function(v)
+        if isinstance(v, types.ModuleType):
+            return ('module', v.__name__)
+        if isinstance(v, type):
+            return ('type', _type_name(v))
+        np = sys.modules.get('numpy')
+        if np is not None and isinstance(v, np.ndarray):
+            if v.dtype.hasobject:
+                return ('ndarray', v.dtype.str, v.shape, self.value(v.tolist()))
+            return ('ndarray', v.dtype.str, v.shape, v.tobytes().hex())
+        if np is not None and isinstance(v, np.generic):
+            return ('numpy', _type_name(type(v)), self.value(v.item()))
+        if isinstance(v, types.MethodType):
+            return ('method', self.value(v.__self__), self.value(v.__func__))
+        if isinstance(v, functools.partial):
+            return ('partial', self.value(v.func), self.value(v.args), self.value(v.keywords))
+        if isinstance(v, types.BuiltinFunctionType) \
+                and not isinstance(v.__self__, (types.ModuleType, type(None))):
+            # A method of a builtin object, like `[].append`
+            return ('method', self.value(v.__self__), v.__qualname__)
+        if callable(v) and hasattr(v, '__qualname__'):
+            # Builtins, and the like
+            return ('callable', getattr(v, '__module__', None), v.__qualname__)
+        return self._object(v)
+
+    def _object(self, v: Any) -> Any:
+        '''
+        Anything else is described by what it holds: its attributes if it is a plain
+        python object, otherwise its pickle.
+        '''
+        if id(v) in self._active:
+            return ('cycle', self._active[id(v)])
+        self._active[id(v)] = len(self._active)
+        try:
+            t = type(v)
+            slots = [s for c in t.__mro__ for s in getattr(c, '__slots__', ())
+                     if s not in ('__dict__', '__weakref__')]
+            if t.__reduce_ex__ is object.__reduce_ex__ \
+                    and (hasattr(v, '__dict__') or len(slots) > 0):
+                state = dict(getattr(v, '__dict__', {}))
+                state.update((s, getattr(v, s)) for s in slots if hasattr(v, s))
+                return ('object', _type_name(t), self.value(state))
+            try:
+                return ('pickle', _type_name(t),
+                        hashlib.sha256(pickle.dumps(v, protocol=4)).hexdigest())
+            except Exception as e:
+                raise FingerprintError(f'Unable to fingerprint a value of type '
+                                       f'{_type_name(t)}: {e}') from e
+        finally:
+            del self._active[id(v)]
+
+
+def fingerprint(d: Union[DataFrame, Column], canonical: bool = False) -> str:
+    '''
+    Return a digest of the structure of an expression, to use as a key in a cache of
+    results or plans.
+
+    Arguments:
+        d           The `DataFrame` or `Column`
+        canonical   If true, the expression is put in canonical form (see `canonicalize`)
+                    first, so `10 < df.x` and `df.x > 10` have the same digest.
+
+    Returns:
+        digest      A sha256 hex digest. Two expressions that render to the same thing have
+                    the same digest, in this process or any other.
+
+    Notes:
+        - Literals, attribute names, filters, and computed columns are all included, as
+          `render` expands them.
+        - A source `DataFrame` is known by its type and the order it is first reached in.
+          A sub class that stands for a particular dataset should override
+          `DataFrame._fingerprint_token` to say which one.
+        - A lambda is hashed by its code (but not where it is written), the values it
+          captures, and the values of the globals it reads. A user function is known by
+          its module and name.
+        - Captured numpy arrays and scalars are hashed by their contents. Other captured
+          objects are hashed by their attributes (or, failing that, their pickle) - their
+          `repr` is often not the same from one run to the next.
+        - If a captured value can't be described, `FingerprintError` is thrown rather
+          than returning a digest that may be shared with a different expression.
+    '''
+    return _fingerprinter(canonical).expression(d)
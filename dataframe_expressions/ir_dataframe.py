@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import ast
+from array import array
+from enum import IntEnum
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple, Union
+
+from .asts import ast_Callable, ast_DataFrame, ast_FunctionPlaceholder
+from .data_frame import Column, DataFrame
+from .render_dataframe import ast_Filter, render_context, render_many
+from .utils_ast import _literal_key, constant_value, is_constant, make_constant
+
+
+class ir_op(IntEnum):
+    '''
+    The operation of a node in an `ir_table`. The comments give the children (by
+    node id) and what is held in the node's constant pool entry.
+    '''
+    SOURCE = 1          # no children; the source `DataFrame`
+    ATTRIBUTE = 2       # [value]; attribute name
+    FILTER = 3          # [expr, filter]; none
+    CALL = 4            # [func, args..., keyword values...]; keyword names (tuple)
+    BINOP = 5           # [left, right]; operator name (`Add`, `Div`, etc.)
+    COMPARE = 6         # [left, comparators...]; operator names (tuple)
+    BOOLOP = 7          # [values...]; operator name (`And`, `Or`)
+    UNARYOP = 8         # [operand]; operator name (`Invert`, `USub`, etc.)
+    CONSTANT = 9        # no children; the value
+    NAME = 10           # no children; the name
+    TUPLE = 11          # [elements...]; none
+    LIST = 12           # [elements...]; none
+    SUBSCRIPT = 13      # [value] or [value, index]; index if it is not an expression
+    CALLABLE = 14       # no children; the `ast_Callable`
+    FUNCTION = 15       # no children; the `ast_FunctionPlaceholder`
+    OPAQUE = 16         # no children; an `ast.AST` this table does not know about
+
+
+# Marks a node with no constant pool entry
+_no_constant = -1
+
+
+class ir_table:
+    '''
+    A compact, flat, representation of a rendered expression DAG.
+
+    - Every node has an integer id, and nodes are stored in topological order: a node's
+      children always have smaller ids than it does.
+    - The operation, constant pool index, and children of each node are held in
+      `array`'s. The children of node `i` are `children[child_start[i]:child_start[i+1]]`.
+    - Names, operators, literals, and python objects are stored once each in `pool`.
+    - `roots` holds the node id of each expression that was added to the table.
+    '''
+    def __init__(self):
+        self.ops = array('B')
+        self.constants = array('q')
+        self.child_start = array('q', [0])
+        self.children = array('q')
+        self.pool: List[Any] = []
+        self.roots: List[int] = []
+        self._pool_index: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def _intern_constant(self, v: Any) -> int:
+        'Add `v` to the pool (if it isn\'t already there) and return its index'
+        key = _literal_key(v)
+        index = self._pool_index.get(key)
+        if index is None:
+            index = len(self.pool)
+            self.pool.append(v)
+            self._pool_index[key] = index
+        return index
+
+    def add_node(self, op: ir_op, children: List[int], constant: Any = None,
+                 has_constant: bool = False) -> int:
+        '''
+        Add a node to the end of the table and return its id. All `children` must already
+        be in the table.
+        '''
+        node_id = len(self.ops)
+        assert all(0 <= c < node_id for c in children), \
+            'Internal Error: children must be added before their parents'
+        self.ops.append(int(op))
+        self.constants.append(self._intern_constant(constant) if has_constant
+                              else _no_constant)
+        self.children.extend(children)
+        self.child_start.append(len(self.children))
+        return node_id
+
+    def op(self, node_id: int) -> ir_op:
+        'Return the operation of a node'
+        return ir_op(self.ops[node_id])
+
+    def children_of(self, node_id: int) -> array:
+        'Return the ids of the children of a node'
+        return self.children[self.child_start[node_id]:self.child_start[node_id + 1]]
+
+    def constant(self, node_id: int) -> Any:
+        'Return the constant pool entry for a node (or None if it has none)'
+        index = self.constants[node_id]
+        return None if index == _no_constant else self.pool[index]
+
+    def nodes(self) -> Iterator[Tuple[int, ir_op, array, Any]]:
+        'Iterate over (id, operation, children, constant) for every node, in order'
+        for node_id in range(len(self.ops)):
+            yield node_id, self.op(node_id), self.children_of(node_id), \
+                self.constant(node_id)
+
+
+def _ast_children_and_constant(a: ast.AST) -> Tuple[ir_op, List[ast.AST], Any, bool]:
+    '''
+    Split an `ast.AST` into its operation, child nodes and constant.
+    '''
+    if isinstance(a, ast_DataFrame):
+        return ir_op.SOURCE, [], a.dataframe, True
+    if isinstance(a, ast.Attribute):
+        return ir_op.ATTRIBUTE, [a.value], a.attr, True
+    if isinstance(a, ast_Filter):
+        return ir_op.FILTER, [a.expr, a.filter], None, False
+    if isinstance(a, ast.Call):
+        keywords = getattr(a, 'keywords', [])
+        return ir_op.CALL, [a.func] + list(a.args) + [k.value for k in keywords], \
+            tuple(k.arg for k in keywords), True
+    if isinstance(a, ast.BinOp):
+        return ir_op.BINOP, [a.left, a.right], type(a.op).__name__, True
+    if isinstance(a, ast.Compare):
+        return ir_op.COMPARE, [a.left] + list(a.comparators), \
+            tuple(type(o).__name__ for o in a.ops), True
+    if isinstance(a, ast.BoolOp):
+        return ir_op.BOOLOP, list(a.values), type(a.op).__name__, True
+    if isinstance(a, ast.UnaryOp):
+        return ir_op.UNARYOP, [a.operand], type(a.op).__name__, True
+    if is_constant(a):
+        return ir_op.CONSTANT, [], constant_value(a), True
+    if isinstance(a, ast.Name):
+        return ir_op.NAME, [], a.id, True
+    if isinstance(a, ast.Tuple):
+        return ir_op.TUPLE, list(a.elts), None, False
+    if isinstance(a, ast.List):
+        return ir_op.LIST, list(a.elts), None, False
+    if isinstance(a, ast.Subscript):
+        index = a.slice.value if isinstance(a.slice, ast.Index) else a.slice  # type: ignore
+        if isinstance(index, ast.AST):
+            return ir_op.SUBSCRIPT, [a.value, index], None, False
+        return ir_op.SUBSCRIPT, [a.value], index, True
+    if isinstance(a, ast_Callable):
+        return ir_op.CALLABLE, [], a, True
+    if isinstance(a, ast_FunctionPlaceholder):
+        return ir_op.FUNCTION, [], a, True
+    return ir_op.OPAQUE, [], a, True
+
+
+def ast_to_ir(exprs: List[ast.AST], table: Optional[ir_table] = None) -> ir_table:
+    '''
+    Convert rendered expressions into an `ir_table`.
+
+    Arguments:
+        exprs       List of rendered `ast.AST` expressions
+        table       Table to add them to. If None, a new one is created.
+
+    Returns:
+        table       The table, with one entry in `roots` for each of `exprs`.
+
+    Notes:
+        Nodes are matched by object identity, so anything shared in the rendered DAG
+        is a single node in the table.
+    '''
+    if table is None:
+        table = ir_table()
+
+    node_ids: Dict[int, Tuple[ast.AST, int]] = {}
+    for expr in exprs:
+        stack: List[Tuple[ast.AST, bool]] = [(expr, False)]
+        while len(stack) > 0:
+            a, children_done = stack.pop()
+            if id(a) in node_ids:
+                continue
+            op, children, constant, has_constant = _ast_children_and_constant(a)
+            if not children_done:
+                pending = [c for c in children if id(c) not in node_ids]
+                if len(pending) > 0:
+                    stack.append((a, True))
+                    stack.extend((c, False) for c in reversed(pending))
+                    continue
+            node_ids[id(a)] = (a, table.add_node(op, [node_ids[id(c)][1] for c in children],
+                                                 constant, has_constant))
+        table.roots.append(node_ids[id(expr)][1])
+
+    return table
+
+
+def _ir_node_to_ast(table: ir_table, node_id: int, built: List[ast.AST]) -> ast.AST:
+    '''
+    Build the `ast.AST` for one node. All its children must already be in `built`.
+    '''
+    op = table.op(node_id)
+    children = [built[c] for c in table.children_of(node_id)]
+    constant = table.constant(node_id)
+
+    if op == ir_op.SOURCE:
+        return ast_DataFrame(constant)
+    if op == ir_op.ATTRIBUTE:
+        return ast.Attribute(value=children[0], attr=constant, ctx=ast.Load())
+    if op == ir_op.FILTER:
+        return ast_Filter(children[0], children[1])
+    if op == ir_op.CALL:
+        n_args = len(children) - 1 - len(constant)
+        return ast.Call(func=children[0], args=children[1:1 + n_args],
+                        keywords=[ast.keyword(arg=k, value=v)
+                                  for k, v in zip(constant, children[1 + n_args:])])
+    if op == ir_op.BINOP:
+        return ast.BinOp(left=children[0], op=getattr(ast, constant)(), right=children[1])
+    if op == ir_op.COMPARE:
+        return ast.Compare(left=children[0], ops=[getattr(ast, o)() for o in constant],
+                           comparators=children[1:])
+    if op == ir_op.BOOLOP:
+        return ast.BoolOp(op=getattr(ast, constant)(), values=children)
+    if op == ir_op.UNARYOP:
+        return ast.UnaryOp(op=getattr(ast, constant)(), operand=children[0])
+    if op == ir_op.CONSTANT:
+        return make_constant(constant)
+    if op == ir_op.NAME:
+        return ast.Name(id=constant, ctx=ast.Load())
+    if op == ir_op.TUPLE:
+        return ast.Tuple(elts=children)
+    if op == ir_op.LIST:
+        return ast.List(elts=children)
+    if op == ir_op.SUBSCRIPT:
+        index = children[1] if len(children) > 1 else constant
+        return ast.Subscript(value=children[0], slice=ast.Index(value=index))
+    assert op in (ir_op.CALLABLE, ir_op.FUNCTION, ir_op.OPAQUE), \
+        f'Internal Error: unknown ir operation {op}'
+    return constant
+
+
+def ir_to_ast(table: ir_table) -> List[ast.AST]:
+    '''
+    Convert an `ir_table` back into `ast.AST` expressions.
+
+    Returns:
+        exprs       One `ast.AST` for each entry in the table's `roots`. A node that
+                    is shared in the table is a single, shared, `ast.AST` object.
+    '''
+    built: List[ast.AST] = []
+    for node_id in range(len(table)):
+        built.append(_ir_node_to_ast(table, node_id, built))
+    return [built[r] for r in table.roots]
+
+
+def render_ir(d: Union[DataFrame, Column, List[Union[DataFrame, Column]]],
+              in_context: Optional[render_context] = None) -> Tuple[ir_table, render_context]:
+    '''
+    Render a `DataFrame` (or a list of them) into a flat `ir_table` rather than an
+    `ast.AST` tree.
+
+    Arguments:
+        d           The `DataFrame` or `Column`, or a list of them, to render
+        in_context  Context to render in. If None, a new one is created.
+
+    Returns:
+        table       The `ir_table`, with one entry in `roots` for each `DataFrame`.
+        context     The context used to render. It can be used with `render_callable`
+                    for the `ast_Callable` objects found in `CALLABLE` nodes.
+    '''
+    ds = d if isinstance(d, list) else [d]
+    exprs, context = render_many(ds, in_context)
+    return ast_to_ir(exprs), context
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import ast
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .asts import ast_Callable, ast_DataFrame
+from .data_frame import Column, DataFrame
+from .render_dataframe import ast_Filter, render, render_callable, render_context
+from .utils_ast import _walk_dag
+
+
+def _source_paths(expr: ast.AST, paths: Set[Tuple[str, ...]], callables: List[ast_Callable]):
+    '''
+    Add the path of every attribute chain in `expr` that is rooted at a source `DataFrame`
+    to `paths`, and every lambda found to `callables`.
+
+    Notes:
+        - Filters and indexing (`df.jets[0]`) are looked through: `df.jets[...].pt` is
+          `jets.pt`.
+        - The attribute that names a method (`count` in `df.jets.count()`) is not a path.
+    '''
+    nodes = _walk_dag(expr)
+    methods = {id(a.func) for a in nodes if isinstance(a, ast.Call)}
+    path_of: Dict[int, Optional[Tuple[str, ...]]] = {}
+    for a in nodes:
+        path: Optional[Tuple[str, ...]] = None
+        if isinstance(a, ast_DataFrame):
+            path = ()
+        elif isinstance(a, ast.Attribute):
+            parent = path_of[id(a.value)]
+            path = None if parent is None else parent + (a.attr,)
+        elif isinstance(a, ast_Filter):
+            path = path_of[id(a.expr)]
+        elif isinstance(a, ast.Subscript):
+            path = path_of[id(a.value)]
+        elif isinstance(a, ast_Callable):
+            callables.append(a)
+        path_of[id(a)] = path
+        if path is not None and len(path) > 0 and id(a) not in methods:
+            paths.add(path)
+
+
+def required_columns(d: Union[DataFrame, Column]) -> Set[str]:
+    '''
+    Return the source columns that have to be read to evaluate an expression.
+
+    Arguments:
+        d           The `DataFrame` or `Column` that will be evaluated
+
+    Returns:
+        columns     The path, from the source `DataFrame`, of every column the expression
+                    touches, dotted (`jets.pt`, `met`). Only leaves are returned: if
+                    `jets.pt` is needed, `jets` is not listed on its own.
+
+    Notes:
+        - Filters, computed columns (`df.jets['ptgev'] = ...`), and aliases are all
+          followed, as `render` expands them.
+        - Every lambda (in a computed column or in a call like `map`) is rendered with
+          `render_callable`, using the `DataFrame` it was attached to as its argument, and
+          the columns it uses are included.
+        - Names of methods (`count` in `df.jets.count()`) are not columns, but what they are
+          called on is (`jets`, here).
+        - If the expression refers to more than one source `DataFrame`, the paths from all
+          of them are returned together.
+    '''
+    expr, context = render(d)
+
+    paths: Set[Tuple[str, ...]] = set()
+    rendered: Dict[int, ast_Callable] = {}
+    pending: List[Tuple[ast.AST, render_context]] = [(expr, context)]
+    while len(pending) > 0:
+        e, ctx = pending.pop()
+        callables: List[ast_Callable] = []
+        _source_paths(e, paths, callables)
+        for c in callables:
+            if id(c) in rendered or c.dataframe is None:
+                continue
+            rendered[id(c)] = c
+            pending.append(render_callable(c, ctx, c.dataframe))
+
+    dotted = {'.'.join(p) for p in paths}
+    return {p for p in dotted if not any(o.startswith(p + '.') for o in dotted)}
@@ -1,11 +1,13 @@
 from __future__ import annotations
 import ast
-from dataframe_expressions.dump_dataframe import dumps
-from typing import Dict, Optional, Union, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Iterator, List, MutableMapping, Optional, TypeVar, Union, Tuple
 import logging
+import weakref
 
 from dataframe_expressions import Column, DataFrame, ast_Callable, ast_Column, ast_DataFrame
-from .utils_ast import CloningNodeTransformer
+from .tracing import _finish, _log_render, _start
+from .utils_ast import CloningNodeTransformer, intern_ast
 
 
 class ast_Filter (ast.AST):
@@ -29,19 +31,140 @@ class ast_Filter (ast.AST):
         self.filter = filter
 
 
+K = TypeVar('K')
+V = TypeVar('V')
+
+# Marks a key that was deleted in a layer of a `_scoped_dict`
+_deleted = object()
+_missing = object()
+
+
+class _scope_layer:
+    '''
+    A frozen layer of a `_scoped_dict`. It is never modified once it is part of a chain.
+    '''
+    def __init__(self, data: Dict[Any, Any], parent: Optional[_scope_layer]):
+        self.data = data
+        self.parent = parent
+        self.depth = 1 if parent is None else parent.depth + 1
+        # Entries in this layer and all those below it
+        self.size = len(data) if parent is None else len(data) + parent.size
+
+
+class _scoped_dict(MutableMapping[K, V], Generic[K, V]):
+    '''
+    A copy-on-write dictionary. `fork` returns a child in O(1): the child and this
+    dictionary share everything seen so far as frozen layers, and each only stores its
+    own additions (and deletions) from then on. Neither will see changes made by
+    the other after the fork.
+    '''
+
+    # Once the chain of frozen layers is this long, `fork` collapses it into one layer
+    _max_depth = 16
+
+    def __init__(self, frozen: Optional[_scope_layer] = None):
+        self._own: Dict[Any, Any] = {}
+        self._frozen = frozen
+
+    def fork(self) -> _scoped_dict[K, V]:
+        '''
+        Return a child dictionary that starts with the current contents of this one.
+        '''
+        if len(self._own) > 0:
+            self._frozen = _scope_layer(self._own, self._frozen)
+            self._own = {}
+        if self._frozen is not None and self._frozen.depth > self._max_depth:
+            self._frozen = _scope_layer(dict(self.items()), None)
+        return _scoped_dict(self._frozen)
+
+    @property
+    def n_stored(self) -> int:
+        '''
+        Number of entries held, in this dictionary and all the layers it shares. Keys that
+        are overwritten (or deleted) in a later layer are counted again.
+        '''
+        return len(self._own) + (0 if self._frozen is None else self._frozen.size)
+
+    def _find(self, key: Any) -> Any:
+        '''
+        Look for the value, walking down the layers. Returns `_deleted` if not found.
+        '''
+        v = self._own.get(key, _missing)
+        if v is not _missing:
+            return v
+        layer = self._frozen
+        while layer is not None:
+            v = layer.data.get(key, _missing)
+            if v is not _missing:
+                return v
+            layer = layer.parent
+        return _deleted
+
+    def get(self, key: K, default: Any = None) -> Any:
+        v = self._find(key)
+        return default if v is _deleted else v
+
+    def __getitem__(self, key: K) -> V:
+        v = self._find(key)
+        if v is _deleted:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) is not _deleted
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self._own[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        if self._find(key) is _deleted:
+            raise KeyError(key)
+        self._own[key] = _deleted
+
+    def __iter__(self) -> Iterator[K]:
+        seen = set()
+        layer: Optional[_scope_layer] = _scope_layer(self._own, self._frozen)
+        while layer is not None:
+            for k, v in layer.data.items():
+                if k not in seen:
+                    seen.add(k)
+                    if v is not _deleted:
+                        yield k
+            layer = layer.parent
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
 class render_context:
     '''
     Class for internal use - maintains context and references as we move
     through the resolution. While this is returned to user code, it should
     not be accessed by user code!
+
+    Creating a context from a template is O(1): the two share what the template
+    has seen so far, and each records only its own additions after that.
+
+    The results of `render_callable` are remembered (along with the callable, its
+    arguments, and the context it was rendered in), until something new is rendered in
+    the context.
     '''
     def __init__(self, template: Optional[render_context] = None):
         if template is None:
-            self._seen_datasources: Dict[int, ast_DataFrame] = {}
-            self._resolved: Dict[int, ast.AST] = {}
+            self._seen_datasources: _scoped_dict[int, ast_DataFrame] = _scoped_dict()
+            self._resolved: _scoped_dict[Hashable, ast.AST] = _scoped_dict()
+            self._interned: _scoped_dict[int, Tuple[ast.AST, ast.AST]] = _scoped_dict()
         else:
-            self._seen_datasources = template._seen_datasources.copy()
-            self._resolved = template._resolved.copy()
+            self._seen_datasources = template._seen_datasources.fork()
+            self._resolved = template._resolved.fork()
+            self._interned = template._interned.fork()
+        self._callable_memo: Dict[Hashable, Tuple[ast_Callable, tuple, ast.AST,
+                                                  render_context]] = {}
+
+    def _changed(self):
+        'Something was added to the context: results rendered before may differ now'
+        if len(self._callable_memo) > 0:
+            self._callable_memo.clear()
 
     def _lookup_dataframe(self, df: DataFrame) -> ast_DataFrame:
         '''
@@ -51,6 +174,7 @@ class render_context:
         h = hash(str(df))
         if h not in self._seen_datasources:
             self._seen_datasources[h] = ast_DataFrame(df)
+            self._changed()
         return self._seen_datasources[h]
 
     def _resolve_ast(self, a: ast.AST) -> ast.AST:
@@ -58,41 +182,213 @@ class render_context:
         Look to see if this `ast.AST` has already been run, and if so, return
         the same object to make downstream processing (and loop connection)
         easier.
+
+        Nodes are hash-consed: each node's key is built once from its children's
+        canonical nodes and the identity of any `DataFrame` or callable it holds.
         '''
-        h = hash(ast.dump(a))
-        if h not in self._resolved:
-            self._resolved[h] = a
-        return self._resolved[h]
+        if id(a) not in self._interned:
+            self._changed()
+        return intern_ast(a, self._resolved, self._interned)
 
 
-class _parent_subs(CloningNodeTransformer):
-    @classmethod
-    def transform(cls, a: ast.AST,
-                  context: render_context) -> ast.AST:
-        v = _parent_subs(context)
-        return v.visit(a)
+RenderItem = Union[DataFrame, Column]
+
+
+class _render_cache:
+    '''
+    Process-wide cache of rendered `DataFrame` and `Column` objects, so that a prefix
+    shared by many expressions is only rendered once.
+
+    - Entries are keyed by object identity. The key is held by weak reference, so an
+      entry is never returned for a different object that re-used the `id`.
+    - At most `max_size` entries are kept, least recently used are dropped first.
+    - All cached renders share one `render_context`, so a cached prefix and anything
+      rendered on top of it share `ast.AST` objects. That context is dropped (along
+      with all the entries) when it holds too many nodes, or once more entries have
+      been dropped than are left.
+    - The rendered `ast.AST`s and the shared context hold the source `DataFrame` of
+      everything rendered (and so everything built from it), as well as what
+      `render_callable` remembers. Dropping an expression does not free it: that
+      happens when the context is dropped.
+    '''
+
+    # The shared context is reset once it holds this many nodes per allowed entry
+    _nodes_per_entry = 100
+
+    def __init__(self, max_size: int):
+        assert max_size > 0, 'Render cache must be allowed to hold at least one item'
+        self._max_size = max_size
+        self._entries: OrderedDict[int, Tuple[weakref.ref, ast.AST]] = OrderedDict()
+        self.context = render_context()
+        # Entries evicted or collected since the context was created
+        self._n_dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        'Drop all entries and the shared context'
+        self._entries.clear()
+        self.context = render_context()
+        self._n_dropped = 0
+
+    def lookup(self, d: RenderItem) -> Optional[ast.AST]:
+        '''
+        Return the cached `ast.AST` for `d` or None if it isn't cached.
+        '''
+        entry = self._entries.get(id(d))
+        if entry is None or entry[0]() is not d:
+            return None
+        self._entries.move_to_end(id(d))
+        return entry[1]
+
+    def store(self, d: RenderItem, a: ast.AST):
+        '''
+        Remember `a` as the rendered form of `d`.
+        '''
+        key = id(d)
+
+        def forget(ref: weakref.ref):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is ref:
+                del self._entries[key]
+                self._n_dropped += 1
+
+        self._entries[key] = (weakref.ref(d, forget), a)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._n_dropped += 1
 
-    def __init__(self,
-                 context: render_context):
-        ast.NodeTransformer.__init__(self)
-        self._context = context
+    def check_size(self):
+        '''
+        Reset everything if the shared context has grown too large, or mostly holds
+        what was rendered for entries that have since been dropped.
+        '''
+        if self._n_dropped > len(self._entries) \
+                or self.context._interned.n_stored > self._max_size * self._nodes_per_entry:
+            self.clear()
+
+
+# The process-wide render cache - None if it is turned off.
+_cache: Optional[_render_cache] = None
+
+
+def enable_render_cache(max_size: int = 1000):
+    '''
+    Turn on the process-wide render cache. Calls to `render` without a context will
+    re-use the `ast.AST` of any `DataFrame` (or `Column`) they have already rendered.
+
+    Arguments:
+        max_size            Most `DataFrame`'s to remember. Least recently used are
+                            forgotten first.
+
+    Notes:
+        - Calling this again will start a new, empty, cache.
+        - The returned context from `render` is shared by all cached renders.
+    '''
+    global _cache
+    _cache = _render_cache(max_size)
+
+
+def disable_render_cache():
+    '''
+    Turn off the process-wide render cache, and release everything it holds.
+    '''
+    global _cache
+    _cache = None
+
+
+class _parent_subs(CloningNodeTransformer):
+    '''
+    Replace every `ast_DataFrame` and `ast_Column` in an expression with its already
+    rendered `ast.AST`.
+    '''
+    def __init__(self, rendered: Dict[int, Tuple[RenderItem, ast.AST]]):
+        CloningNodeTransformer.__init__(self)
+        self._rendered = rendered
 
     def visit_ast_Column(self, a: ast_Column):
         'We have a column embedded here. Sort it out'
-        return _render_filter(a.column, self._context)
+        return self._rendered[id(a.column)][1]
 
     def visit_ast_DataFrame(self, a: ast_DataFrame):
         'Sort out an embedded column'
-        expr = render(a.dataframe, self._context)[0]
+        return self._rendered[id(a.dataframe)][1]
+
+
+def _dependencies(d: RenderItem) -> Iterator[RenderItem]:
+    '''
+    Return the `DataFrame`s and `Column`s that must be rendered before `d` can be.
+    The walk stops at each one, so this only looks at `d`'s own expression.
+    '''
+    if isinstance(d, DataFrame) and d.filter is not None:
+        yield d.filter
+    if d.child_expr is not None:
+        for a in ast.walk(d.child_expr):
+            if isinstance(a, ast_DataFrame):
+                yield a.dataframe
+            elif isinstance(a, ast_Column):
+                yield a.column
+
+
+def _render_one(d: RenderItem, rendered: Dict[int, Tuple[RenderItem, ast.AST]],
+                context: render_context) -> ast.AST:
+    '''
+    Render a single `DataFrame` or `Column`. Everything it depends on must already be
+    in `rendered`.
+    '''
+    # Simple out
+    if isinstance(d, DataFrame) and d.child_expr is None:
+        return context._lookup_dataframe(d)
+
+    assert d.child_expr is not None
+    expr = _parent_subs(rendered).visit(d.child_expr)
+    assert expr is not None
+
+    # If this is a column, then it is a comparison expression.
+    if isinstance(d, Column):
         return expr
 
+    # now we need to tack on our info.
+    if d.filter is not None:
+        expr = ast_Filter(expr, rendered[id(d.filter)][1])
+
+    return context._resolve_ast(expr)
 
-def _render_filter(f: Column, context: render_context) \
-        -> ast.AST:
-    'Render a filter/Mask as a result'
-    v = _parent_subs.transform(f.child_expr, context)
-    assert v is not None
-    return v
+
+def _render_all(items: List[RenderItem], context: render_context,
+                cache: Optional[_render_cache] = None) -> List[ast.AST]:
+    '''
+    Render all the `items`, in `context`, using an explicit stack rather than recursion.
+    Each `DataFrame` and `Column` is rendered once, after everything it depends on, so
+    very long chains of filters and attributes render without hitting the python stack limit.
+
+    If a `cache` is given, anything found there isn't rendered again, and everything that
+    is rendered is added to it.
+    '''
+    rendered: Dict[int, Tuple[RenderItem, ast.AST]] = {}
+    stack: List[Tuple[RenderItem, bool]] = [(d, False) for d in reversed(items)]
+    while len(stack) > 0:
+        d, deps_done = stack.pop()
+        if id(d) in rendered:
+            continue
+        if cache is not None:
+            cached = cache.lookup(d)
+            if cached is not None:
+                rendered[id(d)] = (d, cached)
+                continue
+        if not deps_done:
+            deps = [dep for dep in _dependencies(d) if id(dep) not in rendered]
+            if len(deps) > 0:
+                stack.append((d, True))
+                stack.extend((dep, False) for dep in reversed(deps))
+                continue
+        rendered[id(d)] = (d, _render_one(d, rendered, context))
+        if cache is not None:
+            cache.store(d, rendered[id(d)][1])
+
+    return [rendered[id(d)][1] for d in items]
 
 
 def render(d: Union[DataFrame, Column], in_context: Optional[render_context] = None) \
@@ -113,29 +409,60 @@ def render(d: Union[DataFrame, Column], in_context: Optional[render_context] = N
         implies iterating over df. The `ast.AST` that represents `df` will be the same object
         in this case. That means the object hash will be the same. This can be used as a
         poor-person's way of doing common sub-expression elimination.
+
+        If `enable_render_cache` has been called, and no context is given, anything
+        rendered by an earlier call is re-used rather than rendered again.
     '''
     if in_context is None:
-        s = '\n'.join(dumps(d))
-        logging.getLogger(__name__).debug(f'Rendering: {s}')
+        _log_render(logging.getLogger(__name__), 'Rendering', [d])
+    start = _start()
 
-    context = render_context() if in_context is None else in_context
+    if in_context is None and _cache is not None:
+        _cache.check_size()
+        context = _cache.context
+        expr = _render_all([d], context, _cache)[0]
+    else:
+        context = render_context() if in_context is None else in_context
+        expr = _render_all([d], context)[0]
 
-    # Simple out
-    if isinstance(d, DataFrame) and d.child_expr is None:
-        return context._lookup_dataframe(d), context
+    _finish('render', [expr], start)
+    return expr, context
 
-    # If this is a column, then it is a comparison expression.
-    if isinstance(d, Column):
-        return _render_filter(d, context), context
 
-    # now we need to tack on our info.
-    assert d.child_expr is not None
-    expr = _parent_subs.transform(d.child_expr, context)
-    if d.filter is not None:
-        filter_expr = _render_filter(d.filter, context)
-        expr = ast_Filter(expr, filter_expr)
+def render_many(ds: List[Union[DataFrame, Column]],
+                in_context: Optional[render_context] = None) \
+        -> Tuple[List[ast.AST], render_context]:
+    '''
+    Render several `DataFrame` expressions into a single DAG.
 
-    return context._resolve_ast(expr), context
+    Arguments:
+        ds          List of `DataFrame` (or `Column`) expressions to render
+        in_context  Context to render in. If none, a new one is created.
+
+    Returns:
+        exprs       The rendered `ast.AST` for each item in `ds`, in the same order. These
+                    follow the same rules as the return for `render`.
+        context     The context used to render all of them.
+
+    Notes:
+        All the expressions are rendered in one walk, in one context. Any part that is
+        common to more than one of them is the same `ast.AST` object in each result, so
+        a backend can compute it once for all outputs.
+    '''
+    if in_context is None:
+        _log_render(logging.getLogger(__name__), 'Rendering', list(ds))
+    start = _start()
+
+    if in_context is None and _cache is not None:
+        _cache.check_size()
+        context = _cache.context
+        exprs = _render_all(list(ds), context, _cache)
+    else:
+        context = render_context() if in_context is None else in_context
+        exprs = _render_all(list(ds), context)
+
+    _finish('render_many', exprs, start)
+    return exprs, context
 
 
 def render_callable(callable: ast_Callable, context: render_context, *args) \
@@ -145,7 +472,8 @@ def render_callable(callable: ast_Callable, context: render_context, *args) \
 
     Arguments:
         callable            The parsed out function all (lambda, or a function proper)
-        context             The context to use when parsing. Will not be touched or updated.
+        context             The context to use when parsing. Nothing is rendered in it, but
+                            the result is remembered there (see Notes).
         args                List of positional arguments to be passed to the lambda. They can
                             be any type, including data frame arguments.
 
@@ -154,22 +482,36 @@ def render_callable(callable: ast_Callable, context: render_context, *args) \
                             this function returns. The expression follows the same rules as the
                             return for the `render` function.
         context             New context which are things already seen plus anything new.
+
+    Notes:
+        The result is remembered in `context`, keyed by the identity of `callable` and of
+        each argument. Calling again with the same ones returns the same `ast.AST`
+        (without running the callable again), until something new is rendered in
+        `context`. The returned context is always a new one.
+
+        While it is remembered, `context` holds on to `callable`, the arguments, and the
+        context the result was rendered in. For the context shared by the render cache
+        (see `enable_render_cache`) that can last until the cache starts over.
     '''
+    key = (id(callable),) + tuple(id(a) for a in args)
+    found = context._callable_memo.get(key)
+    if found is not None:
+        return found[2], render_context(found[3])
+
     # Invoke the call
+    start = _start()
     d_result = callable.callable(*args)
     new_context = render_context(context)
-
-    if isinstance(d_result, (DataFrame, Column)):
-        log_str = '\n'.join(dumps(d_result))
-    else:
-        log_str = str(d_result)
-    logging.getLogger(__name__).debug(f'render_callable: {log_str}')
+    _log_render(logging.getLogger(__name__), 'render_callable', [d_result])
 
     # Render it
-    if isinstance(d_result, DataFrame):
-        return render(d_result, new_context)[0], new_context
-    elif isinstance(d_result, Column):
-        return _render_filter(d_result, new_context), new_context
+    if isinstance(d_result, (DataFrame, Column)):
+        expr = render(d_result, new_context)[0]
     else:
         from .utils import _term_to_ast
-        return _term_to_ast(d_result, DataFrame()), new_context
+        expr = _term_to_ast(d_result, DataFrame())
+
+    # The callable and arguments are held so their `id`'s can't be re-used
+    context._callable_memo[key] = (callable, args, expr, new_context)
+    _finish('render_callable', [expr], start)
+    return expr, render_context(new_context)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Callable, List, Optional, Tuple, Union
+import zipfile
+
+from .data_frame import Column, DataFrame
+from .fingerprint import FingerprintError, _fingerprinter
+
+
+# Bump if the way keys or files are written changes, so old entries are never read.
+_format_version = '1'
+
+# Returned by the tiers when there is nothing cached
+_missing = object()
+
+
+def _payload_arrays(value: Any) -> Optional[Tuple[str, List[Any]]]:
+    '''
+    Split a result into the numpy arrays to write to disk. Returns None if it can't be
+    written without pickling.
+    '''
+    import numpy as np
+
+    kind, items = (type(value).__name__, list(value)) if isinstance(value, (tuple, list)) \
+        else ('value', [value])
+    try:
+        arrays = [np.asarray(v) for v in items]
+    except Exception:
+        return None
+    if any(a.dtype.hasobject for a in arrays):
+        return None
+    return kind, arrays
+
+
+def _payload_size(value: Any) -> int:
+    'Bytes held by a result, for the in-memory tier'
+    items = value if isinstance(value, (tuple, list)) else [value]
+    return sum(getattr(v, 'nbytes', None) or sys.getsizeof(v) for v in items)
+
+
+class result_cache:
+    '''
+    A cache of backend results (histograms, columns, ...), keyed on what an expression is
+    and the version of the data it reads. There are two tiers: the most recently used
+    results are kept in memory, and if a `directory` is given, everything is also written
+    there as compressed numpy files, so a later run (or another process) can use them.
+
+    - The key is the `fingerprint` of the expression in canonical form, along with the
+      `_cache_version_token` of each source `DataFrame` it reads. A sub class should
+      override that to return something that changes with the data (file modification
+      times, or a dataset version).
+    - Results written to disk must be a numpy array (or something `numpy.asarray` can turn
+      into one without using python objects), or a tuple or list of them. They come back
+      as numpy arrays (a scalar comes back as a numpy scalar). Anything else is only held
+      in memory.
+    - Each tier has a size limit in bytes. The least recently used results are dropped
+      first.
+    - Results are returned as they were stored, not copied: don't modify them.
+    - An expression that captures something `fingerprint` can't describe is never
+      cached (`key` throws `FingerprintError`).
+    - The directory tier needs `numpy`.
+    '''
+    def __init__(self, directory: Optional[str] = None,
+                 max_memory_bytes: int = 256 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self._max_memory_bytes = max_memory_bytes
+        self._max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, Tuple[Any, int]] = OrderedDict()
+        self._memory_bytes = 0
+
+        self._directory = directory
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._scan_directory()
+
+    @property
+    def memory_bytes(self) -> int:
+        'Bytes held by the in-memory tier'
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        'Bytes held by the directory tier'
+        return self._disk_bytes
+
+    def key(self, d: Union[DataFrame, Column]) -> str:
+        'The key results for `d` are stored under'
+        f = _fingerprinter(canonical=True)
+        digest = f.expression(d)
+        tokens = [s._cache_version_token() for s in f.sources]
+        return hashlib.sha256(repr((_format_version, digest, tokens)).encode('utf-8')).hexdigest()
+
+    def _key_or_none(self, d: Union[DataFrame, Column]) -> Optional[str]:
+        'The key for `d`, or None if it holds something that can not be fingerprinted'
+        try:
+            return self.key(d)
+        except FingerprintError:
+            return None
+
+    def get(self, d: Union[DataFrame, Column], default: Any = None) -> Any:
+        'Return the cached result for `d`, or `default` if there is none'
+        key = self._key_or_none(d)
+        value = _missing if key is None else self._get(key)
+        return default if value is _missing else value
+
+    def put(self, d: Union[DataFrame, Column], value: Any):
+        'Cache `value` as the result of `d`'
+        key = self._key_or_none(d)
+        if key is not None:
+            self._put(key, value)
+
+    def get_or_compute(self, d: Union[DataFrame, Column], compute: Callable[[], Any]) -> Any:
+        '''
+        Return the cached result for `d`. If there isn't one, call `compute` to get it, and
+        cache that.
+        '''
+        key = self._key_or_none(d)
+        value = _missing if key is None else self._get(key)
+        if value is _missing:
+            value = compute()
+            if key is not None:
+                self._put(key, value)
+        return value
+
+    def clear(self):
+        'Remove every result, in memory and on disk'
+        self._memory.clear()
+        self._memory_bytes = 0
+        for key in list(self._disk):
+            self._remove_file(key)
+
+    def _get(self, key: str) -> Any:
+        found = self._memory.get(key)
+        if found is not None:
+            self._memory.move_to_end(key)
+            return found[0]
+        value = self._read_file(key)
+        if value is not _missing:
+            self._remember(key, value)
+        return value
+
+    def _put(self, key: str, value: Any):
+        self._remember(key, value)
+        self._write_file(key, value)
+
+    def _remember(self, key: str, value: Any):
+        'Add to the in-memory tier'
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        size = _payload_size(value)
+        if size > self._max_memory_bytes:
+            return
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self._max_memory_bytes:
+            _, (_, dropped) = self._memory.popitem(last=False)
+            self._memory_bytes -= dropped
+
+    def _path(self, key: str) -> str:
+        assert self._directory is not None
+        return os.path.join(self._directory, f'{key}.npz')
+
+    def _scan_directory(self):
+        'Index what is already in the directory, oldest first'
+        assert self._directory is not None
+        found = []
+        for e in os.scandir(self._directory):
+            if e.is_file() and e.name.endswith('.npz'):
+                st = e.stat()
+                found.append((st.st_mtime, e.name[:-len('.npz')], st.st_size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _remove_file(self, key: str):
+        size = self._disk.pop(key, 0)
+        self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _read_file(self, key: str) -> Any:
+        if self._directory is None:
+            return _missing
+        path = self._path(key)
+        if not os.path.exists(path):
+            return _missing
+
+        import numpy as np
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                kind = str(z['__kind__'])
+                arrays = [z[f'arr_{i}'] for i in range(len(z.files) - 1)]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            logging.getLogger(__name__).warning(f'Removing unreadable cache file {path}')
+            self._remove_file(key)
+            return _missing
+
+        # Mark it as recently used (for this and any other process using the directory)
+        os.utime(path)
+        if key not in self._disk:
+            size = os.path.getsize(path)
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._disk.move_to_end(key)
+
+        if kind == 'value':
+            return arrays[0][()] if arrays[0].ndim == 0 else arrays[0]
+        return tuple(arrays) if kind == 'tuple' else arrays
+
+    def _write_file(self, key: str, value: Any):
+        if self._directory is None:
+            return
+        # Whatever was there before is out of date, even if this can't be written
+        self._remove_file(key)
+        payload = _payload_arrays(value)
+        if payload is None:
+            return
+        kind, arrays = payload
+
+        import numpy as np
+        # Write somewhere else first, so no one ever reads half a file
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, *arrays, __kind__=np.array(kind))
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        size = os.path.getsize(self._path(key))
+        self._disk[key] = size
+        self._disk_bytes += size
+        while self._disk_bytes > self._max_disk_bytes and len(self._disk) > 0:
+            self._remove_file(next(iter(self._disk)))
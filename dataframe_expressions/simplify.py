@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import ast
+import operator
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from .render_dataframe import ast_Filter
+from .utils_ast import _walk_dag, constant_value, is_constant, make_constant, replace_children
+
+
+_binary_ops: Dict[Type[ast.AST], Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_compare_ops: Dict[Type[ast.AST], Callable[[Any, Any], Any]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Largest power we will fold - so `2**1000000` isn't computed at render time.
+_max_folded_exponent = 64
+
+
+def _number(a: ast.AST) -> Optional[Any]:
+    'Return the value of `a` if it is a numeric literal (not a `bool`), otherwise None'
+    if not is_constant(a):
+        return None
+    v = constant_value(a)
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        return None
+    return v
+
+
+def _boolean(a: ast.AST) -> Optional[bool]:
+    'Return the value of `a` if it is `True` or `False`, otherwise None'
+    if not is_constant(a):
+        return None
+    v = constant_value(a)
+    return v if isinstance(v, bool) else None
+
+
+def _fold(op: ast.AST, left: Any, right: Any) -> Optional[ast.AST]:
+    'Fold two numbers, or return None if it is not safe (or possible)'
+    f = _binary_ops.get(type(op))
+    if f is None:
+        return None
+    if isinstance(op, ast.Pow) and abs(right) > _max_folded_exponent:
+        return None
+    try:
+        v = f(left, right)
+    except (ArithmeticError, ValueError):
+        return None
+    return make_constant(v) if isinstance(v, (int, float)) else None
+
+
+def _as_scale(op: ast.AST, c: Optional[Any]) -> Optional[Tuple[Type[ast.AST], Any]]:
+    '''
+    Write `op c` as a multiply or an add: `/ c` is `* (1/c)` and `- c` is `+ (-c)`.
+    Returns (`ast.Mult` or `ast.Add`, constant), or None if that can't be done.
+    '''
+    if c is None:
+        return None
+    if isinstance(op, (ast.Mult, ast.Add)):
+        return type(op), c
+    if isinstance(op, ast.Sub):
+        return ast.Add, -c
+    if isinstance(op, ast.Div) and c != 0:
+        return ast.Mult, 1 / c
+    return None
+
+
+def _simplify_binop(a: ast.BinOp, reassociate: bool) -> ast.AST:
+    left = _number(a.left)
+    right = _number(a.right)
+    if left is not None and right is not None:
+        return _fold(a.op, left, right) or a
+
+    # Identities
+    if right == 0 and isinstance(a.op, (ast.Add, ast.Sub)):
+        return a.left
+    if left == 0 and isinstance(a.op, ast.Add):
+        return a.right
+    if right == 1 and isinstance(a.op, (ast.Mult, ast.Div)):
+        return a.left
+    if left == 1 and isinstance(a.op, ast.Mult):
+        return a.right
+
+    # (x op1 c1) op2 c2 => x op (c1 op' c2)
+    if reassociate and right is not None and isinstance(a.left, ast.BinOp):
+        inner = _as_scale(a.left.op, _number(a.left.right))
+        outer = _as_scale(a.op, right)
+        if inner is not None and outer is not None and inner[0] is outer[0]:
+            k = _fold(inner[0](), inner[1], outer[1])
+            if k is not None:
+                return _simplify_binop(ast.BinOp(left=a.left.left, op=inner[0](), right=k),
+                                       reassociate)
+    return a
+
+
+def _simplify_compare(a: ast.Compare) -> ast.AST:
+    operands = [a.left] + list(a.comparators)
+    if not all(is_constant(o) for o in operands):
+        return a
+    values = [constant_value(o) for o in operands]
+    try:
+        result = all(_compare_ops[type(op)](left, right)
+                     for op, left, right in zip(a.ops, values, values[1:]))
+    except (KeyError, TypeError):
+        return a
+    return make_constant(bool(result))
+
+
+def _simplify_boolop(a: ast.BoolOp) -> ast.AST:
+    # `True` is the identity for `and`, and `False` absorbs everything (and the other
+    # way round for `or`).
+    identity = isinstance(a.op, ast.And)
+    values = []
+    for v in a.values:
+        b = _boolean(v)
+        if b is None:
+            values.append(v)
+        elif b != identity:
+            return make_constant(b)
+    if len(values) == 0:
+        return make_constant(identity)
+    if len(values) == 1:
+        return values[0]
+    if len(values) == len(a.values):
+        return a
+    return ast.BoolOp(op=a.op, values=values)
+
+
+def _simplify_unaryop(a: ast.UnaryOp) -> ast.AST:
+    if isinstance(a.op, (ast.Invert, ast.Not)):
+        # `~` is a logical not in this library
+        b = _boolean(a.operand)
+        return make_constant(not b) if b is not None else a
+    v = _number(a.operand)
+    if v is None:
+        return a
+    if isinstance(a.op, ast.USub):
+        return make_constant(-v)
+    if isinstance(a.op, ast.UAdd):
+        return a.operand
+    return a
+
+
+def _simplify_call(a: ast.Call) -> ast.AST:
+    if isinstance(a.func, ast.Name) and a.func.id == 'np_where' and len(a.args) == 3 \
+            and len(getattr(a, 'keywords', [])) == 0:
+        b = _boolean(a.args[0])
+        if b is not None:
+            return a.args[1] if b else a.args[2]
+    return a
+
+
+def _simplify_node(a: ast.AST, reassociate: bool) -> ast.AST:
+    if isinstance(a, ast.BinOp):
+        return _simplify_binop(a, reassociate)
+    if isinstance(a, ast.Compare):
+        return _simplify_compare(a)
+    if isinstance(a, ast.BoolOp):
+        return _simplify_boolop(a)
+    if isinstance(a, ast.UnaryOp):
+        return _simplify_unaryop(a)
+    if isinstance(a, ast.Call):
+        return _simplify_call(a)
+    if isinstance(a, ast_Filter) and a.filter is not None and _boolean(a.filter) is True:
+        assert a.expr is not None
+        return a.expr
+    return a
+
+
+def simplify(expr: ast.AST, reassociate: bool = True) -> ast.AST:
+    '''
+    Fold constants and apply simple algebraic identities to a rendered expression.
+
+    Arguments:
+        expr        A rendered expression (from `render`, for example)
+        reassociate If true, chains of multiplies and divides (or adds and subtracts) by
+                    constants are combined: `df.pt/1000.0*1000.0` becomes `df.pt`. The
+                    result can differ from the original in the last bit.
+
+    Returns:
+        expr        The simplified expression. `expr` is not modified, and any part of it
+                    that did not change is shared with the result.
+
+    Notes:
+        - Arithmetic on two numeric literals is folded (unless it would raise, like a
+          divide by zero).
+        - `x + 0`, `0 + x`, `x - 0`, `x * 1`, `1 * x` and `x / 1` become `x`. `x * 0` is
+          left alone, as `x` could be `inf` or `nan`.
+        - A comparison between literals becomes `True` or `False`, and `and`, `or` and
+          `~` with `True` or `False` operands are reduced.
+        - `np.where` with a literal condition becomes the branch it picks, and a filter
+          whose predicate is `True` is removed.
+    '''
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in _walk_dag(expr):
+        rebuilt[id(a)] = _simplify_node(replace_children(a, rebuilt), reassociate)
+    return rebuilt[id(expr)]
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import ast
+import heapq
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from .data_frame import DataFrame
+from .fingerprint import _digest, _fingerprinter, _type_name
+from .result_cache import _payload_size
+from .utils_ast import _walk_dag
+
+
+class _node_keys(_fingerprinter):
+    '''
+    Digests of rendered nodes that don't depend on where the node is: a source `DataFrame`
+    is known by its type, `_fingerprint_token`, and `_cache_version_token`.
+    '''
+    def _root(self, df: DataFrame) -> str:
+        return _digest('root', _type_name(type(df)), df._fingerprint_token(),
+                       df._cache_version_token())
+
+
+class subexpr_cache:
+    '''
+    Evaluated arrays for parts of rendered expressions (like `df.jets[good_jet]`), so a
+    backend evaluating a new expression can re-use anything it has evaluated before.
+
+    - Nodes are keyed by structure: `keys(expr)` returns the key of every node in a
+      rendered expression. Two nodes with the same key always evaluate to the same thing.
+      Put expressions through `canonicalize` first to share more.
+    - The values held are limited to `max_bytes` in total (`nbytes` of each array, or of
+      each array in a tuple or list).
+    - When something has to go, what is dropped is what saves the least time per byte:
+      each value is given a priority of the seconds it took to compute divided by its size,
+      plus the priority of the last value dropped when it was last used (so values that
+      are not used again age out).
+    - Values are returned as they were stored, not copied: don't modify them.
+    '''
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._nbytes = 0
+        # key -> (value, size, seconds, priority)
+        self._entries: Dict[str, Tuple[Any, int, float, float]] = {}
+        # (priority, key) - entries whose priority has since changed are skipped
+        self._heap: List[Tuple[float, str]] = []
+        self._inflation = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        'Bytes held'
+        return self._nbytes
+
+    def keys(self, expr: ast.AST) -> Dict[int, str]:
+        '''
+        Return the key of every node in the rendered expression `expr`, by `id`. Throws
+        `FingerprintError` if it holds a value that can't be described.
+        '''
+        k = _node_keys()
+        digests: Dict[int, str] = {}
+        for a in _walk_dag(expr):
+            digests[id(a)] = k._node(a, digests)
+        return digests
+
+    def key(self, a: ast.AST) -> str:
+        'Return the key of a rendered node'
+        return self.keys(a)[id(a)]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        'Return the value stored for `key`, or `default`'
+        found = self._entries.get(key)
+        if found is None:
+            return default
+        self._touch(key, *found)
+        return found[0]
+
+    def put(self, key: str, value: Any, seconds: float):
+        '''
+        Store `value` for `key`.
+
+        Arguments:
+            key         From `keys` or `key`
+            value       The evaluated array (or a tuple or list of arrays)
+            seconds     How long it took to evaluate (not counting anything it was built
+                        from that came out of this cache)
+        '''
+        self._drop(key)
+        size = max(_payload_size(value), 1)
+        if size > self._max_bytes:
+            return
+        self._nbytes += size
+        self._touch(key, value, size, seconds, 0.0)
+        self._evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        'Return the value for `key`, calling `compute` (and storing the result) if needed'
+        found = self._entries.get(key)
+        if found is not None:
+            self._touch(key, *found)
+            return found[0]
+        start = time.perf_counter()
+        value = compute()
+        self.put(key, value, time.perf_counter() - start)
+        return value
+
+    def clear(self):
+        'Drop everything'
+        self._entries.clear()
+        self._heap.clear()
+        self._nbytes = 0
+        self._inflation = 0.0
+
+    def _touch(self, key: str, value: Any, size: int, seconds: float, _priority: float):
+        'Mark an entry as used just now'
+        priority = self._inflation + seconds / size
+        self._entries[key] = (value, size, seconds, priority)
+        heapq.heappush(self._heap, (priority, key))
+        # Don't let the stale heap entries build up
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [(e[3], k) for k, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _drop(self, key: str):
+        found = self._entries.pop(key, None)
+        if found is not None:
+            self._nbytes -= found[1]
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes:
+            priority, key = heapq.heappop(self._heap)
+            found = self._entries.get(key)
+            if found is None or found[3] != priority:
+                continue
+            self._inflation = priority
+            self._drop(key)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import ast
+from typing import Dict, List, Optional, Set, Tuple
+
+from .asts import ast_Callable, ast_DataFrame
+from .data_frame import Column, DataFrame
+from .render_dataframe import ast_Filter, render, render_callable, render_context, render_many
+from .utils_ast import _walk_dag, replace_children
+
+
+class ast_Parameter(ast.AST):
+    '''
+    A slot in a `callable_template`: the `index`'th argument passed to the callable.
+    '''
+    _fields = ('index',)
+
+    def __init__(self, index: Optional[int] = None):
+        self.index = index
+
+
+def _plain_attribute(arg: DataFrame, name: str) -> bool:
+    'Returns true if `arg.name` is just `ast.Attribute(arg, name)`'
+    try:
+        r = getattr(arg, name)
+    except Exception:
+        return False
+    return isinstance(r, DataFrame) and r.filter is None \
+        and isinstance(r.child_expr, ast.Attribute) and r.child_expr.attr == name \
+        and isinstance(r.child_expr.value, ast_DataFrame) \
+        and r.child_expr.value.dataframe is arg
+
+
+def _plain_path(arg: DataFrame, path: Tuple[str, ...]) -> bool:
+    'Returns true if each attribute along `path`, starting from `arg`, is a plain attribute'
+    d = arg
+    for name in path:
+        if not _plain_attribute(d, name):
+            return False
+        d = getattr(d, name)
+    return True
+
+
+class callable_template:
+    '''
+    A callable, traced once with placeholder `DataFrame` arguments. `expr` is its rendered
+    result with an `ast_Parameter` wherever an argument was used.
+
+    Call `instantiate` to get what `render_callable` would return for real arguments.
+    '''
+    def __init__(self, c: ast_Callable, n_args: int, expr: Optional[ast.AST]):
+        self.callable = c
+        self.n_args = n_args
+        self.expr = expr
+
+        # The chains of attributes looked up from each argument (through any filters),
+        # any step of which could mean something else on the real argument (like
+        # `e.jets.ptgev`, a computed column of `jets`), and every attribute name (which
+        # could be an alias).
+        self._paths: List[Set[Tuple[str, ...]]] = [set() for _ in range(n_args)]
+        self._all_names: Set[str] = set()
+        self.usable = expr is not None
+        if expr is not None:
+            # Methods are found on the class, which is the same for every argument
+            methods = set(id(a.func) for a in _walk_dag(expr) if isinstance(a, ast.Call))
+            for a in _walk_dag(expr):
+                if isinstance(a, ast_Callable):
+                    # The placeholders would leak out through a nested lambda
+                    self.usable = False
+                elif isinstance(a, ast.Attribute):
+                    self._all_names.add(a.attr)
+                    if id(a) in methods:
+                        continue
+                    path = [a.attr]
+                    base = a.value
+                    while isinstance(base, (ast_Filter, ast.Attribute)):
+                        if isinstance(base, ast.Attribute):
+                            path.append(base.attr)
+                            base = base.value
+                        else:
+                            base = base.expr
+                    if isinstance(base, ast_Parameter):
+                        self._paths[base.index].add(tuple(reversed(path)))  # type: ignore
+
+    def _can_substitute(self, args: Tuple) -> bool:
+        'Will substituting `args` give the same result as calling the callable?'
+        if not self.usable or len(args) != self.n_args:
+            return False
+        from . import alias
+        if any(n in alias._alias_catalog for n in self._all_names):
+            return False
+        return all(type(arg) is DataFrame and all(_plain_path(arg, p) for p in paths)
+                   for arg, paths in zip(args, self._paths))
+
+    def instantiate(self, context: render_context, *args) -> Tuple[ast.AST, render_context]:
+        '''
+        Render the callable for `args`, as `render_callable` would.
+
+        Arguments:
+            context             The context to render in. Will not be touched or updated.
+            args                The arguments to pass to the callable
+
+        Returns:
+            expr                The rendered expression
+            context             New context which are things already seen plus anything new.
+
+        Notes:
+            If an argument is not a plain `DataFrame`, or an attribute the callable uses
+            could resolve to something else on it, or on anything reached from it (a
+            computed column, an alias, a python attribute), this falls back to
+            `render_callable`.
+        '''
+        if not self._can_substitute(args):
+            return render_callable(self.callable, context, *args)
+
+        new_context = render_context(context)
+        arg_asts, _ = render_many(list(args), new_context)
+
+        assert self.expr is not None
+        rebuilt: Dict[int, ast.AST] = {}
+        for a in _walk_dag(self.expr):
+            if isinstance(a, ast_Parameter):
+                rebuilt[id(a)] = arg_asts[a.index]  # type: ignore
+            elif isinstance(a, ast_DataFrame):
+                rebuilt[id(a)] = new_context._lookup_dataframe(a.dataframe)
+            else:
+                rebuilt[id(a)] = replace_children(a, rebuilt)
+        return new_context._resolve_ast(rebuilt[id(self.expr)]), new_context
+
+
+def _trace(c: ast_Callable, n_args: int) -> callable_template:
+    'Call `c` with placeholder arguments and turn the result into a template'
+    placeholders = [DataFrame() for _ in range(n_args)]
+    try:
+        result = c.callable(*placeholders)
+    except Exception:
+        # If it can't be traced, every `instantiate` will call `render_callable`
+        return callable_template(c, n_args, None)
+    if not isinstance(result, (DataFrame, Column)):
+        from .utils import _term_to_ast
+        return callable_template(c, n_args, _term_to_ast(result, DataFrame()))
+
+    expr, context = render(result, render_context())
+    slots = {id(context._lookup_dataframe(p)): ast_Parameter(i)
+             for i, p in enumerate(placeholders)}
+    rebuilt: Dict[int, ast.AST] = {}
+    for a in _walk_dag(expr):
+        rebuilt[id(a)] = slots[id(a)] if id(a) in slots else replace_children(a, rebuilt)
+    return callable_template(c, n_args, rebuilt[id(expr)])
+
+
+def trace_callable(c: ast_Callable, n_args: int = 1) -> callable_template:
+    '''
+    Trace a callable (like the lambda in `df.jets.map(lambda j: j.pt)`) into a template
+    that can be instantiated for many arguments without calling back into python.
+
+    Arguments:
+        c           The `ast_Callable` found in a rendered expression
+        n_args      The number of arguments the callable takes
+
+    Returns:
+        template    The `callable_template`. Its `expr` has an `ast_Parameter` in place of
+                    each argument; `instantiate` substitutes real arguments.
+
+    Notes:
+        - The template is kept on `c`, so each `ast_Callable` is traced only once (for
+          each `n_args`).
+        - If the callable can't be traced with placeholder arguments, or it contains a
+          lambda of its own, the template's `usable` is false, and `instantiate` just calls
+          `render_callable`.
+    '''
+    templates: Optional[Dict[int, callable_template]] = getattr(c, '_templates', None)
+    if templates is None:
+        templates = {}
+        c._templates = templates  # type: ignore
+    template = templates.get(n_args)
+    if template is None:
+        template = _trace(c, n_args)
+        templates[n_args] = template
+    return template
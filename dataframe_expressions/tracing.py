@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import ast
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .data_frame import Column, DataFrame
+from .dump_dataframe import dumps
+from .utils_ast import _child_nodes, _walk_dag
+
+
+class render_event:
+    '''
+    Sent to every render listener after a render.
+
+    - `kind` is `render`, `render_many`, or `render_callable`
+    - `n_roots` is the number of expressions rendered
+    - `n_nodes` is the number of distinct `ast.AST` nodes in the result
+    - `depth` is the length of the longest path from a root to a leaf
+    - `seconds` is how long the render took
+    '''
+    def __init__(self, kind: str, n_roots: int, n_nodes: int, depth: int, seconds: float):
+        self.kind = kind
+        self.n_roots = n_roots
+        self.n_nodes = n_nodes
+        self.depth = depth
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        return f'render_event({self.kind}, n_roots={self.n_roots}, n_nodes={self.n_nodes}, ' \
+               f'depth={self.depth}, seconds={self.seconds:.6f})'
+
+
+_listeners: List[Callable[[render_event], None]] = []
+
+# Longest debug message (in characters) we will log, or None for no limit.
+_max_chars: Optional[int] = 10000
+
+# Only one in this many renders is logged.
+_sample_every = 1
+_n_renders = 0
+
+
+def add_render_listener(listener: Callable[[render_event], None]):
+    '''
+    Call `listener` with a `render_event` after every `render`, `render_many`, and
+    `render_callable`. The statistics are only gathered while there is a listener.
+    '''
+    _listeners.append(listener)
+
+
+def remove_render_listener(listener: Callable[[render_event], None]):
+    'Stop calling a listener added with `add_render_listener`'
+    _listeners.remove(listener)
+
+
+def configure_tracing(max_chars: Optional[int] = 10000, sample_every: int = 1):
+    '''
+    Control the debug logging of renders (to the `dataframe_expressions` logger, at
+    `DEBUG` level).
+
+    Arguments:
+        max_chars       Messages are cut off after this many characters. None for no limit.
+        sample_every    Only one in this many renders is logged.
+    '''
+    assert sample_every > 0, 'sample_every must be at least 1'
+    global _max_chars, _sample_every, _n_renders
+    _max_chars = max_chars
+    _sample_every = sample_every
+    _n_renders = 0
+
+
+class _lazy_dump:
+    '''
+    Formats what is being rendered only when the logging system asks for the string,
+    and cuts it down to `_max_chars`.
+    '''
+    def __init__(self, items: List[Any]):
+        self._items = items
+
+    def __str__(self) -> str:
+        lines: List[str] = []
+        for d in self._items:
+            if isinstance(d, (DataFrame, Column)):
+                lines.extend(dumps(d))
+            else:
+                lines.append(str(d))
+        s = '\n'.join(lines)
+        if _max_chars is not None and len(s) > _max_chars:
+            s = f'{s[:_max_chars]}... ({len(s) - _max_chars} more characters)'
+        return s
+
+
+def _should_log(logger: logging.Logger) -> bool:
+    'Returns true if this render should be logged'
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    global _n_renders
+    _n_renders += 1
+    return (_n_renders - 1) % _sample_every == 0
+
+
+def _log_render(logger: logging.Logger, message: str, items: List[Any]):
+    'Log the items at debug level - if anyone is listening'
+    if _should_log(logger):
+        logger.debug('%s: %s', message, _lazy_dump(items))
+
+
+def _start() -> Optional[float]:
+    'Start timing a render, if anyone is listening'
+    return time.perf_counter() if len(_listeners) > 0 else None
+
+
+def _finish(kind: str, exprs: List[ast.AST], start: Optional[float]):
+    'Send a `render_event` to all listeners'
+    if start is None or len(_listeners) == 0:
+        return
+    seconds = time.perf_counter() - start
+
+    # `ctx=ast.Load()` and the like are not counted as nodes
+    depth: Dict[int, int] = {}
+    for e in exprs:
+        for a in _walk_dag(e):
+            if id(a) not in depth and not isinstance(a, ast.expr_context):
+                depth[id(a)] = 1 + max((depth[id(c)] for c in _child_nodes(a)
+                                        if id(c) in depth), default=0)
+    event = render_event(kind, len(exprs), len(depth),
+                         max((depth[id(e)] for e in exprs), default=0), seconds)
+    for listener in list(_listeners):
+        listener(event)
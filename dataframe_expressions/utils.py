@@ -5,6 +5,7 @@ from typing import Callable, Optional, TypeVar, Union, cast
 from dataframe_expressions import (
     Column, DataFrame, ast_Callable, ast_Column, ast_DataFrame,
     ast_FunctionPlaceholder)
+from .data_frame import _interned
 
 
 class DataFrameTypeError(Exception):
@@ -78,7 +79,7 @@ def user_func(f: Callable) -> Callable:
                             f'- but needs {len(f_sig.parameters)}')
         f_args = [_term_to_ast(a, None) for a in args]
         call = ast.Call(func=ast_FunctionPlaceholder(f), args=f_args)
-        return DataFrame(expr=call)
+        return _interned(DataFrame(expr=call))
 
     return emulate_function_call_in_DF
 
@@ -93,6 +94,9 @@ def exclusive_class(o_class: T) -> T:
     '''
     orig_init = o_class.__init__
 
+    # Flag the class, so the check does not need to look at each instance
+    setattr(o_class, '__no_arb_attr', True)
+
     def __init__(self, *args, **kws):
         # The `__no_arb_attr` is a magic string and appears elsewhere in the code
         # as a flag (its value does not matter)
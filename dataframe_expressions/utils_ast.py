@@ -1,4 +1,7 @@
 import ast
+from typing import Any, Hashable, Iterator, List, Mapping, MutableMapping, Optional, Set, Tuple
+
+from .asts import ast_Callable, ast_Column, ast_DataFrame, ast_FunctionPlaceholder
 
 
 class CloningNodeTransformer(ast.NodeVisitor):
@@ -74,3 +77,176 @@ class CloningNodeTransformer(ast.NodeVisitor):
             if f[1] is not None:
                 setattr(new_node, f[0], f[2][0])
         return new_node
+
+
+def _child_nodes(a: ast.AST) -> Iterator[ast.AST]:
+    'Return all the direct `ast.AST` children of `a`'
+    for _, v in ast.iter_fields(a):
+        if isinstance(v, ast.AST):
+            yield v
+        elif isinstance(v, list):
+            for item in v:
+                if isinstance(item, ast.AST):
+                    yield item
+
+
+def _walk_dag(a: ast.AST, stop_at: Optional[ast.AST] = None) -> List[ast.AST]:
+    '''
+    Return every node under `a` (by identity), children before parents. If given, the
+    nodes under `stop_at` are not included.
+    '''
+    order: List[ast.AST] = []
+    seen: Set[int] = set()
+    stack: List[Tuple[ast.AST, bool]] = [(a, False)]
+    while len(stack) > 0:
+        node, children_done = stack.pop()
+        if children_done:
+            order.append(node)
+            continue
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.append((node, True))
+        if node is not stop_at:
+            stack.extend((c, False) for c in _child_nodes(node))
+    return order
+
+
+def _literal_key(v: Any) -> Hashable:
+    'Key for a non-ast field value (a name, a number, etc.)'
+    if isinstance(v, float):
+        # Keep -0.0 and 0.0 (and 1 and 1.0) distinct
+        return (float, repr(v))
+    try:
+        hash(v)
+        return (type(v), v)
+    except TypeError:
+        return ('id', id(v))
+
+
+def _value_key(v: Any, interned: MutableMapping[int, Tuple[ast.AST, ast.AST]]) -> Hashable:
+    'Key for a field value, using the canonical node for any `ast.AST`'
+    if isinstance(v, ast.AST):
+        return id(interned[id(v)][1])
+    if isinstance(v, list):
+        return ('[',) + tuple(_value_key(item, interned) for item in v)
+    return _literal_key(v)
+
+
+def _node_key(a: ast.AST, interned: MutableMapping[int, Tuple[ast.AST, ast.AST]]) -> Hashable:
+    '''
+    Structural key for `a`. All children of `a` must already be in `interned`, so this only
+    looks one level down. Leaves that point to python objects use the object identity.
+    '''
+    if isinstance(a, ast_DataFrame):
+        return (ast_DataFrame, id(a.dataframe))
+    if isinstance(a, ast_Column):
+        return (ast_Column, id(a.column))
+    if isinstance(a, ast_Callable):
+        return (ast_Callable, id(a))
+    if isinstance(a, ast_FunctionPlaceholder):
+        return (ast_FunctionPlaceholder, id(a.callable))
+
+    return (type(a),) + tuple((f, _value_key(getattr(a, f, None), interned)) for f in a._fields)
+
+
+def intern_ast(a: ast.AST,
+               resolved: MutableMapping[Hashable, ast.AST],
+               interned: MutableMapping[int, Tuple[ast.AST, ast.AST]]) -> ast.AST:
+    '''
+    Hash-cons `a` (and all its children) into a node table, and return the table's
+    canonical node that is structurally identical to `a`.
+
+    Arguments:
+        a           The `ast.AST` to intern
+        resolved    Structural key -> canonical node
+        interned    `id` of every node already seen -> (node, canonical node). The node
+                    is held so its `id` can't be re-used while it is in the table.
+
+    Returns:
+        ast.AST     The canonical node. It is `a` if nothing like it has been seen before.
+
+    Notes:
+        - The key of each node is built from the `id`'s of its children's canonical nodes,
+          so each node is looked at only once, and this is linear in the size of the tree.
+        - `ast_DataFrame`, `ast_Column`, `ast_Callable` and `ast_FunctionPlaceholder` leaves
+          are keyed by the identity of the python object they hold.
+        - No recursion is used, so very deep trees are fine.
+    '''
+    found = interned.get(id(a))
+    if found is not None:
+        return found[1]
+
+    stack = [a]
+    while len(stack) > 0:
+        node = stack[-1]
+        if id(node) in interned:
+            stack.pop()
+            continue
+        children = [c for c in _child_nodes(node) if id(c) not in interned]
+        if len(children) > 0:
+            stack.extend(children)
+            continue
+
+        stack.pop()
+        key = _node_key(node, interned)
+        canonical = resolved.get(key)
+        if canonical is None:
+            resolved[key] = node
+            canonical = node
+        interned[id(node)] = (node, canonical)
+
+    return interned[id(a)][1]
+
+
+def is_constant(a: ast.AST) -> bool:
+    'Returns true if `a` is a literal (number, string, `True`, `None`, etc.)'
+    return isinstance(a, (ast.Num, ast.Str, ast.NameConstant, ast.Constant))
+
+
+def constant_value(a: ast.AST) -> Any:
+    'Return the python value of a literal `ast.AST`'
+    assert is_constant(a), f'Internal Error: {type(a).__name__} is not a constant'
+    if isinstance(a, ast.Num):
+        return a.n
+    if isinstance(a, ast.Str):
+        return a.s
+    return a.value  # type: ignore
+
+
+def make_constant(v: Any) -> ast.AST:
+    'Build the literal `ast.AST` for `v`, using the same node types `_term_to_ast` does'
+    if isinstance(v, bool) or v is None:
+        return ast.NameConstant(value=v)
+    if isinstance(v, (int, float, complex)):
+        return ast.Num(n=v)
+    if isinstance(v, str):
+        return ast.Str(s=v)
+    raise Exception(f'Internal Error: do not know how to make a constant from {type(v).__name__}')
+
+
+def replace_children(a: ast.AST, new_child: Mapping[int, ast.AST]) -> ast.AST:
+    '''
+    Return `a` with each of its children, `c`, replaced by `new_child[id(c)]`. If no child
+    changes, `a` itself is returned; otherwise a new node (of the same type) is. `a` is
+    never modified.
+    '''
+    changed = False
+    values: List[Tuple[str, Any]] = []
+    for f, v in ast.iter_fields(a):
+        if isinstance(v, ast.AST):
+            new_v: Any = new_child[id(v)]
+            changed = changed or new_v is not v
+        elif isinstance(v, list):
+            new_v = [new_child[id(item)] if isinstance(item, ast.AST) else item for item in v]
+            changed = changed or any(n is not o for n, o in zip(new_v, v))
+        else:
+            new_v = v
+        values.append((f, new_v))
+
+    if not changed:
+        return a
+    new_a = a.__class__()
+    for f, v in values:
+        setattr(new_a, f, v)
+    return new_a
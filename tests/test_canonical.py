@@ -0,0 +1,106 @@
+import ast
+
+from dataframe_expressions import DataFrame, canonicalize, fingerprint, render
+
+
+def canonical_dump(d) -> str:
+    expr, _ = render(d)
+    return ast.dump(canonicalize(expr))
+
+
+def test_canonical_compare_direction():
+    d = DataFrame()
+    assert canonical_dump(d.y < d.x) == canonical_dump(d.x > d.y)
+    assert canonical_dump(d.y <= d.x) == canonical_dump(d.x >= d.y)
+    assert canonical_dump(d.y == d.x) == canonical_dump(d.x == d.y)
+
+
+def test_canonical_compare_literal_right():
+    d = DataFrame()
+    expr, _ = render(d.x > 10)
+    c = canonicalize(expr)
+    assert c is expr
+
+
+def test_canonical_commutative():
+    d = DataFrame()
+    assert canonical_dump(d.x * 2) == canonical_dump(2 * d.x)
+    assert canonical_dump(d.x * d.y) == canonical_dump(d.y * d.x)
+    assert canonical_dump(d.x + 1) == canonical_dump(1 + d.x)
+    assert canonical_dump((d.x - 1) + d.y) == canonical_dump(d.y + (d.x - 1))
+    assert canonical_dump((d.x + 1) + d.y) == canonical_dump(d.y + (1 + d.x))
+
+
+def test_canonical_add_not_known_numeric():
+    'Columns could be strings, and `+` joins them'
+    d = DataFrame()
+    assert canonical_dump(d.first + d.last) != canonical_dump(d.last + d.first)
+    assert canonical_dump((d.x * 2) + d.y) != canonical_dump(d.y + (d.x * 2))
+    assert canonical_dump(d.x + 'a') != canonical_dump('a' + d.x)
+
+
+def test_canonical_not_commutative():
+    d = DataFrame()
+    assert canonical_dump(d.x - d.y) != canonical_dump(d.y - d.x)
+    assert canonical_dump(d.x / 2) != canonical_dump(2 / d.x)
+
+
+def test_canonical_literal_last():
+    d = DataFrame()
+    expr, _ = render(2 * d.x)
+    c = canonicalize(expr)
+    assert isinstance(c, ast.BinOp)
+    assert isinstance(c.left, ast.Attribute)
+
+
+def test_canonical_and_flattened():
+    d = DataFrame()
+    expr, _ = render(((d.a > 1) & (d.b > 2)) & (d.c > 3))
+    c = canonicalize(expr)
+    assert isinstance(c, ast.BoolOp)
+    assert len(c.values) == 3
+    assert canonical_dump(((d.a > 1) & (d.b > 2)) & (d.c > 3)) \
+        == canonical_dump((d.c > 3) & ((d.b > 2) & (d.a > 1)))
+
+
+def test_canonical_and_or_not_mixed():
+    d = DataFrame()
+    expr, _ = render(((d.a > 1) | (d.b > 2)) & (d.c > 3))
+    c = canonicalize(expr)
+    assert isinstance(c, ast.BoolOp)
+    assert len(c.values) == 2
+
+
+def test_canonical_and_guarded_index():
+    d = DataFrame()
+    expr, _ = render((d.jets[0].pt > 30) & (d.jets.count() > 0))
+    c = canonicalize(expr)
+    assert isinstance(c, ast.BoolOp)
+    assert isinstance(c.values[0], ast.Compare)
+    assert isinstance(c.values[0].left, ast.Attribute)
+    assert c.values[0].left.attr == 'pt'
+
+
+def test_canonical_keywords():
+    d = DataFrame()
+    assert canonical_dump(d.jets.fit(a=1, b=2)) == canonical_dump(d.jets.fit(b=2, a=1))
+
+
+def test_canonical_unchanged_shared():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.jets.pt > 30].pt)
+    assert canonicalize(expr) is expr
+
+
+def test_canonical_idempotent():
+    d = DataFrame()
+    expr, _ = render((d.c > 3) & ((2 * d.b > d.x) & (d.a + d.y > 1)))
+    c = canonicalize(expr)
+    assert ast.dump(canonicalize(c)) == ast.dump(c)
+
+
+def test_canonical_fingerprint():
+    d = DataFrame()
+    assert fingerprint((d.a > 1) & (d.b > 2)) != fingerprint((d.b > 2) & (d.a > 1))
+    assert fingerprint((d.a > 1) & (d.b > 2), canonical=True) \
+        == fingerprint((d.b > 2) & (d.a > 1), canonical=True)
@@ -193,3 +193,84 @@ def test_nested_col_access():
     p = cast(ast_DataFrame, d1.child_expr.args[0]).dataframe
 
     assert cast(ast_Callable, d1.child_expr.func).dataframe is p
+
+
+def test_computed_col_through_many_filters():
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    j = df.jets
+    for i in range(2000):
+        j = j[j.eta < i]
+    d1 = j.ptgev
+
+    assert isinstance(d1.child_expr, ast.BinOp)
+    pt = cast(ast_DataFrame, d1.child_expr.left).dataframe
+    assert isinstance(pt.child_expr, ast.Attribute)
+    d1_parent = cast(ast_DataFrame, pt.child_expr.value).dataframe
+    filters = []
+    while d1_parent.filter is not None:
+        filters.append(d1_parent.filter)
+        d1_parent = cast(ast_DataFrame, d1_parent.child_expr).dataframe
+    assert len(filters) == 2000
+    assert d1_parent is df.jets
+
+
+def test_computed_col_filters_in_order():
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    j = df.jets[df.jets.eta < 1][df.jets.eta < 2]
+    j.pt
+    j = j[df.jets.eta < 3]
+    d1 = j[df.jets.eta < 4].ptgev
+
+    assert isinstance(d1.child_expr, ast.BinOp)
+    pt = cast(ast_DataFrame, d1.child_expr.left).dataframe
+    assert isinstance(pt.child_expr, ast.Attribute)
+    p = cast(ast_DataFrame, pt.child_expr.value).dataframe
+    seen = []
+    while p.filter is not None:
+        seen.append(ast.literal_eval(p.filter.child_expr.comparators[0]))  # type: ignore
+        p = cast(ast_DataFrame, p.child_expr).dataframe
+    assert seen == [1, 2, 3, 4]
+    assert p is df.jets
+
+
+def test_computed_col_added_after_access():
+    df = DataFrame()
+    j = df.jets[df.jets.eta < 2.4]
+    j.pt
+    df.jets['ptgev'] = df.jets.pt / 1000
+    d1 = j[j.pt > 30].ptgev
+
+    assert isinstance(d1.child_expr, ast.BinOp)
+    assert ast.literal_eval(d1.child_expr.right) == 1000
+
+
+def test_computed_col_nearest_wins():
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    j = df.jets[df.jets.eta < 2.4]
+    j['ptgev'] = j.pt / 1001
+    d1 = j[j.pt > 30].ptgev
+
+    assert isinstance(d1.child_expr, ast.BinOp)
+    assert ast.literal_eval(d1.child_expr.right) == 1001
+
+
+def test_computed_col_rewrite_shared():
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    sel = df.jets.eta < 2.4
+    d1 = df.jets[sel].ptgev
+    d2 = df.jets[sel].ptgev
+
+    assert d1 is d2
+
+
+def test_computed_col_rewrite_different_filters():
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    d1 = df.jets[df.jets.eta < 2.4].ptgev
+    d2 = df.jets[df.jets.eta < 2.4].ptgev
+
+    assert d1 is not d2
@@ -0,0 +1,95 @@
+import ast
+
+from dataframe_expressions import DataFrame, cost_model, render, reorder_predicates
+
+
+def _names(a):
+    'The attribute each term of a binary chain of BoolOps looks at, in order'
+    if isinstance(a, ast.BoolOp):
+        return _names(a.values[0]) + _names(a.values[1])
+    return [n.attr for n in ast.walk(a) if isinstance(n, ast.Attribute)][0:1]
+
+
+def test_cost_default():
+    d = DataFrame()
+    expr, _ = render(d.met > 200)
+    m = cost_model()
+    assert m.cost(expr) == 2.0
+    assert m.selectivity(expr) == 0.5
+
+
+def test_cost_function():
+    d = DataFrame()
+    expr, _ = render(d.jets.DeltaR(d.eles) > 0.4)
+    m = cost_model().set_function_cost('DeltaR', 100.0)
+    assert m.cost(expr) > 100.0
+
+
+def test_selectivity_registered():
+    d = DataFrame()
+    expr, _ = render((d.met > 200) & (d.x > 0))
+    m = cost_model().set_selectivity('met', 0.01)
+    assert m.selectivity(expr.values[0]) == 0.01
+    assert m.selectivity(expr.values[1]) == 0.5
+
+
+def test_reorder_expensive_last():
+    d = DataFrame()
+    expr, _ = render(d[(d.jets.DeltaR(d.eles).count() > 0) & (d.met > 200)])
+    m = cost_model().set_function_cost('DeltaR', 100.0)
+
+    r = reorder_predicates(expr, m)
+    assert _names(r.filter) == ['met', 'count']
+
+
+def test_reorder_selective_first():
+    d = DataFrame()
+    expr, _ = render((d.x > 0) & (d.met > 200))
+    m = cost_model().set_selectivity('met', 0.01)
+
+    r = reorder_predicates(expr, m)
+    assert _names(r) == ['met', 'x']
+
+
+def test_reorder_or_likely_first():
+    d = DataFrame()
+    expr, _ = render((d.x > 0) | (d.met > 200))
+    m = cost_model().set_selectivity('met', 0.9)
+
+    r = reorder_predicates(expr, m)
+    assert _names(r) == ['met', 'x']
+
+
+def test_reorder_nothing_to_do():
+    d = DataFrame()
+    expr, _ = render((d.met > 200) & (d.x > 0))
+
+    assert reorder_predicates(expr, cost_model()) is expr
+
+
+def test_reorder_flattens_chain():
+    d = DataFrame()
+    expr, _ = render(((d.a > 0) & (d.b > 0)) & (d.met > 200))
+    m = cost_model().set_selectivity('met', 0.01)
+
+    r = reorder_predicates(expr, m)
+    assert _names(r) == ['met', 'a', 'b']
+    assert len(r.values) == 2
+
+
+def test_reorder_mixed_ops_not_flattened():
+    d = DataFrame()
+    expr, _ = render(((d.a > 0) | (d.b > 0)) & (d.met > 200))
+    m = cost_model().set_selectivity('met', 0.01)
+
+    r = reorder_predicates(expr, m)
+    assert isinstance(r.values[1], ast.BoolOp)
+    assert isinstance(r.values[1].op, ast.Or)
+
+
+def test_reorder_guard_kept():
+    d = DataFrame()
+    expr, _ = render((d.jets.count() > 0) & (d.jets[0].pt > 30))
+    m = cost_model().set_function_cost('count', 1000.0)
+
+    assert reorder_predicates(expr, m) is expr
@@ -0,0 +1,142 @@
+import ast
+
+from dataframe_expressions import (
+    DataFrame, ast_Binding, ast_DataFrame, ast_Filter, ast_Let,
+    eliminate_common_subexpressions, render, unwrap_let)
+
+
+def test_cse_nothing_to_do():
+    d = DataFrame()
+    expr, _ = render(d.jets.pt)
+
+    assert eliminate_common_subexpressions(expr) is expr
+
+
+def test_cse_leaves_not_bound():
+    d = DataFrame()
+    expr, _ = render(d.x + d.x)
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 0
+
+
+def test_cse_repeated_binop():
+    d = DataFrame()
+    expr, _ = render(d.jets.pt / 1000 + d.jets.pt / 1000)
+
+    result = eliminate_common_subexpressions(expr)
+    assert isinstance(result, ast_Let)
+    bindings, body = unwrap_let(result)
+
+    assert len(bindings) == 1
+    name, value = bindings[0]
+    assert name == 'cse_0'
+    assert isinstance(value, ast.BinOp)
+    assert isinstance(value.op, ast.Div)
+
+    assert isinstance(body, ast.BinOp)
+    assert isinstance(body.left, ast_Binding)
+    assert isinstance(body.right, ast_Binding)
+    assert body.left.name == 'cse_0'
+    assert body.right.name == 'cse_0'
+
+
+def test_cse_different_python_paths():
+    d = DataFrame()
+    a = d.jets.pt / 1000
+    b = d.jets.pt / 1000
+    expr, _ = render(d[(a > 10) & (b < 20)])
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 1
+    assert isinstance(bindings[0][1], ast.BinOp)
+
+    assert isinstance(body, ast_Filter)
+    f = body.filter
+    assert isinstance(f, ast.BoolOp)
+    assert isinstance(f.values[0], ast.Compare)
+    assert isinstance(f.values[1], ast.Compare)
+    assert isinstance(f.values[0].left, ast_Binding)
+    assert isinstance(f.values[1].left, ast_Binding)
+
+
+def test_cse_inside_call_args():
+    d = DataFrame()
+    expr, _ = render(d.jets.apply(d.eles.pt * 2, d.eles.pt * 2))
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 1
+    assert isinstance(body, ast.Call)
+    assert all(isinstance(a, ast_Binding) for a in body.args)
+
+
+def test_cse_call_func_not_bound():
+    d = DataFrame()
+    expr, _ = render(d.jets.count() + d.jets.count())
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+
+    assert len(bindings) == 1
+    assert isinstance(bindings[0][1], ast.Call)
+    assert isinstance(bindings[0][1].func, ast.Attribute)
+
+
+def test_cse_nested_only_outer_bound():
+    d = DataFrame()
+    expr, _ = render((d.x * 2 + 1) + (d.x * 2 + 1))
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 1
+
+
+def test_cse_nested_and_separate():
+    d = DataFrame()
+    inner = d.x * 2
+    expr, _ = render((inner + 1) * (inner + 1) + inner)
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 2
+
+    # The inner one must come first, and the outer one refers to it.
+    (name0, value0), (name1, value1) = bindings
+    assert isinstance(value0, ast.BinOp) and isinstance(value0.op, ast.Mult)
+    assert isinstance(value1, ast.BinOp) and isinstance(value1.op, ast.Add)
+    assert isinstance(value1.left, ast_Binding) and value1.left.name == name0
+
+    assert isinstance(body, ast.BinOp)
+    assert isinstance(body.right, ast_Binding) and body.right.name == name0
+
+
+def test_cse_different_dataframes():
+    d1 = DataFrame()
+    d2 = DataFrame()
+    expr, _ = render(d1.jets.pt / 1000 + d2.jets.pt / 1000)
+
+    bindings, _ = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 0
+
+
+def test_cse_repeated_filter():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.jets.pt > 30].pt + d.jets[d.jets.pt > 30].eta)
+
+    bindings, body = unwrap_let(eliminate_common_subexpressions(expr))
+    assert len(bindings) == 1
+    assert isinstance(bindings[0][1], ast_Filter)
+    assert isinstance(body, ast.BinOp)
+    assert isinstance(body.left, ast.Attribute)
+    assert isinstance(body.left.value, ast_Binding)
+
+
+def test_cse_original_untouched():
+    d = DataFrame()
+    expr, _ = render(d.jets.pt / 1000 + d.jets.pt / 1000)
+    before = ast.dump(expr)
+    eliminate_common_subexpressions(expr)
+
+    assert ast.dump(expr) == before
+    assert isinstance(expr, ast.BinOp)
+    assert isinstance(expr.left, ast.BinOp)
+    assert isinstance(expr.left.left, ast.Attribute)
+    assert isinstance(expr.left.left.value, ast.Attribute)
+    assert isinstance(expr.left.left.value.value, ast_DataFrame)
@@ -1,10 +1,11 @@
 import ast
-from typing import List, Optional, cast
+from typing import Dict, List, Optional, cast
 
 import pytest
 
 from dataframe_expressions import (
-    Column, DataFrame, ast_Callable, ast_Column, ast_DataFrame, define_alias)
+    Column, DataFrame, ast_Callable, ast_Column, ast_DataFrame, ast_Filter, define_alias,
+    disable_interning, enable_interning, render)
 
 from .utils_for_testing import reset_var_counter  # NOQA
 
@@ -506,3 +507,169 @@ def test_deep_copy_1():
     df2_parent = cast(ast_DataFrame, df2.child_expr.value)
 
     assert df2_parent is not df
+
+
+def test_dataframe_no_dict():
+    d = DataFrame()
+    assert not hasattr(d, '__dict__')
+    assert not hasattr(d.x > 0, '__dict__')
+
+
+def test_dataframe_subclass_has_dict():
+    class my_df(DataFrame):
+        def __init__(self):
+            DataFrame.__init__(self)
+            self.name = 'hi'
+
+    d = my_df()
+    assert d.name == 'hi'
+    assert isinstance(d.x, DataFrame)
+
+
+def test_dataframe_sub_df_lazy():
+    from dataframe_expressions.data_frame import _no_sub_df
+    d = DataFrame()
+    assert d._sub_df is _no_sub_df
+    d.x
+    assert d._sub_df is not _no_sub_df
+    assert DataFrame()._sub_df is _no_sub_df
+
+
+def test_dataframe_copy_shares_sub_df():
+    d = DataFrame()
+    d1 = DataFrame(df_to_copy=d)
+    d1['pt2'] = d1.pt * 2
+    assert 'pt2' in d._sub_df
+
+
+def test_dataframe_memory():
+    'Each DataFrame should be small - there can be millions of them'
+    import tracemalloc
+    n = 10000
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        dfs = [DataFrame() for _ in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert len(dfs) == n
+    # With a `__dict__` and a `_sub_df` dict of its own this was over 150 bytes.
+    assert (after - before) / n < 100
+
+
+def test_dataframe_memory_graph():
+    'A realistic graph: many filtered expressions built off one source'
+    import gc
+    import sys
+    import tracemalloc
+    from dataframe_expressions.data_frame import _sub_link_info
+
+    n = 2000
+    d = DataFrame()
+    gc.collect()
+    old_ids = set(id(o) for o in gc.get_objects())
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        exprs = [d.jets[d.jets.pt > i].eta for i in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # Shallow size of each kind of node in the graph
+    sizes: Dict[str, List[int]] = {}
+    for o in gc.get_objects():
+        if id(o) not in old_ids and isinstance(o, (DataFrame, Column, _sub_link_info)):
+            sizes.setdefault(type(o).__name__, []).append(sys.getsizeof(o))
+    per_node = {k: sum(v) / len(v) for k, v in sizes.items()}
+    n_nodes = sum(len(v) for v in sizes.values())
+    report = f'{per_node}, {(after - before) / n_nodes:.0f} bytes per node overall'
+
+    assert len(exprs) == n
+    # Each expression makes two `DataFrame`s, a `Column`, and a `_sub_link_info`
+    assert len(sizes['DataFrame']) >= 2 * n, report
+    assert all(size < 100 for size in per_node.values()), report
+    # Everything, including the `ast` nodes: about 2200 bytes per expression on 3.11.
+    assert (after - before) / n < 4000, report
+
+
+def test_computed_col_filtered_intermediate():
+    'A filtered DataFrame that defines a computed column: each filter is applied once'
+    df = DataFrame()
+    df.jets['c'] = lambda jt: jt.eta
+    j = df.jets[df.jets.pt > 1]
+    j['d'] = lambda jt: jt.phi
+    k = j[j.pt > 2]
+    expr, _ = render(k.c)
+
+    # The lambda is called on the filtered jets: walk down its chain of filters
+    assert isinstance(expr, ast.Call)
+    a = expr.args[0]
+    cuts = []
+    while isinstance(a, ast_Filter):
+        cuts.append(ast.literal_eval(a.filter.comparators[0]))
+        a = a.expr
+    assert sorted(cuts) == [1, 2]
+
+
+@pytest.fixture()
+def interning():
+    enable_interning()
+    yield None
+    disable_interning()
+
+
+def test_interning_off_by_default():
+    d = DataFrame()
+    assert (d.jets.pt > 30) is not (d.jets.pt > 30)
+
+
+def test_interning_compare(interning):
+    d = DataFrame()
+    assert (d.jets.pt > 30) is (d.jets.pt > 30)
+    assert (d.jets.pt > 30) is not (d.jets.pt > 31)
+    assert (d.jets.pt > 30) is not (d.jets.pt > 30.0)
+    assert (d.jets.pt > 30) is not (d.jets.pt >= 30)
+    assert (d.jets.pt > 30) is not (d.jets.eta > 30)
+
+
+def test_interning_different_source(interning):
+    d1 = DataFrame()
+    d2 = DataFrame()
+    assert (d1.jets.pt > 30) is not (d2.jets.pt > 30)
+
+
+def test_interning_nested(interning):
+    d = DataFrame()
+    e1 = d.jets[(d.jets.pt > 30) & (d.jets.eta < 2.4)].pt / 1000.0
+    e2 = d.jets[(d.jets.pt > 30) & (d.jets.eta < 2.4)].pt / 1000.0
+    assert e1 is e2
+
+
+def test_interning_render_shares(interning):
+    d = DataFrame()
+    expr, _ = render((d.x + 1) * (d.x + 1))
+    assert isinstance(expr, ast.BinOp)
+    assert expr.left is expr.right
+
+
+def test_interning_lambda(interning):
+    d = DataFrame()
+    assert d.jets.map(lambda j: j.pt) is not d.jets.map(lambda j: j.pt)
+
+    f = lambda j: j.pt  # NOQA
+    assert d.jets.map(f) is d.jets.map(f)
+
+
+def test_interning_weak(interning):
+    import gc
+    from dataframe_expressions import data_frame
+
+    d = DataFrame()
+    e = d.jets.pt > 30
+    assert len(data_frame._intern_table) > 0  # type: ignore
+    del e
+    gc.collect()
+    assert len(data_frame._intern_table) == 0  # type: ignore
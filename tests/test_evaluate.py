@@ -0,0 +1,176 @@
+import numpy as np
+import pytest
+
+from dataframe_expressions import (
+    DataFrame, EvaluationError, evaluate, render, subexpr_cache, user_func)
+
+
+@pytest.fixture()
+def columns():
+    return {
+        'met': np.array([10.0, 60.0, 70.0, 80.0]),
+        'n': np.array([1, 2, 3, 4]),
+        'jets.pt': np.array([1.0, 40.0, 50.0, 5.0]),
+        'jets.eta': np.array([0.5, 3.0, 1.0, 0.1]),
+    }
+
+
+def test_evaluate_column(columns):
+    df = DataFrame()
+    assert list(evaluate(df.met, columns)) == [10.0, 60.0, 70.0, 80.0]
+    assert list(evaluate(df.jets.pt, columns)) == [1.0, 40.0, 50.0, 5.0]
+
+
+def test_evaluate_rendered(columns):
+    df = DataFrame()
+    expr, context = render(df.met * 2)
+    assert list(evaluate(expr, columns, context=context)) == [20.0, 120.0, 140.0, 160.0]
+
+
+def test_evaluate_missing_column(columns):
+    df = DataFrame()
+    with pytest.raises(EvaluationError):
+        evaluate(df.jets.phi, columns)
+
+
+def test_evaluate_collection(columns):
+    df = DataFrame()
+    with pytest.raises(EvaluationError):
+        evaluate(df.jets, columns)
+
+
+def test_evaluate_columns_same_length():
+    df = DataFrame()
+    with pytest.raises(EvaluationError):
+        evaluate(df.x, {'x': np.array([1, 2]), 'y': np.array([1, 2, 3])})
+
+
+def test_evaluate_binop(columns):
+    df = DataFrame()
+    assert list(evaluate(df.met / 10 + df.n, columns)) == [2.0, 8.0, 10.0, 12.0]
+    assert list(evaluate(df.n * df.n - 1, columns)) == [0, 3, 8, 15]
+
+
+def test_evaluate_compare(columns):
+    df = DataFrame()
+    assert list(evaluate(df.met > 60, columns)) == [False, False, True, True]
+
+
+def test_evaluate_bool(columns):
+    df = DataFrame()
+    assert list(evaluate((df.met > 50) & (df.jets.pt > 30), columns)) \
+        == [False, True, True, False]
+    assert list(evaluate((df.met > 65) | (df.jets.pt < 2), columns)) \
+        == [True, False, True, True]
+    assert list(evaluate(~(df.met > 50), columns)) == [True, False, False, False]
+
+
+def test_evaluate_filter(columns):
+    df = DataFrame()
+    assert list(evaluate(df[df.met > 50].jets.pt, columns)) == [40.0, 50.0, 5.0]
+
+
+def test_evaluate_filter_twice(columns):
+    df = DataFrame()
+    jets = df.jets[df.jets.pt > 30]
+    assert list(evaluate(jets[jets.eta < 2].pt, columns)) == [50.0]
+    assert list(evaluate(jets[df.jets.eta < 2].pt, columns)) == [50.0]
+
+
+def test_evaluate_filter_column(columns):
+    df = DataFrame()
+    assert list(evaluate(df.met[df.met > 50], columns)) == [60.0, 70.0, 80.0]
+
+
+def test_evaluate_count(columns):
+    df = DataFrame()
+    assert evaluate(df.jets[df.jets.pt > 30].count(), columns) == 2
+    assert evaluate(df.jets[df.jets.pt > 30].pt.count(), columns) == 2
+    assert evaluate(df.met.sum(), columns) == 220.0
+
+
+def test_evaluate_ufunc(columns):
+    df = DataFrame()
+    assert np.allclose(evaluate(np.sin(df.met), columns), np.sin(columns['met']))
+    assert list(evaluate(abs(df.jets.eta - 1), columns)) == [0.5, 2.0, 0.0, 0.9]
+
+
+def test_evaluate_array_function(columns):
+    df = DataFrame()
+    assert list(evaluate(np.where(df.met > 50, df.met, 0), columns)) == [0.0, 60.0, 70.0, 80.0]
+
+    counts, edges = evaluate(np.histogram(df.met, bins=2, range=(0, 100)), columns)
+    assert list(counts) == [1, 3]
+    assert list(edges) == [0.0, 50.0, 100.0]
+
+
+def test_evaluate_user_func(columns):
+    @user_func
+    def add_one(x: float) -> float:
+        assert False
+
+    df = DataFrame()
+    assert list(evaluate(add_one(df.n), columns, functions={'add_one': lambda x: x + 1})) \
+        == [2, 3, 4, 5]
+    with pytest.raises(EvaluationError):
+        evaluate(add_one(df.n), columns)
+
+
+def test_evaluate_map(columns):
+    df = DataFrame()
+    assert list(evaluate(df.jets.map(lambda j: j.pt * 2), columns)) == [2.0, 80.0, 100.0, 10.0]
+
+
+def test_evaluate_computed_col(columns):
+    df = DataFrame()
+    df.jets['ptgev'] = lambda j: j.pt / 1000
+    assert list(evaluate(df.jets[df.jets.pt > 30].ptgev, columns)) == [0.04, 0.05]
+
+
+def test_evaluate_computed_col_expression(columns):
+    df = DataFrame()
+    df.jets['ptgev'] = df.jets.pt / 1000
+    assert list(evaluate(df.jets[df.jets.pt > 30].ptgev, columns)) == [0.04, 0.05]
+
+
+def test_evaluate_cache(columns):
+    df = DataFrame()
+    c = subexpr_cache()
+    good = df.jets[df.jets.pt > 30]
+    assert list(evaluate(good.pt * 2, columns, cache=c)) == [80.0, 100.0]
+    n = len(c)
+    assert n > 0
+
+    # Only what is new is added
+    assert list(evaluate(good.pt * 3, columns, cache=c)) == [120.0, 150.0]
+    assert len(c) == n + 1
+
+
+def test_evaluate_cache_used(columns):
+    df = DataFrame()
+    c = subexpr_cache()
+    evaluate(df.met * 2, columns, cache=c)
+
+    # Nothing under a cached node is evaluated again
+    expr, _ = render(df.met * 2)
+    c.put(c.key(expr), np.array([1.0, 2.0, 3.0, 4.0]), 1.0)
+    assert list(evaluate(DataFrame().met * 2, columns, cache=c)) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_evaluate_numpy_not_imported():
+    'numpy is only needed once something is evaluated'
+    import subprocess
+    import sys
+    code = 'import sys, dataframe_expressions\nassert "numpy" not in sys.modules\n'
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_evaluate_cache_uncacheable(columns):
+    'A lambda that captures something that can not be fingerprinted is evaluated, not cached'
+    import threading
+    df = DataFrame()
+    c = subexpr_cache()
+    lock = threading.Lock()
+    assert list(evaluate(df.jets.map(lambda j: j.pt if lock else j.eta), columns, cache=c)) \
+        == [1.0, 40.0, 50.0, 5.0]
+    assert len(c) == 0
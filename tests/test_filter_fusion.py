@@ -0,0 +1,150 @@
+import ast
+
+from dataframe_expressions import (
+    DataFrame, ast_DataFrame, ast_Filter, fuse_filters, render)
+
+
+def test_fuse_nothing_to_do():
+    d = DataFrame()
+    expr, _ = render(d[d.x > 0].y)
+
+    result, plan = fuse_filters(expr)
+    assert result is expr
+    assert len(plan) == 1
+    assert plan[0].n_filters == 1
+
+
+def test_fuse_two_filters():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1[d1.y > 0])
+
+    result, plan = fuse_filters(expr)
+    assert isinstance(result, ast_Filter)
+    assert isinstance(result.expr, ast_DataFrame)
+    assert isinstance(result.filter, ast.BoolOp)
+    assert isinstance(result.filter.op, ast.And)
+    assert len(result.filter.values) == 2
+
+    # The second filter now refers to the un-filtered sequence
+    y_ref = result.filter.values[1].left
+    assert isinstance(y_ref, ast.Attribute)
+    assert y_ref.attr == 'y'
+    assert y_ref.value is result.expr
+
+    assert len(plan) == 1
+    assert plan[0].n_filters == 2
+    assert plan[0].sequence is result.expr
+    assert plan[0].predicate is result.filter
+
+
+def test_fuse_leaves_original_alone():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1[d1.y > 0])
+
+    fuse_filters(expr)
+    assert isinstance(expr.expr, ast_Filter)
+
+
+def test_fuse_three_filters():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    d2 = d1[d1.y > 0]
+    expr, _ = render(d2[d2.z > 0].pt)
+
+    result, plan = fuse_filters(expr)
+    assert isinstance(result, ast.Attribute)
+    f = result.value
+    assert isinstance(f, ast_Filter)
+    assert isinstance(f.expr, ast_DataFrame)
+    assert isinstance(f.filter.values[0], ast.BoolOp)
+    assert len(plan) == 1
+    assert plan[0].n_filters == 3
+
+
+def test_fuse_collection_filters():
+    d = DataFrame()
+    j1 = d.jets[d.jets.pt > 30]
+    expr, _ = render(j1[j1.eta < 2.4].pt)
+
+    result, plan = fuse_filters(expr)
+    f = result.value
+    assert isinstance(f, ast_Filter)
+    assert isinstance(f.expr, ast.Attribute)
+    assert f.expr.attr == 'jets'
+    assert len(plan) == 1
+    assert plan[0].n_filters == 2
+
+
+def test_fuse_not_with_sequence_method():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1[d1.count() > 2])
+
+    result, plan = fuse_filters(expr)
+    assert result is expr
+    assert [p.n_filters for p in plan] == [1, 1]
+
+
+def test_fuse_not_with_lambda():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1[d1.jets.map(lambda j: j.pt).count() > 2])
+
+    result, _ = fuse_filters(expr)
+    assert result is expr
+
+
+def test_fuse_sequence_in_function_arg():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1[d.y.DeltaR(d1) > 2])
+
+    result, _ = fuse_filters(expr)
+    assert result is expr
+
+
+def test_push_down_off_by_default():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.met > 50].pt)
+
+    result, _ = fuse_filters(expr)
+    assert result is expr
+
+
+def test_push_down_event_filter():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.met > 50].pt)
+
+    result, plan = fuse_filters(expr, push_down_event_filters=True)
+    assert isinstance(result, ast.Attribute)
+    assert result.attr == 'pt'
+    jets = result.value
+    assert isinstance(jets, ast.Attribute)
+    assert jets.attr == 'jets'
+    assert isinstance(jets.value, ast_Filter)
+    assert isinstance(jets.value.expr, ast_DataFrame)
+    assert len(plan) == 1
+
+
+def test_push_down_and_fuse():
+    d = DataFrame()
+    d1 = d[d.x > 0]
+    expr, _ = render(d1.jets[d1.met > 50].pt)
+
+    result, plan = fuse_filters(expr, push_down_event_filters=True)
+    f = result.value.value
+    assert isinstance(f, ast_Filter)
+    assert isinstance(f.expr, ast_DataFrame)
+    assert isinstance(f.filter, ast.BoolOp)
+    assert len(plan) == 1
+    assert plan[0].n_filters == 2
+
+
+def test_push_down_not_jet_level():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.jets.pt > 30].pt)
+
+    result, _ = fuse_filters(expr, push_down_event_filters=True)
+    assert result is expr
@@ -0,0 +1,202 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dataframe_expressions import DataFrame, FingerprintError, fingerprint, user_func
+
+
+def test_fingerprint_same_expression():
+    df = DataFrame()
+    assert fingerprint(df.jets.pt) == fingerprint(df.jets.pt)
+
+
+def test_fingerprint_different_dataframes():
+    'Two separate source DataFrames of the same type are the same dataset'
+    df1 = DataFrame()
+    df2 = DataFrame()
+    assert fingerprint(df1.jets[df1.jets.pt > 30].pt) == fingerprint(df2.jets[df2.jets.pt > 30].pt)
+
+
+def test_fingerprint_attribute_name():
+    df = DataFrame()
+    assert fingerprint(df.jets.pt) != fingerprint(df.jets.eta)
+
+
+def test_fingerprint_literal():
+    df = DataFrame()
+    assert fingerprint(df.jets.pt > 30) != fingerprint(df.jets.pt > 31)
+    assert fingerprint(df.jets.pt > 30) != fingerprint(df.jets.pt > 30.0)
+
+
+def test_fingerprint_filter():
+    df = DataFrame()
+    assert fingerprint(df.jets[df.jets.pt > 30].pt) != fingerprint(df.jets.pt)
+    assert fingerprint(df.jets[df.jets.pt > 30].pt) != fingerprint(df.jets[df.jets.pt > 40].pt)
+
+
+def test_fingerprint_source_type():
+    class my_source(DataFrame):
+        pass
+
+    assert fingerprint(DataFrame().jets) != fingerprint(my_source().jets)
+
+
+def test_fingerprint_source_token():
+    class my_source(DataFrame):
+        def __init__(self, name: str):
+            DataFrame.__init__(self)
+            self.name = name
+
+        def _fingerprint_token(self) -> str:
+            return self.name
+
+    assert fingerprint(my_source('a').jets) == fingerprint(my_source('a').jets)
+    assert fingerprint(my_source('a').jets) != fingerprint(my_source('b').jets)
+
+
+def test_fingerprint_two_sources():
+    df1 = DataFrame()
+    df2 = DataFrame()
+    assert fingerprint(df1.x + df2.x) != fingerprint(df1.x + df1.x)
+
+
+def test_fingerprint_lambda_code():
+    df = DataFrame()
+    assert fingerprint(df.jets.map(lambda j: j.pt)) == fingerprint(df.jets.map(lambda j: j.pt))
+    assert fingerprint(df.jets.map(lambda j: j.pt)) != fingerprint(df.jets.map(lambda j: j.eta))
+
+
+def test_fingerprint_lambda_captured():
+    df = DataFrame()
+
+    def make(cut):
+        return df.jets.map(lambda j: j.pt > cut)
+
+    assert fingerprint(make(30)) == fingerprint(make(30))
+    assert fingerprint(make(30)) != fingerprint(make(40))
+
+
+def test_fingerprint_computed_col():
+    df1 = DataFrame()
+    df1.jets['ptgev'] = lambda j: j.pt / 1000
+    df2 = DataFrame()
+    df2.jets['ptgev'] = lambda j: j.pt / 1001
+
+    assert fingerprint(df1.jets.ptgev) != fingerprint(df2.jets.ptgev)
+
+
+def test_fingerprint_user_func():
+    @user_func
+    def f1(p: float) -> float:
+        assert False
+
+    @user_func
+    def f2(p: float) -> float:
+        assert False
+
+    df = DataFrame()
+    assert fingerprint(f1(df.x)) != fingerprint(f2(df.x))
+
+
+def fact(n: int) -> int:
+    return 1 if n <= 1 else n * fact(n - 1)
+
+
+@user_func
+def count_down(n: float) -> float:
+    return count_down(n - 1) if n > 0 else 0.0
+
+
+def test_fingerprint_recursive_global():
+    df = DataFrame()
+    assert fingerprint(df.jets.map(lambda j: j.pt * fact(3))) \
+        == fingerprint(df.jets.map(lambda j: j.pt * fact(3)))
+    assert fingerprint(df.jets.map(lambda j: j.pt * fact(3))) \
+        != fingerprint(df.jets.map(lambda j: j.pt * fact(4)))
+
+
+def test_fingerprint_lambda_user_func():
+    df = DataFrame()
+    assert fingerprint(df.jets.map(lambda j: count_down(j.pt))) \
+        == fingerprint(df.jets.map(lambda j: count_down(j.pt)))
+    assert fingerprint(df.jets.map(lambda j: count_down(j.pt))) \
+        != fingerprint(df.jets.map(lambda j: count_down(j.eta)))
+
+
+def test_fingerprint_other_process():
+    code = 'from dataframe_expressions import DataFrame, fingerprint\n' \
+           'df = DataFrame()\n' \
+           'df.jets["ptgev"] = lambda j: j.pt / 1000.0\n' \
+           'cut = {"pt": 30}\n' \
+           'print(fingerprint(df.jets[df.jets.ptgev > 30].map(lambda j: j.eta < cut["pt"])))\n'
+
+    def run(seed: str) -> str:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        return subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                              stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    assert run('1') == run('2')
+
+
+def test_fingerprint_numpy_scalar():
+    import numpy as np
+    df = DataFrame()
+
+    def make(cut):
+        return df.jets.map(lambda j: j.pt > cut)
+
+    assert fingerprint(make(np.int64(30))) == fingerprint(make(np.int64(30)))
+    assert fingerprint(make(np.int64(30))) != fingerprint(make(np.int64(50)))
+    assert fingerprint(make(np.int64(30))) != fingerprint(make(np.int32(30)))
+
+
+def test_fingerprint_numpy_array():
+    import numpy as np
+    df = DataFrame()
+
+    def make(cuts):
+        return df.jets.map(lambda j: j.pt > cuts[0])
+
+    assert fingerprint(make(np.array([30]))) == fingerprint(make(np.array([30])))
+    assert fingerprint(make(np.array([30]))) != fingerprint(make(np.array([50])))
+    assert fingerprint(make(np.array([30, 50]))) != fingerprint(make(np.array([[30, 50]])))
+    assert fingerprint(make(np.array(['a'], dtype=object))) \
+        != fingerprint(make(np.array(['b'], dtype=object)))
+
+
+class cut_holder:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_fingerprint_object():
+    df = DataFrame()
+
+    def make(cut):
+        return df.jets.map(lambda j: j.pt > cut.value)
+
+    assert fingerprint(make(cut_holder(30))) == fingerprint(make(cut_holder(30)))
+    assert fingerprint(make(cut_holder(30))) != fingerprint(make(cut_holder(50)))
+
+
+def test_fingerprint_bound_method():
+    df = DataFrame()
+
+    class cut:
+        def __init__(self, value):
+            self.value = value
+
+        def passes(self, j):
+            return j.pt > self.value
+
+    assert fingerprint(df.jets.map(cut(30).passes)) != fingerprint(df.jets.map(cut(50).passes))
+
+
+def test_fingerprint_unknown_object():
+    import threading
+    df = DataFrame()
+    lock = threading.Lock()
+    with pytest.raises(FingerprintError):
+        fingerprint(df.jets.map(lambda j: j.pt if lock else j.eta))
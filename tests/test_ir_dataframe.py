@@ -0,0 +1,137 @@
+import ast
+
+import pytest
+
+from dataframe_expressions import (
+    DataFrame, ast_Callable, ast_DataFrame, ast_Filter, ast_to_ir, ir_op, ir_to_ast, render,
+    render_ir, user_func)
+
+
+def check_topological(table):
+    for node_id, _, children, _ in table.nodes():
+        assert all(c < node_id for c in children)
+
+
+def test_ir_source():
+    d = DataFrame()
+    table, _ = render_ir(d)
+
+    assert len(table) == 1
+    assert table.op(0) == ir_op.SOURCE
+    assert table.constant(0) is d
+    assert table.roots == [0]
+
+
+def test_ir_attribute():
+    d = DataFrame()
+    table, _ = render_ir(d.jets.pt)
+
+    check_topological(table)
+    root = table.roots[0]
+    assert table.op(root) == ir_op.ATTRIBUTE
+    assert table.constant(root) == 'pt'
+    jets = table.children_of(root)[0]
+    assert table.op(jets) == ir_op.ATTRIBUTE
+    assert table.constant(jets) == 'jets'
+
+
+def test_ir_filter_shares_nodes():
+    d = DataFrame()
+    table, _ = render_ir(d.jets[d.jets.pt > 30].pt)
+
+    check_topological(table)
+    ops = [table.op(i) for i in range(len(table))]
+    assert ops.count(ir_op.SOURCE) == 1
+    assert ops.count(ir_op.FILTER) == 1
+    assert ops.count(ir_op.COMPARE) == 1
+
+    # `jets` is referenced twice, but only one node.
+    jets = [i for i in range(len(table))
+            if table.op(i) == ir_op.ATTRIBUTE and table.constant(i) == 'jets']
+    assert len(jets) == 1
+
+
+def test_ir_constant_pool():
+    d = DataFrame()
+    table, _ = render_ir((d.x > 30) & (d.y > 30))
+
+    literals = [v for v in table.pool if not isinstance(v, DataFrame)]
+    assert literals.count(30) == 1
+    assert literals.count(('Gt',)) == 1
+
+
+def test_ir_many_roots():
+    d = DataFrame()
+    table, _ = render_ir([d.jets.pt, d.jets.eta])
+
+    assert len(table.roots) == 2
+    pt, eta = table.roots
+    assert table.children_of(pt)[0] == table.children_of(eta)[0]
+
+
+@pytest.mark.parametrize("build", [
+    lambda d: d.jets[d.jets.pt > 30].pt,
+    lambda d: d.jets.count(),
+    lambda d: d.jets.apply(lambda j: j.pt),
+    lambda d: d.x + 2 * d.y,
+    lambda d: ~d.x,
+    lambda d: d[(d.x > 1) | (d.y < 2)],
+    lambda d: d.jets[0],
+    lambda d: d.jets.pt.fetch(bins=50, range=(0, 10), name='hi'),
+    lambda d: d.jets.pt.fetch([1, 2]),
+])
+def test_ir_round_trip(build):
+    d = DataFrame()
+    expr, _ = render(build(d))
+    table = ast_to_ir([expr])
+    new_expr = ir_to_ast(table)[0]
+
+    assert ast.dump(new_expr) == ast.dump(expr)
+
+
+def test_ir_round_trip_sharing():
+    d = DataFrame()
+    expr, _ = render(d.jets[d.jets.pt > 30].pt)
+    new_expr = ir_to_ast(ast_to_ir([expr]))[0]
+
+    assert isinstance(new_expr, ast.Attribute)
+    assert isinstance(new_expr.value, ast_Filter)
+    compare = new_expr.value.filter
+    assert isinstance(compare, ast.Compare)
+    assert isinstance(compare.left, ast.Attribute)
+    assert compare.left.value is new_expr.value.expr
+    assert isinstance(new_expr.value.expr, ast.Attribute)
+    assert isinstance(new_expr.value.expr.value, ast_DataFrame)
+    assert new_expr.value.expr.value.dataframe is d
+
+
+def test_ir_callable():
+    d = DataFrame()
+    table, _ = render_ir(d.jets.apply(lambda j: j.pt))
+
+    callables = [table.constant(i) for i in range(len(table)) if table.op(i) == ir_op.CALLABLE]
+    assert len(callables) == 1
+    assert isinstance(callables[0], ast_Callable)
+
+
+def test_ir_user_func():
+    @user_func
+    def f1(x: float) -> float:
+        assert False
+
+    d = DataFrame()
+    table, _ = render_ir(f1(d.x))
+    root = table.roots[0]
+    assert table.op(root) == ir_op.CALL
+    assert table.op(table.children_of(root)[0]) == ir_op.FUNCTION
+
+
+def test_ir_deep():
+    d = DataFrame()
+    d1 = d
+    for _ in range(20000):
+        d1 = d1.x
+    table, _ = render_ir(d1)
+
+    assert len(table) == 20001
+    assert len(ir_to_ast(table)) == 1
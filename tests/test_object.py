@@ -131,6 +131,61 @@ def test_collection_nested_excl():
     assert ast.dump(expr) == "Attribute(value=ast_DataFrame(), attr='x_new_1', ctx=Load())"
 
 
+def test_collection_no_dir(monkeypatch):
+    import dataframe_expressions.data_frame as data_frame
+
+    def bad_dir(o=None):
+        assert False, 'dir should not be called'
+
+    monkeypatch.setattr(data_frame, 'dir', bad_dir, raising=False)
+
+    df = DataFrame()
+    ml1 = leaf_object(multi_leaf_object(df))
+    expr, _ = render(ml1.x2 + df.x * 2 > 10)
+    assert isinstance(expr, ast.Compare)
+
+    mlo1 = multi_leaf_object_excl(df.m1)
+    with pytest.raises(Exception):
+        mlo1 + 1
+
+
+def test_collection_class_changed():
+    class changing_object(DataFrame):
+        def __init__(self, df: DataFrame):
+            DataFrame.__init__(self, expr=ast_DataFrame(df))
+
+    df = DataFrame()
+    c = changing_object(df)
+    expr, _ = render(c[c.z > 0].y)
+    assert "attr='y'" in ast.dump(expr)
+
+    # Once the class defines `y`, a filtered version should find it.
+    changing_object.y = property(lambda self: self.y_new)
+    c = changing_object(df)
+    expr, _ = render(c[c.z > 0].y)
+    assert "attr='y_new'" in ast.dump(expr)
+
+
+def test_collection_class_changed_same_size():
+    'An attribute is removed and another added: the class is the same size'
+    class changing_object(DataFrame):
+        def __init__(self, df: DataFrame):
+            DataFrame.__init__(self, expr=ast_DataFrame(df))
+
+        y = property(lambda self: self.y_new)
+
+    df = DataFrame()
+    c = changing_object(df)
+    expr, _ = render(c[c.z > 0].w)
+    assert "attr='w'" in ast.dump(expr)
+
+    del changing_object.y
+    changing_object.w = property(lambda self: self.w_new)
+    c = changing_object(df)
+    expr, _ = render(c[c.z > 0].w)
+    assert "attr='w_new'" in ast.dump(expr)
+
+
 class op_base:
     def render(self, f: Callable[[vec], Any]) -> Any:
         assert False, 'not implemented'
@@ -0,0 +1,93 @@
+import numpy as np
+
+from dataframe_expressions import DataFrame, define_alias, required_columns, user_func
+
+from .utils_for_testing import reset_var_counter  # NOQA
+
+
+def test_required_simple():
+    d = DataFrame()
+    assert required_columns(d.met) == {'met'}
+
+
+def test_required_nested():
+    d = DataFrame()
+    assert required_columns(d.jets.pt) == {'jets.pt'}
+
+
+def test_required_source_only():
+    d = DataFrame()
+    assert required_columns(d) == set()
+
+
+def test_required_binop():
+    d = DataFrame()
+    assert required_columns(d.jets.pt / d.jets.eta) == {'jets.pt', 'jets.eta'}
+
+
+def test_required_filter():
+    d = DataFrame()
+    assert required_columns(d[d.met > 50].jets.pt) == {'met', 'jets.pt'}
+
+
+def test_required_collection_filter():
+    d = DataFrame()
+    assert required_columns(d.jets[d.jets.eta < 2.4].pt) == {'jets.eta', 'jets.pt'}
+
+
+def test_required_method_not_a_column():
+    d = DataFrame()
+    assert required_columns(d.jets.count()) == {'jets'}
+
+
+def test_required_method_after_filter():
+    d = DataFrame()
+    assert required_columns(d.jets[d.jets.pt > 30].count()) == {'jets.pt'}
+
+
+def test_required_column_expression():
+    d = DataFrame()
+    assert required_columns((d.met > 50) & (d.x < 2)) == {'met', 'x'}
+
+
+def test_required_computed_column():
+    d = DataFrame()
+    d.jets['ptgev'] = d.jets.pt / 1000.0
+    assert required_columns(d.jets.ptgev) == {'jets.pt'}
+
+
+def test_required_computed_lambda_column():
+    d = DataFrame()
+    d.jets['ptgev'] = lambda j: j.pt / 1000.0
+    assert required_columns(d.jets.ptgev) == {'jets.pt'}
+
+
+def test_required_map_lambda():
+    d = DataFrame()
+    assert required_columns(d.jets.map(lambda j: j.eta + j.phi)) == {'jets.eta', 'jets.phi'}
+
+
+def test_required_nested_lambda():
+    d = DataFrame()
+    r = required_columns(d.jets.map(lambda j: j.tracks.map(lambda t: t.pt).count()))
+    assert r == {'jets.tracks.pt'}
+
+
+def test_required_alias(reset_var_counter):  # NOQA
+    define_alias("jets", "pts", lambda j: j.pt / 1000.0)
+    d = DataFrame()
+    assert required_columns(d.jets.pts) == {'jets.pt'}
+
+
+def test_required_np_function():
+    d = DataFrame()
+    assert required_columns(np.where(d.x > 0, d.x, d.y)) == {'x', 'y'}
+
+
+def test_required_user_func():
+    @user_func
+    def add_it(p1: float) -> float:
+        assert False, 'should never be called'
+
+    d = DataFrame()
+    assert required_columns(add_it(d.met)) == {'met'}
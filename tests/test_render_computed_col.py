@@ -176,3 +176,28 @@ def test_second_dr_returns_filtered():
 
     rendered = render_in_depth(context_1).visit(expr_1)
     assert rendered is not None
+
+
+def test_lambda_computed_col_same_node():
+    df = DataFrame()
+    df.jets['ptgev'] = lambda j: j.pt / 1000
+    d1 = df.jets.ptgev
+    d2 = df.jets.ptgev
+
+    assert d1 is d2
+
+    expr, _ = render(d1 + df.jets['ptgev'])
+    assert isinstance(expr, ast.BinOp)
+    assert expr.left is expr.right
+
+
+def test_lambda_computed_col_same_node_filtered():
+    df = DataFrame()
+    df.jets['ptgev'] = lambda j: j.pt / 1000
+    sel = df.jets.eta < 2.4
+
+    expr, _ = render(df.jets[sel].ptgev + df.jets[sel].ptgev)
+    assert isinstance(expr, ast.BinOp)
+    assert expr.left is expr.right
+    assert isinstance(expr.left, ast.Call)
+    assert isinstance(expr.left.func, ast_Callable)
@@ -5,8 +5,9 @@ from typing import Optional
 import pytest
 
 from dataframe_expressions import (
-    DataFrame, ast_Callable, ast_DataFrame, ast_Filter, render, render_context,
-    render_callable)
+    DataFrame, ast_Callable, ast_DataFrame, ast_Filter, disable_render_cache,
+    enable_render_cache, render, render_context, render_callable, render_many)
+from dataframe_expressions.render_dataframe import _scoped_dict
 
 
 def test_render_easy():
@@ -373,6 +374,59 @@ def test_callable_captures_dataframe():
     assert root_of_call is expr1
 
 
+def test_callable_memo():
+    calls = []
+
+    def count_calls(b):
+        calls.append(b)
+        return b.pt
+
+    d = DataFrame()
+    d1 = d.jets.apply(count_calls)
+    expr, ctx = render(d1)
+    arg1 = expr.args[0]  # type: ast.AST
+    assert isinstance(arg1, ast_Callable)
+
+    expr1, ctx1 = render_callable(arg1, ctx, arg1.dataframe)
+    expr2, ctx2 = render_callable(arg1, ctx, arg1.dataframe)
+
+    assert len(calls) == 1
+    assert expr1 is expr2
+    assert ctx1 is not ctx2
+
+
+def test_callable_memo_different_args():
+    d = DataFrame()
+    d1 = d.jets.apply(lambda b: b.pt)
+    expr, ctx = render(d1)
+    arg1 = expr.args[0]  # type: ast.AST
+
+    expr1, _ = render_callable(arg1, ctx, d.jets)
+    expr2, _ = render_callable(arg1, ctx, d.eles)
+
+    assert expr1 is not expr2
+    assert expr2.value.attr == 'eles'
+
+
+def test_callable_memo_context_changed():
+    calls = []
+
+    def count_calls(b):
+        calls.append(b)
+        return b.pt
+
+    d = DataFrame()
+    d1 = d.jets.apply(count_calls)
+    expr, ctx = render(d1)
+    arg1 = expr.args[0]  # type: ast.AST
+
+    render_callable(arg1, ctx, arg1.dataframe)
+    render(d.eles.pt, ctx)
+    render_callable(arg1, ctx, arg1.dataframe)
+
+    assert len(calls) == 2
+
+
 def test_callable_captures_column():
     d = DataFrame()
     d1 = d.jets.apply(lambda b: d.met > 20.0)
@@ -401,6 +455,45 @@ def test_render_callable_captured():
     assert isinstance(expr1, ast_Filter)
 
 
+def test_render_distinct_dataframes():
+    d1 = DataFrame()
+    d2 = DataFrame()
+    expr, _ = render(d1.x + d2.x)
+
+    assert isinstance(expr, ast.BinOp)
+    assert isinstance(expr.left, ast.Attribute)
+    assert isinstance(expr.right, ast.Attribute)
+    assert isinstance(expr.left.value, ast_DataFrame)
+    assert isinstance(expr.right.value, ast_DataFrame)
+    assert expr.left.value.dataframe is d1
+    assert expr.right.value.dataframe is d2
+
+
+def test_render_distinct_lambdas():
+    d = DataFrame()
+    f1 = lambda j: j.pt  # NOQA
+    f2 = lambda j: j.eta  # NOQA
+    expr, _ = render(d.jets.map(f1) + d.jets.map(f2))
+
+    assert isinstance(expr, ast.BinOp)
+    assert isinstance(expr.left, ast.Call)
+    assert isinstance(expr.right, ast.Call)
+    c1 = expr.left.args[0]
+    c2 = expr.right.args[0]
+    assert isinstance(c1, ast_Callable)
+    assert isinstance(c2, ast_Callable)
+    assert c1.callable is f1
+    assert c2.callable is f2
+
+
+def test_render_same_structure_shared():
+    d = DataFrame()
+    expr, _ = render((d.jets.pt / 1000) + (d.jets.pt / 1000))
+
+    assert isinstance(expr, ast.BinOp)
+    assert expr.left is expr.right
+
+
 def test_render_twice():
     d = DataFrame()
     jets = d.jets.pt
@@ -535,3 +628,259 @@ def test_copy_filter():
             return ast.Name(id='c')
 
     do_copy().visit(a)
+
+
+def test_scoped_dict_fork_isolated():
+    d1 = _scoped_dict()
+    d1[1] = 'a'
+    d2 = d1.fork()
+    d2[2] = 'b'
+    d1[3] = 'c'
+
+    assert 1 in d2 and 2 in d2 and 3 not in d2
+    assert 1 in d1 and 2 not in d1 and 3 in d1
+    assert len(d1) == 2
+    assert len(d2) == 2
+
+
+def test_scoped_dict_delete():
+    d1 = _scoped_dict()
+    d1[1] = 'a'
+    d2 = d1.fork()
+    del d2[1]
+
+    assert 1 not in d2
+    assert d1[1] == 'a'
+    assert list(d2) == []
+    with pytest.raises(KeyError):
+        d2[1]
+    with pytest.raises(KeyError):
+        del d2[1]
+
+
+def test_scoped_dict_deep_chain():
+    d = _scoped_dict()
+    for i in range(100):
+        d[i] = i
+        d = d.fork()
+
+    assert d._frozen is not None
+    assert d._frozen.depth <= _scoped_dict._max_depth + 1
+    assert sorted(d) == list(range(100))
+    assert all(d[i] == i for i in range(100))
+
+
+def test_render_context_clone_shares():
+    r1 = render_context()
+    r1._resolved[1] = ast_DataFrame(DataFrame())
+
+    r2 = render_context(r1)
+    assert len(r2._resolved._own) == 0
+    r2._resolved[2] = ast_DataFrame(DataFrame())
+    assert 2 not in r1._resolved
+
+
+def test_render_deep_filter_chain():
+    d = DataFrame()
+    cut = d.met > 0
+    d1 = d
+    for _ in range(100000):
+        d1 = d1[cut]
+
+    expr, _ = render(d1)
+
+    depth = 0
+    while isinstance(expr, ast_Filter):
+        depth += 1
+        assert isinstance(expr.filter, ast.Compare)
+        expr = expr.expr
+    assert depth == 100000
+    assert isinstance(expr, ast_DataFrame)
+    assert expr.dataframe is d
+
+
+def test_render_deep_attribute_chain():
+    d = DataFrame()
+    d1 = d
+    for _ in range(100000):
+        d1 = d1.x
+
+    expr, _ = render(d1)
+
+    depth = 0
+    while isinstance(expr, ast.Attribute):
+        depth += 1
+        expr = expr.value
+    assert depth == 100000
+    assert isinstance(expr, ast_DataFrame)
+    assert expr.dataframe is d
+
+
+@pytest.fixture()
+def render_cache():
+    enable_render_cache(max_size=10)
+    yield None
+    disable_render_cache()
+
+
+def test_render_cache_off_by_default():
+    d = DataFrame()
+    jets = d.jets[d.jets.pt > 30]
+
+    expr1, _ = render(jets)
+    expr2, _ = render(jets)
+
+    assert expr1 is not expr2
+
+
+def test_render_cache_same_df(render_cache):
+    d = DataFrame()
+    jets = d.jets[d.jets.pt > 30]
+
+    expr1, _ = render(jets)
+    expr2, _ = render(jets)
+
+    assert expr1 is expr2
+
+
+def test_render_cache_shared_prefix(render_cache):
+    d = DataFrame()
+    jets = d.jets[d.jets.pt > 30]
+
+    expr1, _ = render(jets)
+    expr2, _ = render(jets.pt)
+    expr3, _ = render(jets.eta)
+
+    assert isinstance(expr2, ast.Attribute)
+    assert isinstance(expr3, ast.Attribute)
+    assert expr2.value is expr1
+    assert expr3.value is expr1
+
+
+def test_render_cache_with_context_not_used(render_cache):
+    d = DataFrame()
+    jets = d.jets[d.jets.pt > 30]
+
+    expr1, _ = render(jets)
+    expr2, _ = render(jets, render_context())
+
+    assert expr1 is not expr2
+
+
+def test_render_cache_weak(render_cache):
+    from dataframe_expressions import render_dataframe
+    import gc
+
+    d = DataFrame()
+    render(d.jets[d.jets.pt > 30])
+    gc.collect()
+
+    cache = render_dataframe._cache
+    assert cache is not None
+    assert all(e[0]() is not None for e in cache._entries.values())
+    assert len([e for e in cache._entries.values() if e[0]() is d]) == 1
+
+
+def test_render_cache_releases_roots(render_cache):
+    'Once its entries are evicted, a dropped source DataFrame is released'
+    import gc
+    import weakref
+
+    d = DataFrame()
+    d_ref = weakref.ref(d)
+    render(d.jets.pt)
+    render(d.jets.eta)
+    del d
+
+    keep = DataFrame()
+    for i in range(30):
+        render(keep[f'x{i}'])
+    gc.collect()
+
+    assert d_ref() is None
+
+
+def test_render_cache_lru(render_cache):
+    from dataframe_expressions import render_dataframe
+
+    d = DataFrame()
+    cols = [d[f'x{i}'] for i in range(20)]
+    for c in cols:
+        render(c)
+
+    cache = render_dataframe._cache
+    assert cache is not None
+    assert len(cache) == 10
+    assert cache.lookup(cols[-1]) is not None
+    assert cache.lookup(cols[0]) is None
+
+
+def test_render_cache_size_after_fork():
+    'Forking the shared context (as `render_callable` does) must not hide its size'
+    from dataframe_expressions import render_dataframe
+    enable_render_cache(max_size=2)
+    try:
+        d = DataFrame()
+        f = ast_Callable(lambda j: j.pt, d)
+        keep = []
+        for i in range(200):
+            keep.append(d[f'x{i}'] > i)
+            render(keep[-1])
+            cache = render_dataframe._cache
+            assert cache is not None
+            render_callable(f, cache.context, d.jets)
+            assert cache.context._interned.n_stored <= 2 * cache._nodes_per_entry + 10
+    finally:
+        disable_render_cache()
+
+
+def test_scoped_dict_n_stored():
+    d = _scoped_dict()
+    d[1] = 1
+    d2 = d.fork()
+    d[2] = 2
+    d2[3] = 3
+    assert d.n_stored == 2
+    assert d2.n_stored == 2
+    d3 = d2.fork()
+    d3[4] = 4
+    assert d3.n_stored == 3
+
+
+def test_render_many_empty():
+    exprs, _ = render_many([])
+    assert exprs == []
+
+
+def test_render_many_shared():
+    d = DataFrame()
+    good_jets = d.jets[d.jets.pt > 30]
+    exprs, _ = render_many([good_jets.pt, good_jets.eta, d.met])
+
+    assert len(exprs) == 3
+    pt, eta, met = exprs
+    assert isinstance(pt, ast.Attribute)
+    assert isinstance(eta, ast.Attribute)
+    assert isinstance(met, ast.Attribute)
+    assert isinstance(pt.value, ast_Filter)
+    assert pt.value is eta.value
+    assert met.value is pt.value.expr.value
+
+
+def test_render_many_same_as_render():
+    d = DataFrame()
+    good_jets = d.jets[d.jets.pt > 30]
+    exprs, _ = render_many([good_jets.pt, d.met > 20])
+    expr1, _ = render(good_jets.pt)
+    expr2, _ = render(d.met > 20)
+
+    assert ast.dump(exprs[0]) == ast.dump(expr1)
+    assert ast.dump(exprs[1]) == ast.dump(expr2)
+
+
+def test_render_many_duplicates():
+    d = DataFrame()
+    jets = d.jets
+    exprs, _ = render_many([jets, jets])
+
+    assert exprs[0] is exprs[1]
@@ -0,0 +1,186 @@
+import os
+
+import numpy as np
+
+from dataframe_expressions import DataFrame, result_cache
+
+
+class versioned_source(DataFrame):
+    def __init__(self, version: str):
+        DataFrame.__init__(self)
+        self.version = version
+
+    def _cache_version_token(self) -> str:
+        return self.version
+
+
+def test_result_cache_miss():
+    c = result_cache()
+    df = DataFrame()
+    assert c.get(df.jets.pt) is None
+    assert c.get(df.jets.pt, 'hi') == 'hi'
+
+
+def test_result_cache_memory_hit():
+    c = result_cache()
+    df = DataFrame()
+    c.put(df.jets.pt, np.array([1.0, 2.0]))
+
+    df2 = DataFrame()
+    r = c.get(df2.jets.pt)
+    assert r is not None
+    assert list(r) == [1.0, 2.0]
+
+
+def test_result_cache_different_expression():
+    c = result_cache()
+    df = DataFrame()
+    c.put(df.jets.pt, np.array([1.0, 2.0]))
+    assert c.get(df.jets.eta) is None
+
+
+def test_result_cache_canonical():
+    c = result_cache()
+    df = DataFrame()
+    c.put((df.a > 1) & (df.b > 2), 5)
+    assert c.get((df.b > 2) & (df.a > 1)) == 5
+
+
+def test_result_cache_version():
+    c = result_cache()
+    c.put(versioned_source('1').jets.pt, np.array([1.0]))
+    assert c.get(versioned_source('1').jets.pt) is not None
+    assert c.get(versioned_source('2').jets.pt) is None
+
+
+def test_result_cache_get_or_compute():
+    c = result_cache()
+    df = DataFrame()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.array([3.0])
+
+    assert list(c.get_or_compute(df.jets.pt, compute)) == [3.0]
+    assert list(c.get_or_compute(df.jets.pt, compute)) == [3.0]
+    assert len(calls) == 1
+
+
+def test_result_cache_memory_limit():
+    c = result_cache(max_memory_bytes=2000)
+    df = DataFrame()
+    c.put(df.x, np.zeros(100))
+    c.put(df.y, np.zeros(100))
+    c.put(df.z, np.zeros(100))
+    assert c.memory_bytes <= 2000
+    assert c.get(df.x) is None
+    assert c.get(df.z) is not None
+
+
+def test_result_cache_disk(tmp_path):
+    df = DataFrame()
+    c1 = result_cache(str(tmp_path))
+    c1.put(df.jets.pt, (np.array([1, 2, 3]), np.array([0.0, 1.0, 2.0, 3.0])))
+    assert len(os.listdir(tmp_path)) == 1
+    assert c1.disk_bytes > 0
+
+    # A new process would start with a new cache
+    c2 = result_cache(str(tmp_path))
+    assert c2.disk_bytes == c1.disk_bytes
+    r = c2.get(DataFrame().jets.pt)
+    assert isinstance(r, tuple)
+    assert list(r[0]) == [1, 2, 3]
+    assert list(r[1]) == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_result_cache_disk_scalar(tmp_path):
+    df = DataFrame()
+    result_cache(str(tmp_path)).put(df.jets.pt.count(), 12)
+    assert result_cache(str(tmp_path)).get(df.jets.pt.count()) == 12
+
+
+def test_result_cache_disk_compressed(tmp_path):
+    c = result_cache(str(tmp_path))
+    c.put(DataFrame().x, np.zeros(100000))
+    assert c.disk_bytes < 100000
+
+
+def test_result_cache_disk_limit(tmp_path):
+    df = DataFrame()
+    # Random numbers don't compress: each file is a bit over 1600 bytes
+    values = np.random.default_rng(1).random(200)
+    c = result_cache(str(tmp_path), max_disk_bytes=4000)
+    c.put(df.x, values)
+    c.put(df.y, values)
+    c.put(df.z, values)
+    assert c.disk_bytes <= 4000
+    assert sum(os.path.getsize(os.path.join(tmp_path, f)) for f in os.listdir(tmp_path)) \
+        == c.disk_bytes
+
+    c2 = result_cache(str(tmp_path))
+    assert c2.get(df.x) is None
+    assert c2.get(df.z) is not None
+
+
+def test_result_cache_not_written(tmp_path):
+    df = DataFrame()
+    c = result_cache(str(tmp_path))
+    c.put(df.x, {'a': 1})
+    assert c.get(df.x) == {'a': 1}
+    assert len(os.listdir(tmp_path)) == 0
+
+
+def test_result_cache_bad_file(tmp_path):
+    df = DataFrame()
+    c = result_cache(str(tmp_path))
+    key = c.key(df.x)
+    with open(os.path.join(tmp_path, f'{key}.npz'), 'w') as f:
+        f.write('not a zip file')
+
+    assert result_cache(str(tmp_path)).get(df.x) is None
+    assert len(os.listdir(tmp_path)) == 0
+
+
+def test_result_cache_clear(tmp_path):
+    df = DataFrame()
+    c = result_cache(str(tmp_path))
+    c.put(df.x, np.arange(10))
+    c.clear()
+    assert c.get(df.x) is None
+    assert c.memory_bytes == 0
+    assert c.disk_bytes == 0
+    assert len(os.listdir(tmp_path)) == 0
+
+
+def test_result_cache_captured_numpy():
+    c = result_cache()
+    df = DataFrame()
+
+    def make(cut):
+        return df.jets.map(lambda j: j.pt > cut)
+
+    c.put(make(np.int64(30)), np.array([1.0]))
+    assert c.get(make(np.int64(50))) is None
+    assert c.get(make(np.int64(30))) is not None
+
+
+def test_result_cache_uncacheable():
+    import threading
+    c = result_cache()
+    df = DataFrame()
+    lock = threading.Lock()
+    expr = df.jets.map(lambda j: j.pt if lock else j.eta)
+    c.put(expr, np.array([1.0]))
+    assert c.get(expr) is None
+    assert c.memory_bytes == 0
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.array([3.0])
+
+    c.get_or_compute(expr, compute)
+    c.get_or_compute(expr, compute)
+    assert len(calls) == 2
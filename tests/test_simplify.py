@@ -0,0 +1,140 @@
+import ast
+
+import numpy as np
+
+from dataframe_expressions import DataFrame, ast_DataFrame, ast_Filter, render, simplify
+from dataframe_expressions.utils_ast import constant_value, is_constant
+
+
+def _value(a):
+    assert is_constant(a)
+    return constant_value(a)
+
+
+def test_simplify_nothing_to_do():
+    d = DataFrame()
+    expr, _ = render(d.jets.pt / 1000.0)
+
+    assert simplify(expr) is expr
+
+
+def test_simplify_fold_constants():
+    expr = ast.BinOp(left=ast.Num(n=2), op=ast.Mult(), right=ast.Num(n=3))
+
+    assert _value(simplify(expr)) == 6
+
+
+def test_simplify_divide_by_zero_not_folded():
+    expr = ast.BinOp(left=ast.Num(n=2), op=ast.Div(), right=ast.Num(n=0))
+
+    assert simplify(expr) is expr
+
+
+def test_simplify_add_zero():
+    d = DataFrame()
+    expr, _ = render(d.x + 0)
+
+    r = simplify(expr)
+    assert isinstance(r, ast.Attribute)
+    assert r.attr == 'x'
+
+
+def test_simplify_multiply_one():
+    d = DataFrame()
+    expr, _ = render(1 * d.x)
+
+    r = simplify(expr)
+    assert isinstance(r, ast.Attribute)
+
+
+def test_simplify_multiply_zero_left_alone():
+    d = DataFrame()
+    expr, _ = render(d.x * 0)
+
+    assert simplify(expr) is expr
+
+
+def test_simplify_divide_multiply():
+    d = DataFrame()
+    expr, _ = render(d.pt / 1000.0 * 1000.0)
+
+    r = simplify(expr)
+    assert isinstance(r, ast.Attribute)
+    assert r.attr == 'pt'
+
+
+def test_simplify_divide_divide():
+    d = DataFrame()
+    expr, _ = render(d.pt / 10 / 100)
+
+    r = simplify(expr)
+    assert isinstance(r, ast.BinOp)
+    assert isinstance(r.op, ast.Mult)
+    assert isinstance(r.left, ast.Attribute)
+    assert abs(_value(r.right) - 0.001) < 1e-12
+
+
+def test_simplify_no_reassociate():
+    d = DataFrame()
+    expr, _ = render(d.pt / 1000.0 * 1000.0)
+
+    assert simplify(expr, reassociate=False) is expr
+
+
+def test_simplify_compare_literals():
+    expr = ast.Compare(left=ast.Num(n=1), ops=[ast.Lt()], comparators=[ast.Num(n=2)])
+
+    assert _value(simplify(expr)) is True
+
+
+def test_simplify_compare_mixed_types_left_alone():
+    expr = ast.Compare(left=ast.Num(n=1), ops=[ast.Lt()], comparators=[ast.Str(s='a')])
+
+    assert simplify(expr) is expr
+
+
+def test_simplify_boolop():
+    d = DataFrame()
+    expr, _ = render(d[(d.x > 0) & (d.y > 0)])
+    pred = ast.BoolOp(op=ast.And(), values=[
+        ast.Compare(left=ast.Num(n=1), ops=[ast.Lt()], comparators=[ast.Num(n=2)]),
+        expr.filter.values[1]])
+
+    r = simplify(pred)
+    assert r is expr.filter.values[1]
+
+
+def test_simplify_boolop_short_circuit():
+    d = DataFrame()
+    expr, _ = render(d.x > 0)
+    pred = ast.BoolOp(op=ast.And(), values=[expr, ast.NameConstant(value=False)])
+
+    assert _value(simplify(pred)) is False
+
+
+def test_simplify_filter_true_removed():
+    d = DataFrame()
+    f = ast_Filter(ast_DataFrame(d),
+                   ast.Compare(left=ast.Num(n=1), ops=[ast.Lt()], comparators=[ast.Num(n=2)]))
+
+    r = simplify(f)
+    assert isinstance(r, ast_DataFrame)
+
+
+def test_simplify_np_where():
+    d = DataFrame()
+    expr, _ = render(np.where(d.x > 0, d.x, d.y))
+    where = ast.Call(func=expr.func,
+                     args=[ast.NameConstant(value=False)] + expr.args[1:], keywords=[])
+
+    r = simplify(where)
+    assert r is expr.args[2]
+
+
+def test_simplify_shared_nodes():
+    d = DataFrame()
+    expr, _ = render((d.x + 0) * (d.x + 0))
+
+    r = simplify(expr)
+    assert isinstance(r, ast.BinOp)
+    assert r.left is r.right
@@ -0,0 +1,117 @@
+import ast
+
+import numpy as np
+
+from dataframe_expressions import DataFrame, render, subexpr_cache
+
+
+class versioned_source(DataFrame):
+    def __init__(self, version: str):
+        DataFrame.__init__(self)
+        self.version = version
+
+    def _cache_version_token(self) -> str:
+        return self.version
+
+
+def test_subexpr_keys_shared_prefix():
+    c = subexpr_cache()
+    df = DataFrame()
+    good = df.jets[df.jets.pt > 30]
+    e1, _ = render(good.pt)
+    e2, _ = render(good.eta.count())
+
+    k1 = c.keys(e1)
+    k2 = c.keys(e2)
+    assert isinstance(e1, ast.Attribute)
+    assert k1[id(e1.value)] in k2.values()
+    assert k1[id(e1)] not in k2.values()
+
+
+def test_subexpr_keys_different_dataframes():
+    c = subexpr_cache()
+    e1, _ = render(DataFrame().jets.pt)
+    e2, _ = render(DataFrame().jets.pt)
+    assert c.key(e1) == c.key(e2)
+
+
+def test_subexpr_keys_version():
+    c = subexpr_cache()
+    e1, _ = render(versioned_source('1').jets.pt)
+    e2, _ = render(versioned_source('2').jets.pt)
+    assert c.key(e1) != c.key(e2)
+
+
+def test_subexpr_get_put():
+    c = subexpr_cache()
+    c.put('a', np.arange(10), 1.0)
+    assert list(c.get('a')) == list(range(10))
+    assert c.get('b') is None
+    assert c.nbytes == np.arange(10).nbytes
+    assert len(c) == 1
+
+
+def test_subexpr_get_or_compute():
+    c = subexpr_cache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(3)
+
+    c.get_or_compute('a', compute)
+    c.get_or_compute('a', compute)
+    assert len(calls) == 1
+
+
+def test_subexpr_budget():
+    c = subexpr_cache(max_bytes=1000)
+    for i in range(10):
+        c.put(str(i), np.zeros(50), 1.0)
+    assert c.nbytes <= 1000
+    assert len(c) == 2
+
+
+def test_subexpr_too_big():
+    c = subexpr_cache(max_bytes=100)
+    c.put('a', np.zeros(50), 1.0)
+    assert c.get('a') is None
+    assert c.nbytes == 0
+
+
+def test_subexpr_evict_cheap_first():
+    c = subexpr_cache(max_bytes=1000)
+    c.put('expensive', np.zeros(50), 10.0)
+    c.put('cheap', np.zeros(50), 0.001)
+    c.put('new', np.zeros(50), 1.0)
+    assert c.get('expensive') is not None
+    assert c.get('cheap') is None
+    assert c.get('new') is not None
+
+
+def test_subexpr_evict_large_first():
+    'Same time to compute, the big one saves less per byte'
+    c = subexpr_cache(max_bytes=1200)
+    c.put('big', np.zeros(100), 1.0)
+    c.put('small', np.zeros(10), 1.0)
+    c.put('new', np.zeros(50), 1.0)
+    assert c.get('big') is None
+    assert c.get('small') is not None
+
+
+def test_subexpr_unused_ages_out():
+    'Something expensive that is never used again is eventually dropped'
+    c = subexpr_cache(max_bytes=1000)
+    c.put('expensive', np.zeros(50), 2.0)
+    for i in range(1000):
+        c.put(str(i), np.zeros(50), 1.0)
+    assert c.get('expensive') is None
+    assert c.nbytes <= 1000
+
+
+def test_subexpr_clear():
+    c = subexpr_cache()
+    c.put('a', np.arange(10), 1.0)
+    c.clear()
+    assert len(c) == 0
+    assert c.nbytes == 0
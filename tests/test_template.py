@@ -0,0 +1,167 @@
+import ast
+
+from dataframe_expressions import (
+    DataFrame, ast_Callable, ast_Parameter, define_alias, render, render_callable,
+    trace_callable)
+
+from .utils_for_testing import reset_var_counter  # NOQA
+
+
+def _callable(expr):
+    c = [a for a in ast.walk(expr) if isinstance(a, ast_Callable)]
+    assert len(c) == 1
+    return c[0]
+
+
+def test_trace_simple():
+    d = DataFrame()
+    expr, _ = render(d.jets.map(lambda j: j.pt / 1000.0))
+
+    t = trace_callable(_callable(expr))
+    assert t.usable
+    assert isinstance(t.expr, ast.BinOp)
+    assert isinstance(t.expr.left, ast.Attribute)
+    assert isinstance(t.expr.left.value, ast_Parameter)
+    assert t.expr.left.value.index == 0
+
+
+def test_trace_only_once():
+    d = DataFrame()
+    expr, _ = render(d.jets.map(lambda j: j.pt))
+    c = _callable(expr)
+
+    assert trace_callable(c) is trace_callable(c)
+
+
+def test_instantiate_matches_render_callable():
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: j[j.pt > 30].eta + d.met))
+    c = _callable(expr)
+
+    expected, _ = render_callable(c, ctx, c.dataframe)
+    actual, _ = trace_callable(c).instantiate(ctx, c.dataframe)
+
+    assert ast.dump(actual) == ast.dump(expected)
+
+
+def test_instantiate_shares_context():
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: j.pt))
+    c = _callable(expr)
+
+    actual, _ = trace_callable(c).instantiate(ctx, c.dataframe)
+    assert actual.value is expr.func.value
+
+
+def test_instantiate_many():
+    calls = []
+
+    def get_pt(j):
+        calls.append(j)
+        return j.pt
+
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(get_pt))
+    c = _callable(expr)
+    t = trace_callable(c)
+
+    r1, _ = t.instantiate(ctx, d.jets)
+    r2, _ = t.instantiate(ctx, d.eles)
+
+    assert len(calls) == 1
+    assert r1.value.attr == 'jets'
+    assert r2.value.attr == 'eles'
+
+
+def test_instantiate_computed_column_falls_back():
+    d = DataFrame()
+    d.jets['ptgev'] = d.jets.pt / 1000.0
+    expr, ctx = render(d.jets.map(lambda j: j.ptgev))
+    c = _callable(expr)
+
+    actual, _ = trace_callable(c).instantiate(ctx, c.dataframe)
+    assert isinstance(actual, ast.BinOp)
+
+
+def test_instantiate_deep_computed_column_falls_back():
+    'The computed column is on an attribute of the argument'
+    df = DataFrame()
+    df.jets['ptgev'] = lambda j: j.pt / 1000.0
+    c = ast_Callable(lambda e: e.jets.ptgev, df)
+    ctx = render(df)[1]
+
+    expected, _ = render_callable(c, ctx, df)
+    actual, _ = trace_callable(c).instantiate(ctx, df)
+    assert ast.dump(actual) == ast.dump(expected)
+    assert not (isinstance(actual, ast.Attribute) and actual.attr == 'ptgev')
+
+
+def test_instantiate_deep_filtered_computed_column_falls_back():
+    df = DataFrame()
+    df.jets['ptgev'] = lambda j: j.pt / 1000.0
+    c = ast_Callable(lambda e: e.jets[e.jets.pt > 30].ptgev, df)
+    ctx = render(df)[1]
+
+    expected, _ = render_callable(c, ctx, df)
+    actual, _ = trace_callable(c).instantiate(ctx, df)
+    assert ast.dump(actual) == ast.dump(expected)
+
+
+def test_instantiate_deep_plain_substitutes():
+    'Plain attributes (and methods) deeper down still use the template'
+    df = DataFrame()
+    c = ast_Callable(lambda e: e.jets.pt.count(), df)
+    ctx = render(df)[1]
+    template = trace_callable(c)
+    assert template._can_substitute((df,))
+
+    expected, _ = render_callable(c, ctx, df)
+    actual, _ = template.instantiate(ctx, df)
+    assert ast.dump(actual) == ast.dump(expected)
+
+
+def test_instantiate_alias_falls_back(reset_var_counter):  # NOQA
+    define_alias("jets", "pts", lambda j: j.pt / 1000.0)
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: j.pts))
+    c = _callable(expr)
+
+    actual, _ = trace_callable(c).instantiate(ctx, c.dataframe)
+    assert isinstance(actual, ast.BinOp)
+
+
+def test_instantiate_subclass_falls_back():
+    class my_df(DataFrame):
+        def __init__(self):
+            DataFrame.__init__(self)
+
+        @property
+        def pt(self):
+            return DataFrame(ast.Num(n=5))
+
+    d = my_df()
+    expr, ctx = render(d.map(lambda e: e.pt))
+    c = _callable(expr)
+
+    actual, _ = trace_callable(c).instantiate(ctx, d)
+    assert isinstance(actual, ast.Num)
+
+
+def test_trace_nested_lambda_not_usable():
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: j.tracks.map(lambda t: t.pt)))
+    c = _callable(expr)
+
+    t = trace_callable(c)
+    assert not t.usable
+    actual, _ = t.instantiate(ctx, c.dataframe)
+    assert isinstance(actual, ast.Call)
+
+
+def test_trace_constant():
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: 5))
+    c = _callable(expr)
+
+    actual, _ = trace_callable(c).instantiate(ctx, c.dataframe)
+    assert isinstance(actual, ast.Num)
@@ -0,0 +1,106 @@
+import logging
+
+import pytest
+
+from dataframe_expressions import (
+    DataFrame, add_render_listener, configure_tracing, remove_render_listener, render,
+    render_callable, render_many)
+import dataframe_expressions.tracing as tracing
+
+
+@pytest.fixture
+def events():
+    'Collect render events'
+    found = []
+    add_render_listener(found.append)
+    yield found
+    remove_render_listener(found.append)
+
+
+@pytest.fixture
+def reset_tracing():
+    yield
+    configure_tracing()
+
+
+def test_no_formatting_when_disabled(monkeypatch, caplog):
+    def bad_dumps(d):
+        assert False, 'dumps should not be called'
+
+    monkeypatch.setattr(tracing, 'dumps', bad_dumps)
+    caplog.set_level(logging.INFO)
+
+    d = DataFrame()
+    render(d[d.x > 0].jets.pt)
+    render_many([d.x, d.y])
+
+
+def test_log_when_enabled(caplog):
+    caplog.set_level(logging.DEBUG, logger='dataframe_expressions')
+    d = DataFrame()
+    render(d.jets.pt)
+
+    assert len(caplog.records) == 1
+    assert 'Rendering' in caplog.records[0].getMessage()
+    assert 'jets' in caplog.records[0].getMessage()
+
+
+def test_log_max_chars(caplog, reset_tracing):
+    configure_tracing(max_chars=10)
+    caplog.set_level(logging.DEBUG, logger='dataframe_expressions')
+    d = DataFrame()
+    render(d.jets.pt)
+
+    assert 'more characters' in caplog.records[0].getMessage()
+
+
+def test_log_sampled(caplog, reset_tracing):
+    configure_tracing(sample_every=2)
+    caplog.set_level(logging.DEBUG, logger='dataframe_expressions')
+    d = DataFrame()
+    for _ in range(3):
+        render(d.jets.pt)
+
+    assert len(caplog.records) == 2
+
+
+def test_log_render_callable(caplog):
+    d = DataFrame()
+    expr, ctx = render(d.jets.map(lambda j: j.pt))
+    caplog.set_level(logging.DEBUG, logger='dataframe_expressions')
+    render_callable(expr.args[0], ctx, d.jets)
+
+    assert any('render_callable' in r.getMessage() for r in caplog.records)
+
+
+def test_listener_render(events):
+    d = DataFrame()
+    render(d.jets.pt)
+
+    assert len(events) == 1
+    e = events[0]
+    assert e.kind == 'render'
+    assert e.n_roots == 1
+    assert e.n_nodes == 3
+    assert e.depth == 3
+    assert e.seconds >= 0
+
+
+def test_listener_render_many(events):
+    d = DataFrame()
+    render_many([d.jets.pt, d.jets.eta])
+
+    assert len(events) == 1
+    e = events[0]
+    assert e.kind == 'render_many'
+    assert e.n_roots == 2
+    assert e.n_nodes == 4
+
+
+def test_listener_removed():
+    found = []
+    add_render_listener(found.append)
+    remove_render_listener(found.append)
+
+    render(DataFrame().x)
+    assert len(found) == 0
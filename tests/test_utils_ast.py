@@ -1,4 +1,5 @@
-from dataframe_expressions.utils_ast import CloningNodeTransformer
+from dataframe_expressions.utils_ast import CloningNodeTransformer, intern_ast
+from dataframe_expressions import DataFrame, ast_DataFrame
 import ast
 
 
@@ -42,3 +43,54 @@ def test_no_mod_in_place():
     assert a is not new_a
     assert ast.dump(new_a) != ast.dump(a)
     assert ast.dump(a).replace('hi', 'there') == ast.dump(new_a)
+
+
+def test_intern_same_structure():
+    resolved = {}
+    interned = {}
+    a1 = ast.BinOp(left=ast.Name(id='a'), op=ast.Add(), right=ast.Num(n=1))
+    a2 = ast.BinOp(left=ast.Name(id='a'), op=ast.Add(), right=ast.Num(n=1))
+
+    assert intern_ast(a1, resolved, interned) is a1
+    assert intern_ast(a2, resolved, interned) is a1
+
+
+def test_intern_different_constant_type():
+    resolved = {}
+    interned = {}
+    a1 = ast.Num(n=1)
+    a2 = ast.Num(n=1.0)
+
+    assert intern_ast(a1, resolved, interned) is a1
+    assert intern_ast(a2, resolved, interned) is a2
+
+
+def test_intern_different_dataframes():
+    resolved = {}
+    interned = {}
+    a1 = ast.Attribute(value=ast_DataFrame(DataFrame()), attr='x')
+    a2 = ast.Attribute(value=ast_DataFrame(DataFrame()), attr='x')
+
+    assert intern_ast(a1, resolved, interned) is a1
+    assert intern_ast(a2, resolved, interned) is a2
+
+
+def test_intern_same_dataframe():
+    resolved = {}
+    interned = {}
+    df = DataFrame()
+    a1 = ast.Attribute(value=ast_DataFrame(df), attr='x')
+    a2 = ast.Attribute(value=ast_DataFrame(df), attr='x')
+
+    assert intern_ast(a1, resolved, interned) is a1
+    assert intern_ast(a2, resolved, interned) is a1
+
+
+def test_intern_deep_tree():
+    resolved = {}
+    interned = {}
+    a = ast.Name(id='a')
+    for _ in range(50000):
+        a = ast.UnaryOp(op=ast.USub(), operand=a)
+
+    assert intern_ast(a, resolved, interned) is a